@@ -1,10 +1,11 @@
+import asyncio
 import logging
+import os
 import time
 import signal
 import sys
 import threading
 import argparse
-from queue import Queue
 import serial
 import sdnotify
 
@@ -13,8 +14,18 @@ from src import config
 from src.utils.logger_setup import setup_logging
 from src.core.connection_manager import SensorConnectionManager
 from src.sensors.hwt905_data_decoder import HWT905DataDecoder
+from src.sensors.hwt905_configurator import SensorOutputProfile
+from src.sensors.decoders import AngleSample
 from src.storage.storage_manager import StorageManager
-from src.core.async_data_manager import SerialReaderThread, DecoderThread
+from src.storage.raw_capture import RawCaptureWriter
+from src.storage.frame_storage import RawFrameStorageManager
+from src.storage.columnar_storage import ColumnarStorageManager
+from src.storage.background_writer import BackgroundStorageWriter, shutdown_storage
+from src.core.async_data_manager import create_pipeline_threads
+from src.core.async_runtime import AsyncAcquisitionRuntime
+from src.core.multi_sensor import MultiSensorSupervisor
+from src.core.sample_assembler import CYCLE_COMPLETE_FIELD
+from src.core.derived_channels import DerivedChannelEngine
 
 # Cờ để điều khiển vòng lặp chính
 _running_flag = threading.Event()
@@ -25,13 +36,13 @@ def signal_handler(signum, frame):
     logger.info(f"Nhận tín hiệu dừng {signum}. Đang thoát ứng dụng...")
     _running_flag.clear()
 
-def cleanup_threads(reader_thread, decoder_thread, storage_manager, ser_instance, session_flag):
-    """Dọn dẹp và dừng tất cả threads và kết nối"""
+def cleanup_threads(reader_thread, decoder_thread, pipeline_flag):
+    """Dừng cặp luồng đọc/giải mã; luồng giải mã xử lý hết dữ liệu còn trong hàng đợi rồi đóng file."""
     logger = logging.getLogger(__name__)
-    logger.info("Bắt đầu dọn dẹp threads và kết nối...")
+    logger.info("Bắt đầu dừng các luồng đọc và giải mã...")
     
-    # Dừng flag phiên để báo hiệu threads dừng
-    session_flag.clear()
+    # Tắt flag của pipeline để báo hiệu threads dừng
+    pipeline_flag.clear()
     
     # Đợi threads dừng với timeout
     if reader_thread and reader_thread.is_alive():
@@ -43,14 +54,128 @@ def cleanup_threads(reader_thread, decoder_thread, storage_manager, ser_instance
         decoder_thread.join(timeout=3)
         if decoder_thread.is_alive():
             logger.warning("Decoder thread chưa dừng sau 3 giây")
-    
-    # Đóng storage và serial connection
-    if storage_manager:
-        storage_manager.close_current_file()
-    
-    if ser_instance and ser_instance.is_open:
-        ser_instance.close()
-        logger.info("Đã đóng kết nối serial")
+
+def create_storage_manager(device_id: str = None) -> StorageManager:
+    """
+    Tạo StorageManager lưu các cột STORAGE_FIELDS và cột của DERIVED_CHANNELS theo cấu hình
+    (thêm cycle_complete khi STORAGE_ROW_MODE=cycle).
+    Với device_id (chế độ nhiều cảm biến), dữ liệu được lưu trong thư mục con riêng và có thêm cột device_id.
+    Với STORAGE_DECODE_MODE=lazy, lưu gói thô (RawFrameStorageManager) và giải mã khi file được đọc;
+    với STORAGE_FORMAT=columnar, lưu bản ghi nhị phân (ColumnarStorageManager) thay cho CSV.
+    Chính sách flush/fsync theo STORAGE_FLUSH_INTERVAL_MS / STORAGE_FSYNC_POLICY; với STORAGE_WRITER_THREAD,
+    việc ghi chạy trên luồng ghi nền (BackgroundStorageWriter) thay vì trong luồng giải mã.
+    """
+    if config.STORAGE_ROW_MODE != "cycle":
+        # Dòng "angle" chỉ lấy từ gói góc: cột acc/gyro/mag... sẽ luôn trống
+        unstored = [field for field in config.STORAGE_FIELDS if field not in AngleSample._fields]
+        if unstored:
+            logging.getLogger(__name__).warning(
+                f"STORAGE_ROW_MODE=angle chỉ lưu trường của gói góc; các cột {', '.join(unstored)} sẽ trống. "
+                f"Dùng STORAGE_ROW_MODE=cycle để lưu chúng.")
+    fields_to_write = ['timestamp'] + config.STORAGE_FIELDS
+    fields_to_write += [field for field in DerivedChannelEngine.output_fields_for(config.DERIVED_CHANNELS)
+                        if field not in fields_to_write]
+    if config.STORAGE_ROW_MODE == "cycle":
+        fields_to_write.append(CYCLE_COMPLETE_FIELD)
+    base_dir = config.STORAGE_BASE_DIR
+    if device_id:
+        fields_to_write.append('device_id')
+        base_dir = os.path.join(base_dir, device_id)
+    if config.STORAGE_DECODE_MODE == "lazy":
+        storage_manager = RawFrameStorageManager(
+            base_dir=base_dir,
+            file_rotation_hours=config.STORAGE_FILE_ROTATION_HOURS,
+            reconnection_strategy=config.STORAGE_RECONNECTION_STRATEGY,
+            fields_to_write=fields_to_write,
+            row_mode=config.STORAGE_ROW_MODE,
+            static_fields={'device_id': device_id} if device_id else None,
+            derived_baseline=config.DERIVED_BASELINE
+        )
+    elif config.STORAGE_FORMAT == "columnar":
+        storage_manager = ColumnarStorageManager(
+            base_dir=base_dir,
+            file_rotation_hours=config.STORAGE_FILE_ROTATION_HOURS,
+            reconnection_strategy=config.STORAGE_RECONNECTION_STRATEGY,
+            fields_to_write=fields_to_write,
+            static_fields={'device_id': device_id} if device_id else None
+        )
+    else:
+        storage_manager = StorageManager(
+            base_dir=base_dir,
+            file_rotation_hours=config.STORAGE_FILE_ROTATION_HOURS,
+            reconnection_strategy=config.STORAGE_RECONNECTION_STRATEGY,
+            fields_to_write=fields_to_write
+        )
+    storage_manager.configure_durability(
+        flush_interval_ms=config.STORAGE_FLUSH_INTERVAL_MS,
+        fsync_policy=config.STORAGE_FSYNC_POLICY,
+        fsync_interval_s=config.STORAGE_FSYNC_INTERVAL_SECONDS
+    )
+    if config.STORAGE_WRITER_THREAD:
+        storage_manager = BackgroundStorageWriter(
+            storage_manager,
+            buffer_rows=config.STORAGE_WRITER_BUFFER_ROWS,
+            overflow_policy=config.STORAGE_WRITER_OVERFLOW,
+            spill_max_rows=config.STORAGE_WRITER_SPILL_MAX_ROWS,
+            stall_ms=config.STORAGE_WRITER_STALL_MS,
+            name=f"StorageWriter-{device_id}" if device_id else "StorageWriter"
+        )
+    return storage_manager
+
+def create_raw_capture(device_id: str = None):
+    """
+    Tạo RawCaptureWriter ghi nguyên văn luồng byte serial nếu RAW_CAPTURE_ENABLED, ngược lại trả về None.
+    Với device_id (chế độ nhiều cảm biến), segment được ghi vào thư mục con riêng của thiết bị.
+    """
+    if not config.RAW_CAPTURE_ENABLED:
+        return None
+    base_dir = config.RAW_CAPTURE_DIR
+    if device_id:
+        base_dir = os.path.join(base_dir, device_id)
+    return RawCaptureWriter(
+        base_dir=base_dir,
+        rotation_hours=config.RAW_CAPTURE_ROTATION_HOURS,
+        max_segment_mb=config.RAW_CAPTURE_SEGMENT_MB,
+        buffer_kb=config.RAW_CAPTURE_BUFFER_KB,
+        flush_interval=config.RAW_CAPTURE_FLUSH_SECONDS
+    )
+
+def run_async_runtime(args, connection_manager, notifier):
+    """Chạy pipeline bằng event loop asyncio (PIPELINE_RUNTIME=asyncio)."""
+    logger = logging.getLogger(__name__)
+    logger.info("Sử dụng runtime asyncio (add_reader trên fd serial).")
+
+    raw_capture = create_raw_capture()
+    data_decoder = HWT905DataDecoder(
+        debug=args.debug,
+        read_chunk_size=config.SENSOR_READ_CHUNK_SIZE,
+        raw_tee=raw_capture
+    )
+    runtime = AsyncAcquisitionRuntime(
+        connection_manager=connection_manager,
+        data_decoder=data_decoder,
+        storage_manager=create_storage_manager(),
+        running_flag=_running_flag,
+        notifier=notifier
+    )
+    try:
+        asyncio.run(runtime.run())
+    finally:
+        if raw_capture:
+            raw_capture.close()
+
+def run_multi_sensor(args, notifier):
+    """Chạy một pipeline độc lập cho mỗi cảm biến (SENSOR_MULTI_DEVICE=true)."""
+    supervisor = MultiSensorSupervisor(
+        storage_factory=create_storage_manager,
+        raw_capture_factory=create_raw_capture,
+        running_flag=_running_flag,
+        ports=config.SENSOR_PORTS or None,
+        notifier=notifier,
+        debug=args.debug,
+        output_profile=SensorOutputProfile.from_config()
+    )
+    supervisor.run()
 
 def main():
     # Parse command line arguments
@@ -76,21 +201,40 @@ def main():
         signal.signal(signal.SIGTERM, signal_handler)
         _running_flag.set()
 
+        if config.SENSOR_MULTI_DEVICE:
+            run_multi_sensor(args, notifier)
+            return
+
         # 3. Quản lý kết nối cảm biến
         connection_manager = SensorConnectionManager(
             port=config.SENSOR_UART_PORT,
-            baudrate=config.SENSOR_BAUD_RATE
+            baudrate=config.SENSOR_BAUD_RATE,
+            auto_discover=config.SENSOR_AUTO_DISCOVER,
+            output_profile=SensorOutputProfile.from_config()
         )
         
-        # Vòng lặp chính với kết nối lại hoàn toàn
+        if config.PIPELINE_RUNTIME == "asyncio":
+            run_async_runtime(args, connection_manager, notifier)
+            return
+
+        # Decoder, storage và raw capture được tạo một lần và dùng lại qua các lần kết nối lại
+        raw_capture = create_raw_capture()
+        data_decoder = HWT905DataDecoder(
+            debug=args.debug,
+            read_chunk_size=config.SENSOR_READ_CHUNK_SIZE,
+            raw_tee=raw_capture
+        )
+        storage_manager = create_storage_manager()
+
+        # Cặp luồng đọc/giải mã sống qua các lần kết nối lại; chỉ nguồn serial được thay.
+        # Chúng chỉ được tạo lại nếu dừng vì lỗi.
+        reader_thread = None
+        decoder_thread = None
+        pipeline_flag = threading.Event()
+        ready_sent = False
+
+        # Vòng lặp chính: kết nối (lại) và gắn serial vào pipeline
         while _running_flag.is_set():
-            # Initialize variables for this connection attempt
-            ser_instance = None
-            storage_manager = None
-            reader_thread = None
-            decoder_thread = None
-            session_flag = threading.Event()  # Flag riêng cho phiên kết nối này
-            
             try:
                 # Thử kết nối với cảm biến
                 logger.info("Đang thử thiết lập kết nối với cảm biến...")
@@ -98,61 +242,43 @@ def main():
                 
                 if not ser_instance or not ser_instance.is_open:
                     logger.warning("Không thể kết nối tới cảm biến, đang đợi kết nối...")
-                    ser_instance = connection_manager.wait_for_connection()
+                    ser_instance = connection_manager.wait_for_connection(running_flag=_running_flag)
                     if not ser_instance:
                         break  # Người dùng hủy hoặc lỗi nghiêm trọng
                 
                 logger.info("Cảm biến đã được kết nối thành công và sẵn sàng đọc dữ liệu.")
 
-                # 4. Khởi tạo các thành phần cốt lõi cho kết nối này
-                data_decoder = HWT905DataDecoder(
-                    debug=args.debug, 
-                    ser_instance=ser_instance
-                )
-                
-                storage_manager = StorageManager(
-                    base_dir=config.STORAGE_BASE_DIR,
-                    file_rotation_hours=config.STORAGE_FILE_ROTATION_HOURS,
-                    reconnection_strategy=config.STORAGE_RECONNECTION_STRATEGY,
-                    fields_to_write=[
-                        'timestamp', 
-                        'angle_roll', 'angle_pitch', 'angle_yaw',
-                        'temperature'
-                    ]
-                )
-
-                # 5. Thiết lập pipeline mới với session flag
-                raw_data_queue = Queue(maxsize=8192)
-                session_flag.set()  # Bật flag cho phiên này
-
-                reader_thread = SerialReaderThread(
-                    data_decoder=data_decoder, 
-                    raw_data_queue=raw_data_queue, 
-                    running_flag=session_flag,  # Dùng session flag thay vì main flag
-                    connection_manager=connection_manager
-                )
-                
-                decoder_thread = DecoderThread(
-                    data_decoder=data_decoder,
-                    raw_data_queue=raw_data_queue,
-                    running_flag=session_flag,  # Dùng session flag thay vì main flag
-                    storage_manager=storage_manager,
-                    reader_thread=reader_thread
-                )
-
-                # 6. Chạy các luồng
-                logger.info("Bắt đầu các luồng đọc và giải mã...")
-                reader_thread.start()
-                decoder_thread.start()
+                # 4. Gắn kết nối mới vào pipeline đang chạy, hoặc tạo pipeline (lần đầu / sau khi luồng dừng vì lỗi)
+                if reader_thread and reader_thread.is_alive() and decoder_thread.is_alive():
+                    reader_thread.attach_serial(ser_instance)
+                    logger.info("Đã gắn kết nối mới vào pipeline đang chạy.")
+                else:
+                    cleanup_threads(reader_thread, decoder_thread, pipeline_flag)
+                    data_decoder.set_ser_instance(ser_instance)
+                    pipeline_flag = threading.Event()
+                    pipeline_flag.set()
+                    reader_thread, decoder_thread = create_pipeline_threads(
+                        data_decoder=data_decoder,
+                        storage_manager=storage_manager,
+                        running_flag=pipeline_flag,
+                        connection_manager=connection_manager
+                    )
+
+                    # 5. Chạy các luồng
+                    logger.info("Bắt đầu các luồng đọc và giải mã...")
+                    reader_thread.start()
+                    decoder_thread.start()
                 
-                notifier.notify("READY=1")
-                logger.info("Ứng dụng đã sẵn sàng.")
+                if not ready_sent:
+                    notifier.notify("READY=1")
+                    ready_sent = True
+                    logger.info("Ứng dụng đã sẵn sàng.")
 
-                # 7. Vòng lặp giám sát cho kết nối hiện tại
+                # 6. Vòng lặp giám sát cho kết nối hiện tại
                 while _running_flag.is_set():
                     # Kiểm tra trạng thái threads
                     if not reader_thread.is_alive():
-                        logger.warning("Luồng đọc (ReaderThread) đã dừng - có thể mất kết nối")
+                        logger.warning("Luồng đọc (ReaderThread) đã dừng - có thể có lỗi")
                         break
                     
                     if not decoder_thread.is_alive():
@@ -160,34 +286,36 @@ def main():
                         break
 
                     notifier.notify("WATCHDOG=1")
-                    time.sleep(2)
+                    # Thức dậy ngay khi luồng đọc báo mất kết nối thay vì ngủ cố định
+                    if reader_thread.link_lost.wait(timeout=2):
+                        break
                 
                 # Nếu ra khỏi vòng lặp giám sát mà _running_flag vẫn set
                 # có nghĩa là mất kết nối, không phải thoát ứng dụng
                 if _running_flag.is_set():
-                    logger.warning("Phát hiện mất kết nối. Dọn dẹp và chuẩn bị kết nối lại...")
-                    cleanup_threads(reader_thread, decoder_thread, storage_manager, ser_instance, session_flag)
-                    
-                    # Chờ một chút trước khi thử kết nối lại
-                    logger.info("Chờ 3 giây trước khi thử kết nối lại...")
-                    time.sleep(3)
+                    if not (reader_thread.is_alive() and decoder_thread.is_alive()):
+                        # Một luồng đã chết: dừng cả cặp trước khi đóng cổng, lần kết nối sau sẽ tạo lại
+                        cleanup_threads(reader_thread, decoder_thread, pipeline_flag)
+                    connection_manager.close_connection()
+                    # Không chờ cố định: establish_connection/wait_for_connection kết nối lại ngay khi cổng xuất hiện
+                    logger.warning("Phát hiện mất kết nối. Kết nối lại, pipeline và file dữ liệu được giữ nguyên...")
                     continue
-                else:
-                    # _running_flag đã bị clear, nghĩa là cần thoát ứng dụng
-                    logger.info("Nhận lệnh thoát ứng dụng")
-                    cleanup_threads(reader_thread, decoder_thread, storage_manager, ser_instance, session_flag)
-                    break
+                logger.info("Nhận lệnh thoát ứng dụng")
                     
             except Exception as e:
                 logger.error(f"Lỗi trong kết nối hiện tại: {e}", exc_info=True)
-                cleanup_threads(reader_thread, decoder_thread, storage_manager, ser_instance, session_flag)
+                connection_manager.close_connection()
                 
                 if _running_flag.is_set():
                     logger.info("Chờ 5 giây trước khi thử kết nối lại sau lỗi...")
                     time.sleep(5)
-                    continue
-                else:
-                    break
+
+        # 7. Dừng pipeline: xử lý hết dữ liệu đang chờ rồi đóng file
+        cleanup_threads(reader_thread, decoder_thread, pipeline_flag)
+        shutdown_storage(storage_manager)
+        if raw_capture:
+            raw_capture.close()
+        connection_manager.close_connection()
             
     except Exception as e:
         logger.critical(f"Lỗi nghiêm trọng không mong muốn trong hàm main: {e}", exc_info=True)
@@ -0,0 +1,143 @@
+# scripts/bench_common.py
+
+"""
+Tiện ích dùng chung cho các kịch bản benchmark: sinh luồng byte HWT905
+tổng hợp và một nguồn serial giả lập trong bộ nhớ.
+"""
+import os
+import pty
+import random
+import struct
+import sys
+import threading
+import time
+from typing import Optional, Sequence
+
+# Add project root to the Python path to allow importing from 'src'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.sensors.hwt905_constants import (
+    DATA_PACKET_LENGTH,
+    PACKET_TYPE_ACC, PACKET_TYPE_GYRO, PACKET_TYPE_ANGLE, PACKET_TYPE_MAG
+)
+from src.sensors.hwt905_protocol import build_data_packet
+
+DEFAULT_CYCLE_TYPES = (PACKET_TYPE_ACC, PACKET_TYPE_GYRO, PACKET_TYPE_ANGLE, PACKET_TYPE_MAG)
+
+
+def make_frame_stream(cycles: int,
+                      packet_types: Sequence[int] = DEFAULT_CYCLE_TYPES,
+                      noise_ratio: float = 0.0,
+                      seed: int = 905) -> bytes:
+    """
+    Sinh một luồng byte gồm `cycles` chu kỳ output, mỗi chu kỳ một gói cho mỗi loại trong packet_types.
+    Với noise_ratio > 0, một phần gói tin bị hỏng checksum hoặc chèn byte rác để kiểm tra đồng bộ lại.
+    """
+    rng = random.Random(seed)
+    out = bytearray()
+    for i in range(cycles):
+        for packet_type in packet_types:
+            values = [rng.randint(-32768, 32767) for _ in range(3)] + [2500 + (i % 100)]
+            frame = bytearray(build_data_packet(packet_type, struct.pack('<hhhh', *values)))
+            if noise_ratio and rng.random() < noise_ratio:
+                if rng.random() < 0.5:
+                    frame[-1] ^= 0xFF  # Hỏng checksum
+                else:
+                    out += bytes(rng.randint(0, 255) for _ in range(rng.randint(1, 7)))  # Byte rác
+            out += frame
+    return bytes(out)
+
+
+class MemorySerial:
+    """
+    Nguồn serial giả lập đọc từ một khối bytes trong bộ nhớ.
+    Chỉ cài đặt phần giao diện mà HWT905DataDecoder dùng (read, readinto, in_waiting, is_open).
+    in_waiting bị giới hạn bởi kernel_buffer để mô phỏng bộ đệm driver.
+    """
+
+    def __init__(self, data: bytes, kernel_buffer: int = 4096):
+        self._data = data
+        self._pos = 0
+        self._kernel_buffer = kernel_buffer
+        self.is_open = True
+        self.read_calls = 0
+
+    @property
+    def in_waiting(self) -> int:
+        return min(len(self._data) - self._pos, self._kernel_buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        self.read_calls += 1
+        chunk = self._data[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        return chunk
+
+    def readinto(self, buffer) -> int:
+        self.read_calls += 1
+        size = min(len(buffer), len(self._data) - self._pos)
+        buffer[:size] = self._data[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def close(self):
+        self.is_open = False
+
+
+class PtySensor:
+    """
+    Một cảm biến giả lập: phát lặp lại một luồng gói tin vào đầu master của pty.
+    Với link_path, một symlink ổn định trỏ tới đầu slave được tạo khi start() và xóa khi unplug(),
+    mô phỏng node thiết bị xuất hiện/biến mất khi cắm/rút cáp.
+    """
+
+    def __init__(self, stream: bytes, rate_hz: float, link_path: Optional[str] = None):
+        self.master_fd, self.slave_fd = pty.openpty()
+        self.tty_name = os.ttyname(self.slave_fd)
+        self.link_path = link_path
+        self.port = link_path or self.tty_name
+        self.stream = stream
+        self.rate_hz = rate_hz
+        self.cycle_bytes = len(DEFAULT_CYCLE_TYPES) * DATA_PACKET_LENGTH
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        if self.link_path:
+            tmp_path = f"{self.link_path}.tmp"
+            os.symlink(self.tty_name, tmp_path)
+            os.replace(tmp_path, self.link_path)  # Xuất hiện nguyên tử, giống udev
+
+    def _write_loop(self):
+        view = memoryview(self.stream)
+        pos = 0
+        # Ghi theo từng lát 10 ms để giữ nhịp mà không tốn một syscall cho mỗi chu kỳ
+        slice_cycles = max(1, int(self.rate_hz / 100)) if self.rate_hz else 64
+        slice_bytes = slice_cycles * self.cycle_bytes
+        next_time = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if pos + slice_bytes > len(view):
+                    pos = 0
+                os.write(self.master_fd, view[pos:pos + slice_bytes])
+                pos += slice_bytes
+                if self.rate_hz:
+                    next_time += slice_cycles / self.rate_hz
+                    delay = next_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        except OSError:
+            pass  # pty đã bị đóng
+
+    def unplug(self):
+        """Mô phỏng rút cáp: xóa symlink, dừng phát và đóng cả hai đầu pty."""
+        self._stop.set()
+        if self.link_path and os.path.lexists(self.link_path):
+            os.remove(self.link_path)
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# scripts/bench_decode.py
+
+"""
+So sánh chi phí giải mã mỗi gói giữa decoder tham chiếu (PacketDecoderFactory, các lớp
+trong src/sensors/decoders) và StructPacketDecoder (struct biên dịch sẵn, unpack_from
+trực tiếp trên frame).
+
+Với mỗi packet type đo:
+    tham chiếu : factory.decode_packet(type, frame[2:10]) như _decode_packet trước đây
+    struct     : struct_decoder.decode_frame(frame)
+và chi phí toàn bộ HWT905DataDecoder.decode_raw_packet với từng đường giải mã.
+Trước khi đo, kết quả của hai đường được so khớp trên toàn bộ mẫu.
+Với các khối gói hỗn hợp (ACC/GYRO/ANGLE/MAG) theo từng kích thước lô, so sánh
+giải mã từng gói bằng struct với NumpyBatchDecoder (cột NumPy theo packet type).
+Cuối cùng đo bằng tracemalloc bộ nhớ và số khối cấp phát mà kết quả giải mã của mỗi gói góc
+chiếm: dict đầy đủ (chế độ --debug), dict payload và bản ghi gọn (AngleSample).
+
+Chạy: python3 scripts/bench_decode.py --frames 20000 --repeat 5 --block-sizes 16 256 4096
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from typing import Callable, List
+
+from bench_common import make_frame_stream
+
+from src.sensors.decoders import NumpyBatchDecoder, PacketDecoderFactory, StructPacketDecoder
+from src.sensors.decoders.struct_decoder import PAYLOAD_LAYOUTS
+from src.sensors.hwt905_constants import DATA_PACKET_LENGTH, PACKET_TYPE_ANGLE
+from src.sensors.hwt905_data_decoder import HWT905DataDecoder
+from src.sensors.hwt905_protocol import build_data_packet
+
+
+def make_frames(packet_type: int, count: int, seed: int = 905) -> List[bytes]:
+    rng = random.Random(seed + packet_type)
+    return [build_data_packet(packet_type, bytes(rng.randrange(256) for _ in range(8))) for _ in range(count)]
+
+
+def ns_per_call(func: Callable, frames: List[bytes], repeat: int) -> float:
+    """Thời gian tốt nhất trong `repeat` lần chạy, tính theo ns mỗi gói."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for frame in frames:
+            func(frame)
+        best = min(best, (time.perf_counter_ns() - start) / len(frames))
+    return best
+
+
+def allocations_per_frame(func: Callable, frames: List[bytes]):
+    """Bộ nhớ (bytes) và số khối cấp phát còn giữ cho mỗi kết quả giải mã, đo bằng tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [func(frame) for frame in frames]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    del kept
+    return size / len(frames), blocks / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-frame decode cost: reference decoders vs struct decoder')
+    parser.add_argument('--frames', type=int, default=20000, help='Số gói mỗi packet type')
+    parser.add_argument('--repeat', type=int, default=5, help='Số lần lặp, lấy kết quả tốt nhất')
+    parser.add_argument('--block-sizes', type=int, nargs='+', default=[16, 256, 4096],
+                        help='Số gói mỗi khối khi đo giải mã theo lô')
+    args = parser.parse_args()
+
+    factory = PacketDecoderFactory()
+    struct_decoder = StructPacketDecoder()
+
+    def reference(frame):
+        return factory.decode_packet(frame[1], frame[2:DATA_PACKET_LENGTH - 1])
+
+    print(f"{'Packet type':<24}{'tham chiếu':>12}{'struct':>10}{'nhanh hơn':>11}")
+    total_reference = total_struct = 0.0
+    for packet_type in PAYLOAD_LAYOUTS:
+        frames = make_frames(packet_type, args.frames)
+        mismatches = sum(1 for frame in frames if reference(frame) != struct_decoder.decode_frame(frame))
+        if mismatches:
+            print(f"0x{packet_type:02X}: {mismatches} gói giải mã khác nhau giữa hai đường!")
+        reference_ns = ns_per_call(reference, frames, args.repeat)
+        struct_ns = ns_per_call(struct_decoder.decode_frame, frames, args.repeat)
+        total_reference += reference_ns
+        total_struct += struct_ns
+        name = f"0x{packet_type:02X} {factory.get_packet_type_name(packet_type)}"
+        print(f"{name:<24}{reference_ns:>9.0f} ns{struct_ns:>7.0f} ns{reference_ns / struct_ns:>10.2f}x")
+    count = len(PAYLOAD_LAYOUTS)
+    print(f"{'Trung bình':<24}{total_reference / count:>9.0f} ns{total_struct / count:>7.0f} ns"
+          f"{total_reference / total_struct:>10.2f}x")
+
+    # Toàn bộ decode_raw_packet (gồm dict metadata) trên gói góc, như luồng giải mã gọi
+    frames = make_frames(PACKET_TYPE_ANGLE, args.frames)
+    full_reference = ns_per_call(HWT905DataDecoder(struct_decode=False).decode_raw_packet, frames, args.repeat)
+    full_struct = ns_per_call(HWT905DataDecoder(struct_decode=True).decode_raw_packet, frames, args.repeat)
+    print(f"decode_raw_packet (ANGLE): tham chiếu {full_reference:.0f} ns, struct {full_struct:.0f} ns "
+          f"({full_reference / full_struct:.2f}x)")
+
+    # Giải mã theo lô: từng gói bằng struct so với cột NumPy cho cả khối
+    batch_decoder = NumpyBatchDecoder()
+    stream = make_frame_stream(max(args.block_sizes) // 4 + 1)
+    print(f"{'Lô (gói)':<12}{'struct/gói':>12}{'numpy/gói':>12}{'nhanh hơn':>11}")
+    for block_size in args.block_sizes:
+        block = stream[:block_size * DATA_PACKET_LENGTH]
+        frames = [block[i:i + DATA_PACKET_LENGTH] for i in range(0, len(block), DATA_PACKET_LENGTH)]
+        timestamps = [i * 0.001 for i in range(block_size)]
+        rounds = max(1, args.frames // block_size)
+
+        def per_frame(_):
+            for frame in frames:
+                struct_decoder.decode_frame(frame)
+
+        def per_block(_):
+            batch_decoder.decode_block(frames, timestamps)
+
+        struct_ns = ns_per_call(per_frame, range(rounds), args.repeat) / block_size
+        numpy_ns = ns_per_call(per_block, range(rounds), args.repeat) / block_size
+        print(f"{block_size:<12}{struct_ns:>9.0f} ns{numpy_ns:>9.0f} ns{struct_ns / numpy_ns:>10.2f}x")
+
+    # Cấp phát cho mỗi gói góc theo dạng kết quả giải mã
+    frames = make_frames(PACKET_TYPE_ANGLE, min(args.frames, 10000))
+    verbose_decoder = HWT905DataDecoder(debug=False)
+    print(f"{'Dạng kết quả (ANGLE)':<30}{'bytes/gói':>10}{'khối/gói':>10}{'thời gian':>11}")
+    for label, func in (("dict đầy đủ (--debug)", verbose_decoder.decode_raw_packet),
+                        ("dict payload (struct)", struct_decoder.decode_frame),
+                        ("bản ghi gọn (AngleSample)", verbose_decoder.decode_record)):
+        size, blocks = allocations_per_frame(func, frames)
+        print(f"{label:<30}{size:>10.0f}{blocks:>10.1f}{ns_per_call(func, frames, args.repeat):>8.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# scripts/bench_framing.py
+
+"""
+So sánh bộ tách gói theo khối (HWT905DataDecoder.read_raw_packets) với cách đọc
+từng byte cũ (read(1) tìm header rồi read(10)) trên cùng một luồng byte.
+
+Mặc định luồng được phát từ bộ nhớ (chỉ đo chi phí Python). Với --pty, luồng được ghi
+qua một pseudo-terminal và đọc bằng serial.Serial thật, nên đo cả chi phí syscall.
+
+Chạy: python3 scripts/bench_framing.py --cycles 20000 --noise 0.01 [--pty]
+"""
+import argparse
+import os
+import pty
+import threading
+import time
+from typing import List, Optional
+
+import serial
+
+from bench_common import make_frame_stream, MemorySerial
+
+from src.sensors.hwt905_constants import DATA_HEADER_BYTE, DATA_PACKET_LENGTH
+from src.sensors.hwt905_protocol import is_valid_data_packet
+from src.sensors.hwt905_data_decoder import HWT905DataDecoder
+
+
+PTY_READ_TIMEOUT = 0.2
+
+
+def open_pty_source(stream: bytes) -> serial.Serial:
+    """Mở một cặp pty, phát stream vào đầu master ở luồng nền và trả về serial.Serial trên đầu slave."""
+    master_fd, slave_fd = pty.openpty()
+    tty_name = os.ttyname(slave_fd)
+    ser = serial.Serial(tty_name, baudrate=921600, timeout=PTY_READ_TIMEOUT)
+    os.close(slave_fd)
+
+    def _writer():
+        view = memoryview(stream)
+        while view:
+            written = os.write(master_fd, view[:4096])
+            view = view[written:]
+
+    threading.Thread(target=_writer, daemon=True).start()
+    return ser
+
+
+def make_source(stream: bytes, use_pty: bool):
+    return open_pty_source(stream) if use_pty else MemorySerial(stream)
+
+
+def legacy_read_raw_packet(ser) -> Optional[bytes]:
+    """Bản sao đường đọc cũ: read(1) cho tới khi gặp 0x55, sau đó read(10)."""
+    while ser.is_open:
+        header_byte = ser.read(1)
+        if not header_byte:
+            return None
+        if header_byte[0] == DATA_HEADER_BYTE:
+            remaining_data = ser.read(DATA_PACKET_LENGTH - 1)
+            if len(remaining_data) < (DATA_PACKET_LENGTH - 1):
+                continue
+            full_packet = header_byte + remaining_data
+            if is_valid_data_packet(full_packet):
+                return full_packet
+    return None
+
+
+def run_legacy(stream: bytes, use_pty: bool) -> (List[bytes], float, float):
+    ser = make_source(stream, use_pty)
+    frames = []
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    while True:
+        packet = legacy_read_raw_packet(ser)
+        if packet is None:
+            break
+        frames.append(packet)
+    elapsed, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    ser.close()
+    return frames, elapsed - (PTY_READ_TIMEOUT if use_pty else 0.0), cpu
+
+
+def run_chunked(stream: bytes, chunk_size: int, use_pty: bool) -> (List[bytes], float, float):
+    ser = make_source(stream, use_pty)
+    decoder = HWT905DataDecoder(ser_instance=ser, read_chunk_size=chunk_size)
+    frames = []
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    while True:
+        batch = decoder.read_raw_packets()
+        if not batch:
+            break
+        frames.extend(batch)
+    elapsed, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    ser.close()
+    return frames, elapsed - (PTY_READ_TIMEOUT if use_pty else 0.0), cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark framing engine vs. byte-at-a-time reader')
+    parser.add_argument('--cycles', type=int, default=20000, help='Số chu kỳ output (4 gói/chu kỳ)')
+    parser.add_argument('--noise', type=float, default=0.0, help='Tỉ lệ gói bị hỏng/chèn rác (0-1)')
+    parser.add_argument('--chunk-size', type=int, default=4096, help='read_chunk_size cho bộ tách theo khối')
+    parser.add_argument('--pty', action='store_true', help='Phát luồng qua pseudo-terminal thay vì bộ nhớ')
+    args = parser.parse_args()
+
+    stream = make_frame_stream(args.cycles, noise_ratio=args.noise)
+    source = "pty" if args.pty else "bộ nhớ"
+    print(f"Luồng thử: {len(stream)} bytes, {args.cycles} chu kỳ, noise={args.noise}, nguồn: {source}")
+
+    legacy_frames, legacy_time, legacy_cpu = run_legacy(stream, args.pty)
+    chunked_frames, chunked_time, chunked_cpu = run_chunked(stream, args.chunk_size, args.pty)
+
+    if legacy_frames != chunked_frames:
+        # Đường cũ bỏ qua cả 11 byte khi sai checksum nên có thể mất gói hợp lệ nằm chồng lên đó
+        print(f"Ghi chú: số gói khác nhau ({len(legacy_frames)} cũ vs {len(chunked_frames)} mới) "
+              f"do đường cũ không đồng bộ lại bên trong gói hỏng")
+
+    for name, frames, elapsed, cpu in (
+        ("legacy read(1)", legacy_frames, legacy_time, legacy_cpu),
+        ("chunked framing", chunked_frames, chunked_time, chunked_cpu),
+    ):
+        count = max(len(frames), 1)
+        rate = len(frames) / elapsed if elapsed > 0 else float('inf')
+        print(f"{name:>16}: {len(frames)} gói, {elapsed * 1000:.1f} ms, {rate:,.0f} gói/s, "
+              f"CPU {cpu / count * 1e6:.2f} us/gói")
+
+    if chunked_cpu > 0:
+        print(f"Giảm CPU: x{legacy_cpu / chunked_cpu:.1f}")
+
+
+if __name__ == "__main__":
+    main()
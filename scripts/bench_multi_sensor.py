@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# scripts/bench_multi_sensor.py
+
+"""
+Đo thông lượng của chế độ nhiều cảm biến (MultiSensorSupervisor) với 1, 2, 4... cảm biến
+giả lập qua pseudo-terminal. Mỗi cảm biến được phát bởi một luồng ghi riêng vào đầu master
+của một pty; supervisor mở đầu slave như một cổng serial thật và lưu CSV vào thư mục tạm.
+
+--rate là tần số output của mỗi cảm biến (chu kỳ/s, mỗi chu kỳ 4 gói); --rate 0 phát nhanh
+nhất có thể để tìm giới hạn. Với --disconnect, cảm biến đầu tiên bị ngắt giữa chừng để kiểm
+tra rằng các cảm biến còn lại không bị ảnh hưởng.
+
+Chạy: python3 scripts/bench_multi_sensor.py --sensors 1 2 4 --duration 10 [--rate 0] [--disconnect]
+"""
+import argparse
+import logging
+import os
+import resource
+import tempfile
+import threading
+import time
+
+from bench_common import make_frame_stream, PtySensor
+
+from src.storage.storage_manager import StorageManager
+from src.core.multi_sensor import MultiSensorSupervisor
+
+
+def run_case(sensor_count: int, duration: float, rate_hz: float, disconnect: bool, base_dir: str) -> dict:
+    stream = make_frame_stream(20000, seed=905)
+    sensors = [PtySensor(stream, rate_hz) for _ in range(sensor_count)]
+    for sensor in sensors:
+        sensor.start()
+
+    def storage_factory(device_id: str) -> StorageManager:
+        return StorageManager(
+            base_dir=os.path.join(base_dir, f"n{sensor_count}", device_id),
+            file_rotation_hours=1,
+            fields_to_write=['timestamp', 'angle_roll', 'angle_pitch', 'angle_yaw', 'temperature', 'device_id']
+        )
+
+    running_flag = threading.Event()
+    running_flag.set()
+    supervisor = MultiSensorSupervisor(
+        storage_factory=storage_factory,
+        running_flag=running_flag,
+        ports=[sensor.port for sensor in sensors],
+        watchdog_interval=0.2
+    )
+    supervisor_thread = threading.Thread(target=supervisor.run, daemon=True)
+    supervisor_thread.start()
+
+    # Chờ mọi pipeline kết nối rồi mới bắt đầu đo
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and not (
+            len(supervisor.pipelines) == sensor_count and all(p.connected for p in supervisor.pipelines.values())):
+        time.sleep(0.05)
+
+    def snapshot():
+        return {p.device_id: p.total_saved() for p in supervisor.pipelines.values()}
+
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    start, wall_start = snapshot(), time.monotonic()
+    half, half_time = start, None
+    if disconnect and sensor_count > 1:
+        time.sleep(duration / 2)
+        half, half_time = snapshot(), time.monotonic()
+        sensors[0].unplug()
+        time.sleep(duration / 2)
+    else:
+        time.sleep(duration)
+    end, wall_end = snapshot(), time.monotonic()
+    cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+
+    running_flag.clear()
+    supervisor_thread.join(timeout=15)
+    for sensor in sensors:
+        sensor.unplug()
+
+    elapsed = wall_end - wall_start
+    cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+    per_sensor = {device_id: (end[device_id] - start.get(device_id, 0)) / elapsed for device_id in end}
+    result = {
+        "per_sensor": per_sensor,
+        "total": sum(per_sensor.values()),
+        "cpu_percent": cpu / elapsed * 100,
+    }
+    if half_time is not None:
+        second_half = wall_end - half_time
+        result["after_disconnect"] = {device_id: (end[device_id] - half[device_id]) / second_half for device_id in end}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-sensor throughput benchmark over pseudo-terminals')
+    parser.add_argument('--sensors', type=int, nargs='+', default=[1, 2, 4], help='Số cảm biến cho từng lần chạy')
+    parser.add_argument('--duration', type=float, default=10.0, help='Thời gian đo mỗi lần chạy (giây)')
+    parser.add_argument('--rate', type=float, default=200.0, help='Chu kỳ output/s của mỗi cảm biến, 0 = nhanh nhất có thể')
+    parser.add_argument('--disconnect', action='store_true', help='Ngắt cảm biến đầu tiên giữa chừng')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(message)s')
+    rate_label = f"{args.rate:.0f} chu kỳ/s mỗi cảm biến" if args.rate else "nhanh nhất có thể"
+    print(f"Nguồn: pty, {rate_label}, đo {args.duration:.0f}s mỗi lần. Đơn vị: dòng góc đã lưu/s.")
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        for count in args.sensors:
+            result = run_case(count, args.duration, args.rate, args.disconnect, base_dir)
+            rates = ", ".join(f"{device_id} {rate:.0f}" for device_id, rate in sorted(result["per_sensor"].items()))
+            print(f"{count} cảm biến: tổng {result['total']:.0f}/s, CPU {result['cpu_percent']:.1f}% ({rates})")
+            if "after_disconnect" in result:
+                rates = ", ".join(f"{device_id} {rate:.0f}" for device_id, rate in sorted(result["after_disconnect"].items()))
+                print(f"    sau khi ngắt cảm biến đầu tiên: {rates}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# scripts/bench_reconnect.py
+
+"""
+Đo độ trễ kết nối lại sau khi cảm biến bị rút rồi cắm lại.
+
+Cảm biến được giả lập bằng một pty có symlink ổn định (giống /dev/serial/by-id): khi "rút",
+symlink bị xóa và pty bị đóng; sau --gap giây một pty mới xuất hiện dưới cùng symlink.
+Một SensorPipeline (cùng đường kết nối lại với chế độ nhiều cảm biến) đọc từ symlink đó.
+Độ trễ được tính từ lúc symlink xuất hiện tới khi dòng dữ liệu đầu tiên được lưu.
+
+Chạy: python3 scripts/bench_reconnect.py --cycles 10 --gap 1.0 [--mode auto|inotify|poll]
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from bench_common import make_frame_stream, PtySensor
+
+from src import config
+from src.storage.storage_manager import StorageManager
+from src.core.multi_sensor import SensorPipeline
+
+
+def wait_for_rows(pipeline: SensorPipeline, baseline: int, timeout: float) -> bool:
+    """Chờ tới khi pipeline lưu thêm ít nhất một dòng so với baseline."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pipeline.total_saved() > baseline:
+            return True
+        time.sleep(0.001)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconnect latency benchmark with a disappearing pty sensor')
+    parser.add_argument('--cycles', type=int, default=10, help='Số lần rút/cắm lại')
+    parser.add_argument('--gap', type=float, default=1.0, help='Thời gian cảm biến vắng mặt mỗi lần (giây)')
+    parser.add_argument('--rate', type=float, default=200.0, help='Chu kỳ output/s của cảm biến')
+    parser.add_argument('--mode', choices=['auto', 'inotify', 'poll'], default=config.SENSOR_HOTPLUG_MODE,
+                        help='Cách phát hiện cắm lại (SENSOR_HOTPLUG_MODE)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, format='%(levelname)s %(message)s')
+    config.SENSOR_HOTPLUG_MODE = args.mode
+    stream = make_frame_stream(5000, seed=905)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        link_path = os.path.join(work_dir, "hwt905")
+        sensor = PtySensor(stream, args.rate, link_path=link_path)
+        sensor.start()
+
+        running_flag = threading.Event()
+        running_flag.set()
+        pipeline = SensorPipeline(
+            port=link_path,
+            device_id="bench",
+            storage_factory=lambda device_id: StorageManager(
+                base_dir=os.path.join(work_dir, device_id),
+                file_rotation_hours=1,
+                fields_to_write=['timestamp', 'angle_roll', 'angle_pitch', 'angle_yaw', 'temperature', 'device_id']
+            ),
+            running_flag=running_flag
+        )
+        pipeline.start()
+        if not wait_for_rows(pipeline, 0, 10):
+            print("Không nhận được dữ liệu ban đầu")
+            return
+
+        latencies = []
+        for cycle in range(args.cycles):
+            time.sleep(0.5)
+            sensor.unplug()
+            while pipeline.connected:
+                time.sleep(0.001)
+            time.sleep(args.gap)
+
+            baseline = pipeline.total_saved()
+            sensor = PtySensor(stream, args.rate, link_path=link_path)
+            plugged_at = time.monotonic()
+            sensor.start()
+            if wait_for_rows(pipeline, baseline, 15):
+                latencies.append((time.monotonic() - plugged_at) * 1000)
+            else:
+                print(f"Lần {cycle + 1}: không kết nối lại được trong 15 giây")
+
+        running_flag.clear()
+        pipeline.stop()
+        pipeline.join(timeout=5)
+        sensor.unplug()
+
+    mode = pipeline.connection_manager._hotplug_watcher.mode if pipeline.connection_manager._hotplug_watcher else args.mode
+    if latencies:
+        print(f"Watcher: {mode}, {len(latencies)}/{args.cycles} lần kết nối lại, vắng mặt {args.gap:.1f}s mỗi lần")
+        print(f"Cắm lại -> dòng đầu tiên được lưu: trung vị {statistics.median(latencies):.1f} ms, "
+              f"min {min(latencies):.1f} ms, max {max(latencies):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# scripts/bench_replay.py
+
+"""
+Phát lại một file raw capture qua toàn bộ pipeline đọc -> giải mã -> StorageManager
+(ReplaySerial thay cho cổng serial) và đo cho từng cấu hình pipeline:
+gói/s, thời gian CPU cho mỗi gói và RSS đỉnh.
+
+Mỗi cấu hình chạy trong một tiến trình con riêng để RSS đỉnh (ru_maxrss) không bị lẫn
+giữa các lần chạy. CSV được ghi vào thư mục tạm và bị xóa sau khi đo.
+Không có file capture thì dùng --generate để tạo một file tổng hợp bằng HWT905FrameSynthesizer.
+Nguồn có thể là file byte thô, segment raw capture (.hwtraw) hoặc thư mục segment.
+--raw-tee bật RawCaptureWriter trong luồng đọc để đo chi phí của raw capture.
+--fields/--row-mode chọn cột lưu trữ và cách tạo dòng (ví dụ toàn bộ IMU, một dòng rộng mỗi chu kỳ).
+--decode-mode lazy lưu gói thô (RawFrameStorageManager) thay cho CSV đã giải mã; thời gian giải mã
+theo lô khi đọc lại các file được đo riêng.
+--flush-ms/--fsync-policy/--fsync-seconds đặt chính sách ghi của StorageManager; số lần flush/fsync,
+thời gian fsync và độ trễ từ lúc đọc serial tới khi dữ liệu được flush/fsync được in kèm (kể từ lần log định kỳ cuối
+của luồng giải mã, tức tối đa 10 giây cuối). Chạy --realtime để độ trễ phản ánh nhịp thật của cảm biến.
+--writer-thread ghi qua BackgroundStorageWriter (luồng ghi nền, bộ đệm kép, --writer-overflow block|spill);
+--stall-ms/--stall-every giả lập thẻ SD khựng (mỗi --stall-every giây, một lần ghi bị trễ --stall-ms) để so
+độ trễ lô tối đa của luồng giải mã khi ghi trực tiếp và khi ghi qua luồng nền.
+
+Chạy: python3 scripts/bench_replay.py capture.bin --transports queue ring [--realtime --rate 200]
+      python3 scripts/bench_replay.py --generate 200000 --content DEFAULT_RSW_VALUE [--raw-tee]
+      python3 scripts/bench_replay.py data/raw --transports queue
+      python3 scripts/bench_replay.py capture.bin --row-mode cycle --fields acc_x acc_y acc_z angle_roll temperature
+      python3 scripts/bench_replay.py capture.bin --realtime --flush-ms 200 --fsync-policy interval --fsync-seconds 2
+      python3 scripts/bench_replay.py --generate 4000 --realtime --stall-ms 300 --stall-every 2 [--writer-thread]
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from bench_common import project_root
+
+from src.core.async_data_manager import create_pipeline_threads
+from src.sensors.hwt905_configurator import resolve_rsw_value
+from src.sensors.hwt905_constants import DATA_PACKET_LENGTH
+from src.sensors.hwt905_data_decoder import HWT905DataDecoder
+from src.sensors.hwt905_simulator import HWT905FrameSynthesizer, MotionModel
+from src.sensors.replay_serial import ReplaySerial
+from src.storage.background_writer import BackgroundStorageWriter, format_writer_stats
+from src.storage.frame_storage import RawFrameStorageManager, decode_frame_file
+from src.storage.raw_capture import RawCaptureWriter
+from src.storage.storage_manager import StorageManager, format_durability_stats
+
+
+def generate_capture(path: str, cycles: int, rsw: int, rate_hz: float):
+    """Ghi một file capture tổng hợp gồm `cycles` chu kỳ output."""
+    synthesizer = HWT905FrameSynthesizer(MotionModel(), rsw)
+    start = time.time()
+    with open(path, 'wb') as f:
+        for i in range(cycles):
+            t = i / rate_hz
+            f.write(synthesizer.cycle(t, start + t))
+
+
+def wait_drained(decoder_thread):
+    """Chờ tới khi luồng giải mã xử lý hết dữ liệu trong hàng đợi / ring buffer."""
+    if decoder_thread.raw_data_queue is not None:
+        decoder_thread.raw_data_queue.join()
+        return
+    while decoder_thread.is_alive() and decoder_thread.ring_buffer.fill_level >= DATA_PACKET_LENGTH:
+        time.sleep(0.001)
+
+
+def inject_stalls(storage_manager, stall_ms: float, every_s: float):
+    """Giả lập thẻ SD khựng: cứ mỗi every_s giây, một lần ghi lô bị trễ thêm stall_ms."""
+    name = 'write_frames' if getattr(storage_manager, 'stores_frames', False) else 'write_batch'
+    write = getattr(storage_manager, name)
+    next_stall = [time.monotonic() + every_s]
+
+    def stalling_write(items, captured_at=None):
+        now = time.monotonic()
+        if now >= next_stall[0]:
+            next_stall[0] = now + every_s
+            time.sleep(stall_ms / 1000)
+        write(items, captured_at)
+
+    setattr(storage_manager, name, stalling_write)
+
+
+DEFAULT_FIELDS = ['angle_roll', 'angle_pitch', 'angle_yaw', 'temperature']
+
+
+def run_config(capture: str, transport: str, chunk_size: int, realtime: bool, rate_hz: float,
+               raw_tee: bool = False, fields=DEFAULT_FIELDS, row_mode: str = 'angle',
+               decode_mode: str = 'eager', durability: Optional[dict] = None,
+               writer: Optional[dict] = None, stall: Optional[tuple] = None) -> dict:
+    """Chạy một cấu hình trong tiến trình hiện tại và trả về số liệu đo."""
+    replay = ReplaySerial(capture, realtime=realtime, output_rate_hz=rate_hz)
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        raw_capture = RawCaptureWriter(os.path.join(storage_dir, 'raw')) if raw_tee else None
+        data_decoder = HWT905DataDecoder(ser_instance=replay, read_chunk_size=chunk_size, raw_tee=raw_capture)
+        fields_to_write = ['timestamp'] + list(fields) + (['cycle_complete'] if row_mode == 'cycle' else [])
+        if decode_mode == 'lazy':
+            storage_manager = RawFrameStorageManager(base_dir=storage_dir, file_rotation_hours=24,
+                                                     fields_to_write=fields_to_write, row_mode=row_mode)
+        else:
+            storage_manager = StorageManager(base_dir=storage_dir, file_rotation_hours=24,
+                                             fields_to_write=fields_to_write)
+        if durability:
+            storage_manager.configure_durability(**durability)
+        if stall:
+            inject_stalls(storage_manager, *stall)
+        if writer is not None:
+            storage_manager = BackgroundStorageWriter(storage_manager, **writer)
+        running_flag = threading.Event()
+        running_flag.set()
+        reader_thread, decoder_thread = create_pipeline_threads(
+            data_decoder=data_decoder,
+            storage_manager=storage_manager,
+            running_flag=running_flag,
+            transport=transport,
+            lossless=True,  # Nguồn file không có thời gian thực: chờ thay vì bỏ dữ liệu
+            row_mode=row_mode
+        )
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        reader_thread.start()
+        decoder_thread.start()
+        while not replay.exhausted:
+            time.sleep(0.01)
+        # Hết file: dừng luồng đọc (đẩy nốt lô đang gom), chờ luồng giải mã xử lý hết rồi mới chốt thời gian
+        running_flag.clear()
+        reader_thread.join()
+        wait_drained(decoder_thread)
+        # Độ trễ lô tối đa trước khi luồng giải mã đóng file (close_current_file chờ luồng ghi ghi hết)
+        batch_latency_max = getattr(decoder_thread, 'batch_latency_max', 0.0)
+        if raw_capture:
+            raw_capture.close()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        decoder_thread.join()
+        writer_stats = None
+        if writer is not None:
+            storage_manager.stop()
+            writer_stats = storage_manager.writer_stats(reset=False)
+
+        read_decode_s = 0.0
+        if decode_mode == 'lazy':
+            read_start = time.process_time()
+            for name in os.listdir(storage_dir):
+                if name.endswith('.hwtfrm'):
+                    decode_frame_file(os.path.join(storage_dir, name))
+            read_decode_s = time.process_time() - read_start
+
+    # Gói bị bỏ qua theo mask giải mã vẫn đi qua luồng đọc/tách gói, nên được tính vào tổng;
+    # ở chế độ lazy, gói được lưu thô thay vì giải mã
+    frames = decoder_thread.total_decoded_count + decoder_thread.total_skipped_count
+    if decode_mode == 'lazy':
+        frames += decoder_thread.total_saved_count
+    return {
+        "transport": transport,
+        "chunk_size": chunk_size,
+        "raw_tee": raw_tee,
+        "decode_mode": decode_mode,
+        "read_decode_s": read_decode_s,
+        "frames": frames,
+        "skipped": decoder_thread.total_skipped_count,
+        "rows": decoder_thread.total_saved_count,
+        "incomplete": decoder_thread.assembler.incomplete_count if decoder_thread.assembler else 0,
+        "durability": storage_manager.durability_stats(reset=False),
+        "writer": writer_stats,
+        "batch_latency_max_ms": batch_latency_max * 1000,
+        "bytes": replay.bytes_read,
+        "wall_s": wall,
+        "frames_per_s": frames / wall if wall else 0.0,
+        "cpu_us_per_frame": cpu / frames * 1e6 if frames else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a raw capture through the full pipeline')
+    parser.add_argument('capture', nargs='?', help='File byte thô, segment raw capture hoặc thư mục segment')
+    parser.add_argument('--generate', type=int, default=0, help='Tạo file capture tổng hợp với N chu kỳ')
+    parser.add_argument('--content', default='DEFAULT_RSW_VALUE', help='Nội dung output của file tổng hợp (RSW)')
+    parser.add_argument('--transports', nargs='+', default=['queue', 'ring'], choices=['queue', 'ring'])
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[4096], help='read_chunk_size cần thử')
+    parser.add_argument('--realtime', action='store_true', help='Phát theo thời gian thực thay vì nhanh nhất có thể')
+    parser.add_argument('--rate', type=float, default=200.0, help='Tần số output của file capture (Hz)')
+    parser.add_argument('--raw-tee', action='store_true', help='Ghi kèm raw capture trong luồng đọc')
+    parser.add_argument('--fields', nargs='+', default=DEFAULT_FIELDS, help='Cột lưu trữ (ngoài timestamp)')
+    parser.add_argument('--row-mode', default='angle', choices=['angle', 'cycle'],
+                        help='Một dòng mỗi gói góc hoặc một dòng rộng mỗi chu kỳ output')
+    parser.add_argument('--decode-mode', default='eager', choices=['eager', 'lazy'],
+                        help='Giải mã trong pipeline (CSV) hoặc lưu gói thô và giải mã khi đọc')
+    parser.add_argument('--flush-ms', type=float, default=0, help='Flush khi dòng cũ nhất đã được đọc N ms trước (0: theo bộ đệm)')
+    parser.add_argument('--fsync-policy', default='never', choices=['never', 'rotation', 'interval'])
+    parser.add_argument('--fsync-seconds', type=float, default=0, help='Chu kỳ fsync cho --fsync-policy interval')
+    parser.add_argument('--writer-thread', action='store_true', help='Ghi qua luồng ghi nền (BackgroundStorageWriter)')
+    parser.add_argument('--writer-overflow', default='spill', choices=['block', 'spill'])
+    parser.add_argument('--writer-buffer-rows', type=int, default=2000)
+    parser.add_argument('--stall-ms', type=float, default=0, help='Giả lập thẻ SD khựng: độ trễ thêm của một lần ghi')
+    parser.add_argument('--stall-every', type=float, default=2.0, help='Chu kỳ giả lập khựng (giây)')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(message)s')
+
+    if args.child:
+        transport, chunk_size = args.child.split(':')
+        durability = {"flush_interval_ms": args.flush_ms, "fsync_policy": args.fsync_policy,
+                      "fsync_interval_s": args.fsync_seconds}
+        writer = {"buffer_rows": args.writer_buffer_rows, "overflow_policy": args.writer_overflow} \
+            if args.writer_thread else None
+        stall = (args.stall_ms, args.stall_every) if args.stall_ms else None
+        print(json.dumps(run_config(args.capture, transport, int(chunk_size), args.realtime, args.rate,
+                                    args.raw_tee, args.fields, args.row_mode, args.decode_mode, durability,
+                                    writer, stall)))
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        capture = args.capture
+        if args.generate:
+            capture = os.path.join(work_dir, 'synthetic.bin')
+            generate_capture(capture, args.generate, resolve_rsw_value(args.content), args.rate)
+        if not capture:
+            parser.error("cần file capture hoặc --generate")
+
+        size_mb = ReplaySerial(capture).size / 1e6
+        mode = f"thời gian thực @ {args.rate:g} Hz" if args.realtime else "nhanh nhất có thể"
+        print(f"Capture: {capture} ({size_mb:.1f} MB), phát {mode}" + (", có raw capture" if args.raw_tee else "")
+              + f", dòng theo {args.row_mode}: {' '.join(args.fields)}, giải mã {args.decode_mode}")
+        for transport in args.transports:
+            for chunk_size in args.chunk_sizes:
+                command = [sys.executable, os.path.abspath(__file__), capture, '--child', f"{transport}:{chunk_size}",
+                           '--rate', str(args.rate)] + (['--realtime'] if args.realtime else []) + \
+                          (['--raw-tee'] if args.raw_tee else []) + \
+                          ['--row-mode', args.row_mode, '--decode-mode', args.decode_mode,
+                           '--flush-ms', str(args.flush_ms), '--fsync-policy', args.fsync_policy,
+                           '--fsync-seconds', str(args.fsync_seconds), '--stall-ms', str(args.stall_ms),
+                           '--stall-every', str(args.stall_every), '--writer-overflow', args.writer_overflow,
+                           '--writer-buffer-rows', str(args.writer_buffer_rows)] + \
+                          (['--writer-thread'] if args.writer_thread else []) + ['--fields'] + args.fields
+                output = subprocess.run(command, capture_output=True, text=True, cwd=project_root)
+                if output.returncode != 0:
+                    print(f"{transport}/{chunk_size}: lỗi\n{output.stderr}")
+                    continue
+                r = json.loads(output.stdout.strip().splitlines()[-1])
+                print(f"{r['transport']:>5} chunk {r['chunk_size']:>6}: {r['frames_per_s']:>9.0f} gói/s, "
+                      f"CPU {r['cpu_us_per_frame']:.2f} µs/gói, RSS đỉnh {r['peak_rss_mb']:.1f} MB "
+                      f"({r['frames']} gói, {r['skipped']} bỏ qua không giải mã, {r['rows']} dòng "
+                      f"({r['incomplete']} chu kỳ thiếu gói), {r['wall_s']:.2f}s)"
+                      + (f", giải mã khi đọc {r['read_decode_s']:.2f}s CPU" if r['decode_mode'] == 'lazy' else ""))
+                print(f"{'':>18} ghi đĩa: {format_durability_stats(r['durability'])}")
+                print(f"{'':>18} độ trễ lô tối đa của luồng giải mã: {r['batch_latency_max_ms']:.1f}ms")
+                if r['writer']:
+                    print(f"{'':>18} luồng ghi: {format_writer_stats(r['writer'])}")
+
+
+if __name__ == "__main__":
+    main()
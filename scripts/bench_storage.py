@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# scripts/bench_storage.py
+
+"""
+So sánh StorageManager (CSV, csv.DictWriter từng dòng) với ColumnarStorageManager (bản ghi nhị phân
+cố định, đóng gói struct và ghi theo lô) trên cùng các dòng đã giải mã:
+    ghi  : µs mỗi dòng qua write_data và số dòng/giây
+    file : số byte mỗi dòng trên đĩa
+    đọc  : thời gian đọc lại thành mảng số (csv.DictReader + float() so với numpy.memmap + hệ số chia)
+Dòng được dựng từ luồng gói tổng hợp bằng records_to_columns, theo hai bố cục: dòng góc
+(STORAGE_ROW_MODE=angle) và dòng rộng toàn bộ IMU (STORAGE_ROW_MODE=cycle). Trước khi đo, nội dung
+hai định dạng được so khớp qua read_data_rows.
+
+Chạy: python3 scripts/bench_storage.py --cycles 50000 --repeat 3
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from bench_common import make_frame_stream
+
+from src.core.sample_assembler import CYCLE_COMPLETE_FIELD
+from src.sensors.hwt905_constants import DATA_PACKET_LENGTH
+from src.storage.columnar_storage import ColumnarStorageManager, columnar_arrays, open_columnar_file
+from src.storage.frame_storage import RECORD_DTYPE, read_data_rows, records_to_columns
+from src.storage.storage_manager import StorageManager
+
+LAYOUTS = {
+    "angle": ['angle_roll', 'angle_pitch', 'angle_yaw', 'temperature'],
+    "cycle": ['acc_x', 'acc_y', 'acc_z', 'gyro_x', 'gyro_y', 'gyro_z', 'angle_roll', 'angle_pitch', 'angle_yaw',
+              'mag_x', 'mag_y', 'mag_z', 'temperature'],
+}
+
+
+def make_rows(cycles: int, fields: List[str], row_mode: str) -> List[Dict]:
+    """Các dòng dict như luồng giải mã đưa cho write_data."""
+    stream = make_frame_stream(cycles)
+    frames = np.frombuffer(stream, dtype=np.uint8).reshape(-1, DATA_PACKET_LENGTH)
+    records = np.zeros(len(frames), dtype=RECORD_DTYPE)
+    records['frame'] = frames
+    records['timestamp'] = 1750816666.0 + np.arange(len(frames)) / 800.0
+    columns = records_to_columns(records, fields, row_mode)
+    return [dict(zip(fields, values)) for values in zip(*(columns[field] for field in fields))]
+
+
+def only_file(directory: str) -> str:
+    return os.path.join(directory, os.listdir(directory)[0])
+
+
+def write_rows(manager_type, directory: str, fields: List[str], rows: List[Dict]) -> float:
+    manager = manager_type(base_dir=directory, file_rotation_hours=24, fields_to_write=fields)
+    start = time.perf_counter()
+    for row in rows:
+        manager.write_data(row)
+    manager.close_current_file()
+    return time.perf_counter() - start
+
+
+def read_csv_arrays(path: str) -> Dict[str, np.ndarray]:
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        values = {name: [] for name in reader.fieldnames}
+        for row in reader:
+            for name, value in row.items():
+                values[name].append(float(value) if value not in ('', 'True', 'False') else value == 'True')
+    return {name: np.asarray(column, dtype=np.float64) for name, column in values.items()}
+
+
+def read_columnar(path: str) -> Dict[str, np.ndarray]:
+    header, records = open_columnar_file(path)
+    return columnar_arrays(header, records)
+
+
+def best_of(repeat: int, func) -> float:
+    return min(func() for _ in range(repeat))
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CSV vs binary columnar storage')
+    parser.add_argument('--cycles', type=int, default=50000, help='Số chu kỳ output (ACC/GYRO/ANGLE/MAG)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'bố cục':<7} {'định dạng':<9} {'µs/dòng ghi':>12} {'dòng/s':>10} {'byte/dòng':>10} {'đọc (s)':>9}")
+    for row_mode, payload_fields in LAYOUTS.items():
+        fields = ['timestamp'] + payload_fields + ([CYCLE_COMPLETE_FIELD] if row_mode == "cycle" else [])
+        rows = make_rows(args.cycles, fields, row_mode)
+        with tempfile.TemporaryDirectory() as work_dir:
+            csv_dir, col_dir = os.path.join(work_dir, 'csv'), os.path.join(work_dir, 'col')
+            write_rows(StorageManager, csv_dir, fields, rows)
+            write_rows(ColumnarStorageManager, col_dir, fields, rows)
+            if read_data_rows(only_file(csv_dir)) != read_data_rows(only_file(col_dir)):
+                raise SystemExit(f"Nội dung CSV và nhị phân khác nhau ({row_mode})")
+
+            for name, manager_type, reader in (("csv", StorageManager, read_csv_arrays),
+                                               ("columnar", ColumnarStorageManager, read_columnar)):
+                directory = os.path.join(work_dir, f'run_{name}')
+
+                def run_write():
+                    if os.path.isdir(directory):
+                        for filename in os.listdir(directory):
+                            os.remove(os.path.join(directory, filename))
+                    return write_rows(manager_type, directory, fields, rows)
+
+                write_s = best_of(args.repeat, run_write)
+                path = only_file(directory)
+                read_s = best_of(args.repeat, lambda: timed(reader, path))
+                print(f"{row_mode:<7} {name:<9} {write_s / len(rows) * 1e6:>12.2f} {len(rows) / write_s:>10.0f} "
+                      f"{os.path.getsize(path) / len(rows):>10.1f} {read_s:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# scripts/bench_timestamp_accuracy.py
+
+"""
+Đo sai số timestamp của FrameTimestamper và độ trễ đầu-cuối của luồng đọc trên
+cảm biến giả lập (PtyHWT905Simulator).
+
+Simulator ghi thời điểm lấy mẫu vào gói TIME (0x50) của mỗi chu kỳ và giữ thời điểm
+chính xác (ns) trong sample_times. Cổng pty được mở qua SensorConnectionManager như một
+cổng cấu hình bình thường; SerialReaderThread gán timestamp và đưa lô vào FrameBatchQueue.
+Với mỗi gói TIME nhận được:
+    sai số   = timestamp được gán - thời điểm lấy mẫu thật
+    độ trễ   = thời điểm lô được lấy ra khỏi hàng đợi - thời điểm lấy mẫu thật
+Sai số gồm cả thời gian truyền chu kỳ ở baudrate giả lập.
+
+Chạy: python3 scripts/bench_timestamp_accuracy.py --rate 200 --baud 115200 --duration 10
+"""
+import argparse
+import logging
+import statistics
+import threading
+import time
+from datetime import datetime
+from queue import Empty
+from typing import List, Optional
+
+from bench_common import project_root  # noqa: F401 (thêm thư mục gốc vào sys.path)
+
+from src.core.async_data_manager import SerialReaderThread
+from src.core.connection_manager import SensorConnectionManager
+from src.core.frame_queue import FrameBatchQueue
+from src.core.frame_timestamper import FrameTimestamper
+from src.sensors.hwt905_configurator import resolve_rsw_value
+from src.sensors.hwt905_constants import PACKET_TYPE_TIME
+from src.sensors.hwt905_data_decoder import HWT905DataDecoder
+from src.sensors.hwt905_simulator import PtyHWT905Simulator
+
+
+def embedded_sample_ns(frame: bytes, simulator: PtyHWT905Simulator) -> Optional[int]:
+    """Thời điểm lấy mẫu (Unix ns) của gói TIME: tra chính xác trong simulator, nếu không có thì dùng giá trị ms trong gói."""
+    try:
+        moment = datetime(2000 + frame[2], frame[3], frame[4], frame[5], frame[6], frame[7],
+                          (frame[8] | (frame[9] << 8)) * 1000)
+    except ValueError:
+        return None
+    key = int(round(moment.timestamp() * 1000))
+    return simulator.sample_times.get(key, key * 1_000_000)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def describe(label: str, values_ms: List[float]):
+    values = sorted(values_ms)
+    print(f"{label}: TB {statistics.fmean(values):.3f} ms, trung vị {statistics.median(values):.3f} ms, "
+          f"p99 {percentile(values, 0.99):.3f} ms, min {values[0]:.3f} ms, max {values[-1]:.3f} ms, "
+          f"độ lệch chuẩn {statistics.pstdev(values):.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Timestamp accuracy and end-to-end latency against the pty simulator')
+    parser.add_argument('--rate', type=float, default=200.0, help='Tần số output của simulator (chu kỳ/s)')
+    parser.add_argument('--baud', type=int, default=115200, help='Baudrate giả lập')
+    parser.add_argument('--content', default='RSW_ONLY_ANGLE_TIME', help='Nội dung output (phải có TIME)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Thời gian đo (giây)')
+    parser.add_argument('--batch-max-ms', type=float, default=20.0, help='Tuổi tối đa của một lô trong luồng đọc (ms)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(message)s')
+    simulator = PtyHWT905Simulator(rate_hz=args.rate, rsw=resolve_rsw_value(args.content), baudrate=args.baud)
+    simulator.start()
+
+    connection_manager = SensorConnectionManager(port=simulator.port, baudrate=args.baud)
+    ser = connection_manager.establish_connection()
+    if not ser:
+        print(f"Không kết nối được tới simulator trên {simulator.port}")
+        simulator.unplug()
+        return
+
+    running_flag = threading.Event()
+    running_flag.set()
+    raw_queue = FrameBatchQueue(maxsize=100000)
+    reader = SerialReaderThread(
+        data_decoder=HWT905DataDecoder(ser_instance=ser),
+        raw_data_queue=raw_queue,
+        running_flag=running_flag,
+        connection_manager=connection_manager,
+        batch_max_ms=args.batch_max_ms,
+        timestamper=FrameTimestamper(args.rate)
+    )
+    reader.start()
+
+    errors_ms, latencies_ms = [], []
+    warmup_until = time.monotonic() + 0.5  # Bỏ qua phần dữ liệu tồn trong pty lúc kết nối
+    deadline = warmup_until + args.duration
+    while time.monotonic() < deadline:
+        try:
+            batch = raw_queue.get(timeout=0.5)
+        except Empty:
+            continue
+        received_ns = time.time_ns()
+        if time.monotonic() < warmup_until:
+            continue
+        for frame, timestamp in zip(batch.frames, batch.timestamps):
+            if frame[1] != PACKET_TYPE_TIME:
+                continue
+            sample_ns = embedded_sample_ns(frame, simulator)
+            if sample_ns is None:
+                continue
+            errors_ms.append((timestamp * 1e9 - sample_ns) / 1e6)
+            latencies_ms.append((received_ns - sample_ns) / 1e6)
+
+    running_flag.clear()
+    reader.join(timeout=3)
+    connection_manager.close_connection()
+    simulator.unplug()
+
+    if not errors_ms:
+        print("Không nhận được gói TIME nào (kiểm tra --content)")
+        return
+    print(f"Simulator: {args.rate:g} Hz, {args.baud} bps, {simulator.cycle_bytes()} bytes/chu kỳ, "
+          f"{simulator.late_cycles} chu kỳ trễ do baudrate. Cổng {simulator.port}.")
+    print(f"{len(errors_ms)} chu kỳ trong {args.duration:.0f}s, lô tối đa {args.batch_max_ms:g} ms")
+    describe("Sai số timestamp (gán - lấy mẫu)", errors_ms)
+    describe("Độ trễ lấy mẫu -> lô ra khỏi hàng đợi", latencies_ms)
+
+
+if __name__ == "__main__":
+    main()
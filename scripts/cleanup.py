@@ -21,10 +21,11 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
-def cleanup_old_files(data_dir: str, days_to_keep: int):
+def cleanup_old_files(data_dir: str, days_to_keep: int, extensions=(".sent", ".empty"), recursive: bool = False):
     """
-    Scans a directory and deletes files with specific extensions (.sent, .empty)
-    that are older than a specified number of days.
+    Scans a directory and deletes files with specific extensions (.sent, .empty by default)
+    that are older than a specified number of days. With recursive=True, subdirectories
+    (e.g. per-device raw capture directories) are scanned too.
     """
     if not os.path.isdir(data_dir):
         logger.warning(f"Thư mục '{data_dir}' không tồn tại. Không có gì để dọn dẹp.")
@@ -35,11 +36,15 @@ def cleanup_old_files(data_dir: str, days_to_keep: int):
     cutoff_time = datetime.now() - timedelta(days=days_to_keep)
     files_deleted_count = 0
     
-    for filename in os.listdir(data_dir):
+    if recursive:
+        candidates = [os.path.join(root, name) for root, _, names in os.walk(data_dir) for name in names]
+    else:
+        candidates = [os.path.join(data_dir, name) for name in os.listdir(data_dir)]
+
+    for filepath in candidates:
+        filename = os.path.relpath(filepath, data_dir)
         # Chỉ xem xét các file đã được xử lý
-        if filename.endswith((".sent", ".empty")):
-            filepath = os.path.join(data_dir, filename)
-            
+        if filename.endswith(extensions):
             try:
                 # Lấy thời gian sửa đổi cuối cùng của file
                 file_mod_time_ts = os.path.getmtime(filepath)
@@ -67,10 +72,20 @@ def main():
     setup_logging(log_level=config.LOG_LEVEL)
     logger.info("Bắt đầu kịch bản dọn dẹp dữ liệu...")
     
+    # Gồm cả thư mục con của từng thiết bị (STORAGE_BASE_DIR/<device_id>/) ở chế độ nhiều cảm biến
     cleanup_old_files(
         data_dir=config.STORAGE_BASE_DIR,
-        days_to_keep=config.STORAGE_CLEANUP_DAYS
+        days_to_keep=config.STORAGE_CLEANUP_DAYS,
+        recursive=True
     )
+    # Segment raw capture đã đóng (.hwtraw); segment đang ghi (.hwtraw.part) không bị đụng tới
+    if os.path.isdir(config.RAW_CAPTURE_DIR):
+        cleanup_old_files(
+            data_dir=config.RAW_CAPTURE_DIR,
+            days_to_keep=config.STORAGE_CLEANUP_DAYS,
+            extensions=(".hwtraw",),
+            recursive=True
+        )
     
     logger.info("Kịch bản dọn dẹp dữ liệu đã kết thúc.")
 
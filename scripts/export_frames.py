@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# scripts/export_frames.py
+
+"""
+Xuất các file gói thô (.hwtfrm, STORAGE_DECODE_MODE=lazy) và file bản ghi nhị phân
+(.hwtcol, STORAGE_FORMAT=columnar) sang CSV cùng định dạng StorageManager.
+Gói thô được giải mã theo lô bằng NumpyBatchDecoder; bản ghi nhị phân được đọc qua numpy.memmap.
+
+Chạy: python3 scripts/export_frames.py data/*.hwtfrm data/*.hwtcol [--output-dir export]
+"""
+import argparse
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.storage.columnar_storage import export_columnar_file_csv, is_columnar_file
+from src.storage.frame_storage import export_frame_file_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export raw frame (.hwtfrm) and binary record (.hwtcol) files to CSV')
+    parser.add_argument('files', nargs='+', help='File .hwtfrm/.hwtcol cần xuất')
+    parser.add_argument('--output-dir', default=None, help='Thư mục CSV đầu ra (mặc định cạnh file gốc)')
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    for path in args.files:
+        csv_path = None
+        if args.output_dir:
+            csv_path = os.path.join(args.output_dir, os.path.splitext(os.path.basename(path))[0] + '.csv')
+        start = time.perf_counter()
+        export = export_columnar_file_csv if is_columnar_file(path) else export_frame_file_csv
+        csv_path = export(path, csv_path)
+        print(f"{path} -> {csv_path} ({time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# scripts/rederive_capture.py
+
+"""
+Tạo lại dữ liệu lưu trữ từ các segment raw capture (.hwtraw): phát lại segment qua toàn bộ pipeline
+đọc -> giải mã -> StorageManager (ReplaySerial thay cho cổng serial, nhanh nhất có thể), ví dụ để lấy
+thêm cột, đổi row_mode hoặc tính kênh dẫn xuất mới cho dữ liệu đã thu.
+
+Timestamp của từng dòng được gán theo wall-clock đã ghi của khối trong segment, nên dòng tạo lại giữ
+thời điểm thu nhận gốc (tên file đầu ra vẫn theo thời điểm chạy script). File byte thô không có thời điểm
+đã ghi: timestamp khi đó là thời điểm phát lại.
+Thư mục đầu ra mặc định nằm ngoài STORAGE_BASE_DIR để sender.py không tự gửi dữ liệu tạo lại.
+
+Chạy: python3 scripts/rederive_capture.py data/raw --output-dir rederived
+      python3 scripts/rederive_capture.py data/raw/*.hwtraw --row-mode cycle --fields acc_x acc_y acc_z angle_roll
+      python3 scripts/rederive_capture.py data/raw --derived yaw_unwrapped inclination --row-mode cycle --format columnar
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src import config
+from src.core.async_data_manager import create_pipeline_threads
+from src.core.derived_channels import DerivedChannelEngine
+from src.core.sample_assembler import CYCLE_COMPLETE_FIELD
+from src.sensors.hwt905_data_decoder import HWT905DataDecoder
+from src.sensors.replay_serial import ReplaySerial
+from src.storage.background_writer import shutdown_storage
+from src.storage.columnar_storage import ColumnarStorageManager
+from src.storage.raw_capture import is_raw_segment
+from src.storage.storage_manager import StorageManager
+
+
+def create_storage(output_dir: str, fields, derived, row_mode: str, storage_format: str) -> StorageManager:
+    """Tạo StorageManager (CSV) hoặc ColumnarStorageManager cho dữ liệu tạo lại."""
+    fields_to_write = ['timestamp'] + list(fields)
+    fields_to_write += [field for field in DerivedChannelEngine.output_fields_for(derived)
+                        if field not in fields_to_write]
+    if row_mode == 'cycle':
+        fields_to_write.append(CYCLE_COMPLETE_FIELD)
+    storage_class = ColumnarStorageManager if storage_format == 'columnar' else StorageManager
+    return storage_class(base_dir=output_dir, file_rotation_hours=config.STORAGE_FILE_ROTATION_HOURS,
+                         fields_to_write=fields_to_write)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-derive stored data from raw capture segments')
+    parser.add_argument('sources', nargs='+', help='Segment raw capture (.hwtraw) hoặc thư mục segment')
+    parser.add_argument('--output-dir', default=os.path.normpath(config.STORAGE_BASE_DIR) + '_rederived',
+                        help='Thư mục lưu dữ liệu tạo lại')
+    parser.add_argument('--fields', nargs='+', default=config.STORAGE_FIELDS, help='Cột lưu trữ (ngoài timestamp)')
+    parser.add_argument('--derived', nargs='*', default=config.DERIVED_CHANNELS, help='Kênh dẫn xuất cần tính')
+    parser.add_argument('--row-mode', choices=['angle', 'cycle'], default=config.STORAGE_ROW_MODE,
+                        help='Một dòng mỗi gói góc hoặc một dòng rộng mỗi chu kỳ output')
+    parser.add_argument('--format', choices=['csv', 'columnar'], default='csv', help='Định dạng lưu trữ')
+    parser.add_argument('--transport', choices=['queue', 'ring'], default=config.PIPELINE_TRANSPORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(name)s: %(message)s')
+    replay = ReplaySerial(args.sources)
+    if not all(is_raw_segment(path) for path in replay.paths):
+        print("Cảnh báo: nguồn có file byte thô không có thời điểm đã ghi; timestamp của phần đó là thời điểm phát lại")
+
+    storage_manager = create_storage(args.output_dir, args.fields, args.derived, args.row_mode, args.format)
+    data_decoder = HWT905DataDecoder(ser_instance=replay, read_chunk_size=config.SENSOR_READ_CHUNK_SIZE)
+    running_flag = threading.Event()
+    running_flag.set()
+    reader_thread, decoder_thread = create_pipeline_threads(
+        data_decoder=data_decoder,
+        storage_manager=storage_manager,
+        running_flag=running_flag,
+        transport=args.transport,
+        lossless=True,  # Nguồn file: chờ luồng giải mã thay vì bỏ dữ liệu
+        row_mode=args.row_mode
+    )
+
+    start = time.perf_counter()
+    reader_thread.start()
+    decoder_thread.start()
+    while not replay.exhausted and decoder_thread.is_alive():
+        time.sleep(0.05)
+    # Hết nguồn: luồng đọc đẩy nốt lô đang gom, luồng giải mã xử lý hết rồi đóng file
+    running_flag.clear()
+    reader_thread.join()
+    decoder_thread.join()
+    shutdown_storage(storage_manager)
+
+    print(f"{len(replay.paths)} file nguồn ({replay.bytes_read / 1e6:.1f} MB) -> {args.output_dir}: "
+          f"{decoder_thread.total_saved_count} dòng, {decoder_thread.total_decoded_count} gói giải mã "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,6 @@
 import logging
 import os
 import sys
-import csv
 import json
 import time
 from typing import List, Dict
@@ -20,6 +19,8 @@ if project_root not in sys.path:
 try:
     from src import config
     from src.utils.logger_setup import setup_logging
+    from src.storage.frame_storage import FRAME_FILE_EXTENSION, read_data_rows
+    from src.storage.columnar_storage import COLUMNAR_FILE_EXTENSION
 except ImportError as e:
     print(f"FATAL: Could not import necessary modules. Make sure the script is run from the project root "
           f"or the PYTHONPATH is set correctly. Error: {e}")
@@ -27,17 +28,30 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
-def process_and_send_file(filepath: str, client: mqtt.Client, topic: str):
+def find_files_to_send(data_dir: str, extensions, exclude_dirs=()) -> List[str]:
     """
-    Reads a CSV file, packages its content into a JSON message, sends it via MQTT,
-    and renames the file upon successful transmission.
+    Finds data files to send in data_dir and its subdirectories (per-device directories
+    STORAGE_BASE_DIR/<device_id>/ in multi-sensor mode), skipping the directories in exclude_dirs
+    (e.g. RAW_CAPTURE_DIR). Returns full paths sorted by path.
+    """
+    excluded = {os.path.realpath(path) for path in exclude_dirs}
+    files = []
+    for root, dirs, names in os.walk(data_dir):
+        # Không đi vào các thư mục bị loại trừ (raw capture)
+        dirs[:] = [name for name in dirs if os.path.realpath(os.path.join(root, name)) not in excluded]
+        files.extend(os.path.join(root, name) for name in names if name.endswith(extensions))
+    return sorted(files)
+
+def process_and_send_file(filepath: str, client: mqtt.Client, topic: str, data_dir: str = None):
+    """
+    Reads a data file (CSV, or raw frames decoded in bulk), packages its content into a JSON message,
+    sends it via MQTT, and renames the file upon successful transmission. The filename in the metadata
+    is relative to data_dir, so files from different per-device directories stay distinguishable.
     """
     logger.info(f"Đang xử lý file: {os.path.basename(filepath)}")
     
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            data_points = [row for row in reader]
+        data_points = read_data_rows(filepath)
 
         if not data_points:
             logger.warning(f"File '{filepath}' trống. Bỏ qua và đánh dấu là 'empty'.")
@@ -48,7 +62,7 @@ def process_and_send_file(filepath: str, client: mqtt.Client, topic: str):
         payload = {
             "metadata": {
                 "source_device": config.MQTT_CLIENT_ID,
-                "filename": os.path.basename(filepath),
+                "filename": os.path.relpath(filepath, data_dir) if data_dir else os.path.basename(filepath),
                 "sent_timestamp_utc": datetime.utcnow().isoformat() + "Z",
                 "data_points_count": len(data_points)
             },
@@ -87,9 +101,10 @@ def main():
         logger.warning(f"Thư mục dữ liệu '{data_dir}' không tồn tại. Không có gì để gửi. Thoát.")
         return
 
-    files_to_send = [f for f in os.listdir(data_dir) if f.endswith(".csv")]
+    extensions = (".csv", FRAME_FILE_EXTENSION, COLUMNAR_FILE_EXTENSION)
+    files_to_send = find_files_to_send(data_dir, extensions, exclude_dirs=(config.RAW_CAPTURE_DIR,))
     if not files_to_send:
-        logger.info("Không tìm thấy file .csv nào để gửi. Thoát.")
+        logger.info(f"Không tìm thấy file {'/'.join(extensions)} nào để gửi. Thoát.")
         return
 
     logger.info(f"Tìm thấy {len(files_to_send)} file để xử lý.")
@@ -105,9 +120,8 @@ def main():
         client.connect(config.MQTT_BROKER_ADDRESS, config.MQTT_BROKER_PORT, 60)
         client.loop_start()
 
-        for filename in sorted(files_to_send):
-            filepath = os.path.join(data_dir, filename)
-            process_and_send_file(filepath, client, config.MQTT_DATA_TOPIC)
+        for filepath in files_to_send:
+            process_and_send_file(filepath, client, config.MQTT_DATA_TOPIC, data_dir)
 
     except ConnectionRefusedError:
         logger.error("Kết nối MQTT bị từ chối. Vui lòng kiểm tra địa chỉ broker, port và credentials.")
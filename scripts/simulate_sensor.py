@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# scripts/simulate_sensor.py
+
+"""
+Chạy một cảm biến HWT905 giả lập trên pseudo-terminal (PtyHWT905Simulator).
+
+In ra đường dẫn cổng; trỏ ứng dụng tới cổng đó bằng SENSOR_UART_PORT (ví dụ
+SENSOR_UART_PORT=/tmp/hwt905 SENSOR_AUTO_DISCOVER=false python3 main.py).
+Với --link, cổng là một symlink ổn định; --replug-every mô phỏng rút/cắm cáp định kỳ.
+
+Chạy: python3 scripts/simulate_sensor.py --rate 200 --content RSW_ONLY_ANGLE_TIME --baud 115200 --link /tmp/hwt905
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Add project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.sensors.hwt905_configurator import resolve_rsw_value
+from src.sensors.hwt905_simulator import MotionModel, PtyHWT905Simulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HWT905 sensor simulator on a pseudo-terminal')
+    parser.add_argument('--rate', type=float, default=200.0, help='Tần số output (chu kỳ/s)')
+    parser.add_argument('--content', default='DEFAULT_RSW_VALUE',
+                        help='Nội dung output: tên hằng RSW_* hoặc giá trị số (ví dụ 0x0009)')
+    parser.add_argument('--baud', type=int, default=115200, help='Baudrate giả lập để giới hạn nhịp phát, 0 = không giới hạn')
+    parser.add_argument('--link', default=None, help='Symlink ổn định trỏ tới cổng pty')
+    parser.add_argument('--duration', type=float, default=0.0, help='Thời gian chạy (giây), 0 = tới khi Ctrl-C')
+    parser.add_argument('--replug-every', type=float, default=0.0, help='Rút rồi cắm lại sau mỗi N giây (cần --link)')
+    parser.add_argument('--replug-gap', type=float, default=1.0, help='Thời gian vắng mặt mỗi lần rút (giây)')
+    parser.add_argument('--tilt', type=float, default=15.0, help='Biên độ nghiêng chậm (độ)')
+    parser.add_argument('--vibration-hz', type=float, default=12.0, help='Tần số rung (Hz)')
+    parser.add_argument('--yaw-rate', type=float, default=30.0, help='Tốc độ quay yaw (độ/s)')
+    parser.add_argument('--seed', type=int, default=905)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if args.replug_every and not args.link:
+        parser.error("--replug-every cần --link để cổng giữ nguyên đường dẫn")
+
+    def make_simulator() -> PtyHWT905Simulator:
+        motion = MotionModel(tilt_amplitude_deg=args.tilt, vibration_hz=args.vibration_hz,
+                             yaw_rate_dps=args.yaw_rate, seed=args.seed)
+        return PtyHWT905Simulator(rate_hz=args.rate, rsw=resolve_rsw_value(args.content),
+                                  baudrate=args.baud, motion=motion, link_path=args.link)
+
+    simulator = make_simulator()
+    simulator.start()
+    print(f"Cổng giả lập: {simulator.port}", flush=True)
+
+    started = time.monotonic()
+    last_plug = started
+    last_report, last_cycles = started, 0
+    try:
+        while not args.duration or time.monotonic() - started < args.duration:
+            time.sleep(0.5)
+            now = time.monotonic()
+            if args.replug_every and now - last_plug >= args.replug_every:
+                cycles = simulator.cycle_count
+                simulator.unplug()
+                logging.info(f"Đã rút cảm biến, cắm lại sau {args.replug_gap:.1f}s")
+                time.sleep(args.replug_gap)
+                simulator = make_simulator()
+                simulator.start()
+                last_plug = time.monotonic()
+                last_report, last_cycles = last_plug, 0
+                logging.info(f"Đã cắm lại (phiên trước phát {cycles} chu kỳ)")
+                continue
+            if now - last_report >= 10.0:
+                rate = (simulator.cycle_count - last_cycles) / (now - last_report)
+                logging.info(f"Đang phát {rate:.1f} chu kỳ/s ({simulator.byte_count} bytes tổng), "
+                             f"{simulator.late_cycles} chu kỳ bị trễ do baudrate")
+                last_report, last_cycles = now, simulator.cycle_count
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.unplug()
+
+
+if __name__ == "__main__":
+    main()
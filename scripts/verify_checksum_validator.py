@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# scripts/verify_checksum_validator.py
+
+"""
+Kiểm tra đối chứng: validate_data_packets (NumPy, hàng loạt) phải cho kết quả giống hệt
+is_valid_data_packet (vô hướng) trên luồng ngẫu nhiên và luồng gói tin bị hỏng.
+Đồng thời xác nhận HWT905FrameParser (có đường vector hóa) tách ra đúng các gói
+mà việc quét vô hướng từng vị trí tìm được.
+
+Chạy: python3 scripts/verify_checksum_validator.py [--frames 50000] [--seed 905]
+Trả về mã thoát 1 nếu có sai khác.
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from bench_common import make_frame_stream
+
+from src.sensors.hwt905_constants import DATA_HEADER_BYTE, DATA_PACKET_LENGTH
+from src.sensors.hwt905_protocol import is_valid_data_packet, validate_data_packets
+from src.sensors.hwt905_frame_parser import HWT905FrameParser
+
+
+def compare_masks(name: str, buffer: bytes) -> bool:
+    """So sánh mặt nạ hợp lệ giữa hai cách kiểm tra trên cùng một buffer (N x 11)."""
+    scalar_start = time.perf_counter()
+    scalar = np.array([
+        is_valid_data_packet(buffer[i:i + DATA_PACKET_LENGTH])
+        for i in range(0, len(buffer), DATA_PACKET_LENGTH)
+    ], dtype=bool)
+    scalar_time = time.perf_counter() - scalar_start
+
+    vector_start = time.perf_counter()
+    vector = validate_data_packets(buffer)
+    vector_time = time.perf_counter() - vector_start
+
+    mismatches = int(np.count_nonzero(scalar != vector))
+    status = "OK" if mismatches == 0 else f"SAI KHÁC {mismatches}"
+    print(f"{name:>22}: {len(scalar)} gói, hợp lệ {int(scalar.sum())}, "
+          f"vô hướng {scalar_time * 1000:.1f} ms, NumPy {vector_time * 1000:.2f} ms -> {status}")
+    return mismatches == 0
+
+
+def reference_frames(stream: bytes):
+    """Tách gói bằng cách quét vô hướng từng vị trí (đúng theo định nghĩa)."""
+    frames, pos = [], 0
+    while pos + DATA_PACKET_LENGTH <= len(stream):
+        candidate = stream[pos:pos + DATA_PACKET_LENGTH]
+        if is_valid_data_packet(candidate):
+            frames.append(candidate)
+            pos += DATA_PACKET_LENGTH
+        else:
+            pos += 1
+    return frames
+
+
+def compare_parser(name: str, stream: bytes, rng: random.Random) -> bool:
+    """Đưa luồng vào parser theo các khối có độ dài ngẫu nhiên và so với tham chiếu."""
+    parser = HWT905FrameParser()
+    parsed, pos = [], 0
+    while pos < len(stream):
+        size = rng.randint(1, 4096)
+        parsed.extend(parser.feed(stream[pos:pos + size]))
+        pos += size
+    expected = reference_frames(stream)
+    ok = parsed == expected
+    print(f"{name:>22}: parser {len(parsed)} gói, tham chiếu {len(expected)} gói -> {'OK' if ok else 'SAI KHÁC'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Differential check of scalar vs. vectorized checksum validation')
+    parser.add_argument('--frames', type=int, default=50000, help='Số gói trong mỗi luồng thử')
+    parser.add_argument('--seed', type=int, default=905)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    count = args.frames
+    results = []
+
+    # 1. Byte ngẫu nhiên hoàn toàn, header được ép 0x55 ở một nửa số gói để checksum thực sự được kiểm tra
+    noise = bytearray(rng.getrandbits(8) for _ in range(count * DATA_PACKET_LENGTH))
+    for i in range(0, len(noise), 2 * DATA_PACKET_LENGTH):
+        noise[i] = DATA_HEADER_BYTE
+    results.append(compare_masks("random bytes", bytes(noise)))
+
+    # 2. Luồng hợp lệ
+    clean = make_frame_stream(count // 4, seed=args.seed)
+    results.append(compare_masks("clean stream", clean))
+
+    # 3. Luồng hợp lệ bị lật bit ngẫu nhiên
+    corrupted = bytearray(clean)
+    for _ in range(count // 20):
+        corrupted[rng.randrange(len(corrupted))] ^= 1 << rng.randrange(8)
+    results.append(compare_masks("bit-flipped stream", bytes(corrupted)))
+
+    # 4. Parser trên luồng bị chèn rác và hỏng checksum (không còn thẳng hàng 11 byte)
+    results.append(compare_parser("noisy stream (parser)", make_frame_stream(count // 4, noise_ratio=0.05, seed=args.seed), rng))
+    results.append(compare_parser("bit-flipped (parser)", bytes(corrupted), rng))
+
+    if not all(results):
+        print("THẤT BẠI: hai cách kiểm tra cho kết quả khác nhau")
+        sys.exit(1)
+    print("Tất cả kết quả trùng khớp.")
+
+
+if __name__ == "__main__":
+    main()
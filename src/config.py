@@ -16,18 +16,105 @@ MQTT_DATA_TOPIC = os.getenv("MQTT_DATA_TOPIC", "sensor/hwt905/angle_data")
 SENSOR_UART_PORT = os.getenv("SENSOR_UART_PORT", "/dev/ttyUSB0")
 SENSOR_BAUD_RATE = int(os.getenv("SENSOR_BAUD_RATE", 115200))
 SENSOR_AUTO_DISCOVER = os.getenv("SENSOR_AUTO_DISCOVER", "true").lower() == "true"
+# Tần số output (Hz) đã cấu hình trên cảm biến, dùng để nội suy timestamp cho từng gói tin
+SENSOR_OUTPUT_RATE_HZ = float(os.getenv("SENSOR_OUTPUT_RATE_HZ", 200))
+# Số byte tối đa đọc từ serial trong một lần (framing theo khối)
+SENSOR_READ_CHUNK_SIZE = int(os.getenv("SENSOR_READ_CHUNK_SIZE", 4096))
+# Ghi cấu hình output (RSW/RRATE, tùy chọn BAUD) vào cảm biến mỗi khi kết nối
+SENSOR_CONFIGURE_ON_CONNECT = os.getenv("SENSOR_CONFIGURE_ON_CONNECT", "false").lower() == "true"
+# Nội dung output: tên hằng số RSW_* trong hwt905_constants hoặc giá trị số (ví dụ 0x0009)
+SENSOR_OUTPUT_CONTENT = os.getenv("SENSOR_OUTPUT_CONTENT", "RSW_ONLY_ANGLE_TIME")
+# Dò baudrate thực của cảm biến theo tỉ lệ gói tin hợp lệ sau khi mở cổng
+SENSOR_BAUD_PROBE = os.getenv("SENSOR_BAUD_PROBE", "true").lower() == "true"
+# Các baudrate thử khi dò (sau SENSOR_BAUD_RATE), phân tách bằng dấu phẩy
+SENSOR_BAUD_CANDIDATES = [int(rate) for rate in os.getenv(
+    "SENSOR_BAUD_CANDIDATES", "9600,115200,230400,460800,921600,57600,38400,19200,4800").split(",") if rate.strip()]
+# Số gói HWT905 hợp lệ cần thấy trên một cổng trước khi chấp nhận cổng đó
+SENSOR_SIGNATURE_FRAMES = int(os.getenv("SENSOR_SIGNATURE_FRAMES", 5))
+# Chuyển cảm biến sang baudrate này (REG_BAUD) rồi kết nối lại, ví dụ 230400/460800/921600. 0 để giữ nguyên
+SENSOR_TARGET_BAUD_RATE = int(os.getenv("SENSOR_TARGET_BAUD_RATE", 0))
+# Thời gian đo lưu lượng serial (giây) trước và sau khi cấu hình. 0 để bỏ qua
+SENSOR_PROFILE_MEASURE_SECONDS = float(os.getenv("SENSOR_PROFILE_MEASURE_SECONDS", 1.0))
+# Cách phát hiện cảm biến được cắm lại: "auto" (inotify, dự phòng thăm dò), "inotify" hoặc "poll"
+SENSOR_HOTPLUG_MODE = os.getenv("SENSOR_HOTPLUG_MODE", "auto").lower()
+# Chế độ nhiều cảm biến: mỗi cổng một pipeline độc lập, dữ liệu lưu theo thư mục từng thiết bị
+SENSOR_MULTI_DEVICE = os.getenv("SENSOR_MULTI_DEVICE", "false").lower() == "true"
+# Danh sách cổng cố định cho chế độ nhiều cảm biến, phân tách bằng dấu phẩy. Để trống để tự quét /dev/ttyUSB*
+SENSOR_PORTS = [port.strip() for port in os.getenv("SENSOR_PORTS", "").split(",") if port.strip()]
 
 # Storage Configuration
 STORAGE_BASE_DIR = os.getenv("STORAGE_BASE_DIR", "data")
 STORAGE_FILE_ROTATION_HOURS = int(os.getenv("STORAGE_FILE_ROTATION_HOURS", 1))
 STORAGE_CLEANUP_DAYS = int(os.getenv("STORAGE_CLEANUP_DAYS", 7))
-# Reconnection file strategy: "new_file" (tạo file mới) or "continue_file" (tiếp tục file cũ)
+# File strategy on application restart: "new_file" (tạo file mới) or "continue_file" (tiếp tục file cũ).
+# Mất kết nối cảm biến không đóng file: pipeline giữ nguyên file đang ghi khi kết nối lại.
 STORAGE_RECONNECTION_STRATEGY = os.getenv("STORAGE_RECONNECTION_STRATEGY", "new_file")
+# Các cột dữ liệu được lưu (ngoài timestamp/device_id), tên trường như trong gói giải mã. Chỉ các
+# packet type chứa các cột này mới được giải mã
+STORAGE_FIELDS = [field.strip() for field in os.getenv(
+    "STORAGE_FIELDS", "angle_roll,angle_pitch,angle_yaw,temperature").split(",") if field.strip()]
+# Cách tạo dòng lưu trữ: "angle" (một dòng mỗi gói góc) hoặc "cycle" (gộp mọi gói của một chu kỳ output
+# thành một dòng rộng, thêm cột cycle_complete đánh dấu chu kỳ thiếu gói)
+STORAGE_ROW_MODE = os.getenv("STORAGE_ROW_MODE", "angle").lower()
+# Thời điểm giải mã: "eager" (giải mã trong pipeline, lưu CSV) hoặc "lazy" (chỉ lưu gói thô 11 byte kèm
+# timestamp vào file .hwtfrm, giải mã theo lô khi đọc/xuất/gửi - giảm tải CPU trên board yếu)
+STORAGE_DECODE_MODE = os.getenv("STORAGE_DECODE_MODE", "eager").lower()
+# Định dạng file khi giải mã ngay: "csv" (text) hoặc "columnar" (bản ghi nhị phân cố định .hwtcol,
+# nhỏ hơn nhiều và đọc bằng numpy.memmap; xuất CSV bằng scripts/export_frames.py)
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "csv").lower()
+# Chính sách bền vững khi ghi: dòng được flush xuống OS chậm nhất STORAGE_FLUSH_INTERVAL_MS sau khi đọc từ serial
+# (0: để bộ đệm tự ghi khi đầy); STORAGE_FSYNC_POLICY: "never", "rotation" (fsync khi xoay vòng/đóng file)
+# hoặc "interval" (thêm fsync mỗi STORAGE_FSYNC_INTERVAL_SECONDS). Flush/fsync thưa hơn giảm số lần ghi
+# (hao mòn thẻ SD) nhưng tăng lượng dữ liệu có thể mất khi mất điện.
+STORAGE_FLUSH_INTERVAL_MS = float(os.getenv("STORAGE_FLUSH_INTERVAL_MS", 1000))
+STORAGE_FSYNC_POLICY = os.getenv("STORAGE_FSYNC_POLICY", "rotation").lower()
+STORAGE_FSYNC_INTERVAL_SECONDS = float(os.getenv("STORAGE_FSYNC_INTERVAL_SECONDS", 60))
+# Luồng ghi nền: luồng giải mã chỉ đưa dòng vào bộ đệm kép, việc ghi/flush/fsync chạy trên luồng riêng nên
+# thẻ SD khựng không chặn giải mã. Khi bộ đệm đang nhận vượt STORAGE_WRITER_BUFFER_ROWS dòng trong lúc luồng ghi
+# còn bận: "block" (mặc định; chờ, không mất dữ liệu) hoặc "spill" (giữ thêm trong RAM tới
+# STORAGE_WRITER_SPILL_MAX_ROWS dòng, vượt nữa thì bỏ dòng mới). Lần ghi lâu hơn STORAGE_WRITER_STALL_MS được đếm là khựng trong log.
+STORAGE_WRITER_THREAD = os.getenv("STORAGE_WRITER_THREAD", "true").lower() == "true"
+STORAGE_WRITER_BUFFER_ROWS = int(os.getenv("STORAGE_WRITER_BUFFER_ROWS", 2000))
+STORAGE_WRITER_OVERFLOW = os.getenv("STORAGE_WRITER_OVERFLOW", "block").lower()
+STORAGE_WRITER_SPILL_MAX_ROWS = int(os.getenv("STORAGE_WRITER_SPILL_MAX_ROWS", 60000))
+STORAGE_WRITER_STALL_MS = float(os.getenv("STORAGE_WRITER_STALL_MS", 100))
+# Kênh dẫn xuất tính theo lô và lưu thành cột riêng (rotation_matrix, yaw_unwrapped, inclination, angle_delta),
+# cách nhau bởi dấu phẩy; inclination và rotation_matrix theo quaternion cần STORAGE_ROW_MODE=cycle
+DERIVED_CHANNELS = [name.strip() for name in os.getenv("DERIVED_CHANNELS", "").split(",") if name.strip()]
+# Mốc "roll,pitch,yaw" (độ) cho angle_delta; để trống để lấy mẫu hợp lệ đầu tiên làm mốc
+DERIVED_BASELINE = tuple(float(value) for value in os.getenv("DERIVED_BASELINE", "").split(",")) \
+    if os.getenv("DERIVED_BASELINE", "").strip() else None
+
+# Raw Capture Configuration
+# Ghi nguyên văn luồng byte serial vào các segment nhị phân (phát lại được qua ReplaySerial)
+RAW_CAPTURE_ENABLED = os.getenv("RAW_CAPTURE_ENABLED", "false").lower() == "true"
+# Thư mục chứa segment raw capture
+RAW_CAPTURE_DIR = os.getenv("RAW_CAPTURE_DIR", os.path.join(STORAGE_BASE_DIR, "raw"))
+# Mở segment mới sau số giờ này hoặc khi vượt kích thước này (MB)
+RAW_CAPTURE_ROTATION_HOURS = float(os.getenv("RAW_CAPTURE_ROTATION_HOURS", 1))
+RAW_CAPTURE_SEGMENT_MB = float(os.getenv("RAW_CAPTURE_SEGMENT_MB", 64))
+# Kích thước bộ đệm ghi (KB) và chu kỳ đẩy bộ đệm xuống file (giây)
+RAW_CAPTURE_BUFFER_KB = int(os.getenv("RAW_CAPTURE_BUFFER_KB", 1024))
+RAW_CAPTURE_FLUSH_SECONDS = float(os.getenv("RAW_CAPTURE_FLUSH_SECONDS", 5))
 
 # Data Collection Configuration
 # Rate limiting for data storage (Hz). Set to 0 to disable rate limiting
 DATA_COLLECTION_RATE_HZ = int(os.getenv("DATA_COLLECTION_RATE_HZ", 200))
 
+# Pipeline Configuration
+# Số gói tin tối đa trong một lô chuyển từ luồng đọc sang luồng giải mã
+PIPELINE_BATCH_MAX_FRAMES = int(os.getenv("PIPELINE_BATCH_MAX_FRAMES", 256))
+# Thời gian tối đa (ms) gom một lô trước khi chuyển đi
+PIPELINE_BATCH_MAX_MS = float(os.getenv("PIPELINE_BATCH_MAX_MS", 20))
+# Sức chứa hàng đợi thô, tính theo số gói tin
+PIPELINE_QUEUE_MAX_FRAMES = int(os.getenv("PIPELINE_QUEUE_MAX_FRAMES", 8192))
+# Cách chuyển dữ liệu giữa luồng đọc và luồng giải mã: "queue" (lô gói tin) hoặc "ring" (ring buffer byte thô)
+PIPELINE_TRANSPORT = os.getenv("PIPELINE_TRANSPORT", "queue").lower()
+# Mô hình chạy pipeline: "threads" (luồng đọc + luồng giải mã) hoặc "asyncio" (event loop với add_reader)
+PIPELINE_RUNTIME = os.getenv("PIPELINE_RUNTIME", "threads").lower()
+# Sức chứa ring buffer (KB) khi PIPELINE_TRANSPORT=ring
+PIPELINE_RING_BUFFER_KB = int(os.getenv("PIPELINE_RING_BUFFER_KB", 256))
+
 # Service Configuration
 SENDER_PERIOD_MINUTES = int(os.getenv("SENDER_PERIOD_MINUTES", 30))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
\ No newline at end of file
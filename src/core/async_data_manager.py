@@ -2,15 +2,22 @@
 import threading
 import logging
 import time
-from queue import Queue, Empty
+from abc import ABC, abstractmethod
+from queue import Empty
 from typing import Optional
 import numpy as np
 import serial
 
 from ..sensors.hwt905_data_decoder import HWT905DataDecoder
 from ..storage.storage_manager import StorageManager
-from ..sensors.hwt905_constants import PACKET_TYPE_ACC, PACKET_TYPE_ANGLE
+from ..sensors.hwt905_constants import DATA_PACKET_LENGTH
 from ..core.connection_manager import SensorConnectionManager
+from .frame_queue import FrameBatch, FrameBatchQueue
+from .ring_buffer import ByteRingBuffer
+from .frame_timestamper import FrameTimestamper
+from .sample_assembler import SampleAssembler
+from .frame_processor import FrameProcessor
+from ..sensors.hwt905_frame_parser import HWT905FrameParser
 from .. import config
 
 logger = logging.getLogger(__name__)
@@ -30,41 +37,88 @@ def convert_numpy_to_native(data):
         return data.item()
     return data
 
-class SerialReaderThread(threading.Thread):
+def format_jitter_stats(timestamper: FrameTimestamper) -> str:
+    """Tóm tắt jitter của timestamp giữa các chu kỳ output cho log định kỳ."""
+    stats = timestamper.jitter_stats()
+    return (f"Chu kỳ mẫu: TB {stats['mean_ms']:.3f}ms, jitter {stats['std_ms']:.3f}ms, "
+            f"lệch max {stats['max_error_ms']:.3f}ms")
+
+class BaseSerialReaderThread(threading.Thread, ABC):
     """
-    Luồng chuyên đọc dữ liệu thô từ cổng serial và đưa vào hàng đợi.
+    Phần chung của các luồng đọc serial: trạng thái kết nối (sống qua các lần kết nối lại, chỉ nguồn
+    serial được thay), vòng đọc và xử lý lỗi serial. Lớp con quyết định dữ liệu đọc được chuyển cho
+    luồng giải mã bằng cách nào (_read_step).
     """
-    def __init__(self, data_decoder: HWT905DataDecoder, raw_data_queue: Queue, running_flag: threading.Event, connection_manager: SensorConnectionManager = None):
-        super().__init__(daemon=True, name="SerialReaderThread")
+    def __init__(self, data_decoder: HWT905DataDecoder, running_flag: threading.Event,
+                 connection_manager: SensorConnectionManager = None,
+                 device_id: Optional[str] = None):
+        super().__init__(daemon=True, name=f"SerialReaderThread-{device_id}" if device_id else "SerialReaderThread")
+        self.device_id = device_id
+        self.log_prefix = f"[{device_id}] " if device_id else ""
         self.data_decoder = data_decoder
-        self.raw_data_queue = raw_data_queue
         self.running_flag = running_flag
         self.connection_manager = connection_manager
-        self.raw_packet_count = 0
         self.last_log_time = time.time()
 
+        # Trạng thái kết nối: luồng sống qua các lần kết nối lại, chỉ nguồn serial được thay
+        self.link_ready = threading.Event()  # Có serial để đọc
+        self.link_lost = threading.Event()   # Đã mất kết nối, chờ attach_serial()
+        self.link_generation = 0             # Tăng mỗi lần gắn kết nối mới
+        if data_decoder.ser is not None:
+            self.link_ready.set()
+
+    @abstractmethod
+    def _read_step(self) -> bool:
+        """Đọc một lần từ serial và chuyển dữ liệu cho luồng giải mã. Trả về True nếu có dữ liệu."""
+        pass
+
+    @abstractmethod
+    def _log_rates(self):
+        """Ghi log định kỳ tốc độ đọc."""
+        pass
+
+    def _on_stop(self):
+        """Gọi khi luồng dừng: đẩy nốt dữ liệu đã đọc cho luồng giải mã."""
+
+    def _on_link_end(self):
+        """Gọi khi mất kết nối, trước khi bỏ serial."""
+
+    def _on_new_link(self):
+        """Gọi khi gắn kết nối serial mới."""
+
+    def _on_link_lost(self):
+        """Đẩy nốt dữ liệu của kết nối cũ và chờ nguồn serial mới thay vì dừng luồng."""
+        self._on_link_end()
+        self.link_ready.clear()
+        self.data_decoder.set_ser_instance(None)
+        self.link_lost.set()
+
+    def attach_serial(self, ser_instance):
+        """
+        Gắn kết nối serial mới (gọi từ luồng giám sát sau khi kết nối lại).
+        Hàng đợi, lô đang xử lý và storage phía sau giữ nguyên.
+        """
+        self.data_decoder.set_ser_instance(ser_instance)
+        self._on_new_link()
+        self.link_generation += 1
+        self.link_lost.clear()
+        self.link_ready.set()
+
     def run(self):
         logger.info("Luồng đọc Serial đã bắt đầu.")
         consecutive_failures = 0
         max_consecutive_failures = 3
         
         while self.running_flag.is_set():
+            if not self.link_ready.is_set():
+                # Chưa có kết nối: chờ attach_serial() nhưng vẫn phản hồi cờ dừng
+                self.link_ready.wait(0.5)
+                consecutive_failures = 0
+                continue
             try:
-                raw_packet = self.data_decoder.read_raw_packet()
-                if raw_packet:
-                    self.raw_data_queue.put(raw_packet)
-                    self.raw_packet_count += 1
+                if self._read_step():
                     consecutive_failures = 0  # Reset counter khi đọc thành công
-                else:
-                    # Nếu không có dữ liệu, ngủ một chút để tránh chiếm dụng CPU
-                    time.sleep(0.001)
-
-                current_time = time.time()
-                if current_time - self.last_log_time >= 10.0:
-                    rate = self.raw_packet_count / (current_time - self.last_log_time)
-                    logger.info(f"Tốc độ đọc: {rate:.2f} packets/s. Queue size: {self.raw_data_queue.qsize()}")
-                    self.raw_packet_count = 0
-                    self.last_log_time = current_time
+                self._log_rates()
 
             except (serial.SerialException, Exception) as e:
                 consecutive_failures += 1
@@ -74,103 +128,211 @@ class SerialReaderThread(threading.Thread):
                     need_reconnect = self.connection_manager.handle_serial_error(e, consecutive_failures, max_consecutive_failures)
                     
                     if need_reconnect:
-                        logger.warning("Mất kết nối serial. Dừng luồng để main thực hiện kết nối lại...")
-                        # Dừng luồng và để main xử lý việc kết nối lại
-                        self.running_flag.clear()
-                        break
+                        logger.warning(f"{self.log_prefix}Mất kết nối serial. Chờ kết nối lại, pipeline vẫn giữ nguyên...")
+                        self._on_link_lost()
                     else:
                         # Chỉ cần chờ 1 giây rồi thử lại
                         time.sleep(1)
                 else:
                     # Fallback nếu không có connection_manager
                     if consecutive_failures >= max_consecutive_failures:
-                        logger.warning("Quá nhiều lỗi liên tiếp. Dừng luồng...")
-                        self.running_flag.clear()
-                        break
-                    time.sleep(1)
-                    
+                        logger.warning(f"{self.log_prefix}Quá nhiều lỗi liên tiếp. Chờ kết nối mới...")
+                        self._on_link_lost()
+                    else:
+                        time.sleep(1)
+
+        self._on_stop()
         logger.info("Luồng đọc Serial đã dừng.")
 
 
+class SerialReaderThread(BaseSerialReaderThread):
+    """
+    Luồng chuyên đọc dữ liệu thô từ cổng serial và đưa vào hàng đợi theo lô.
+    Một lô được đóng khi đủ batch_max_frames gói hoặc khi gói đầu tiên đã chờ quá batch_max_ms.
+    """
+    def __init__(self, data_decoder: HWT905DataDecoder, raw_data_queue: FrameBatchQueue, running_flag: threading.Event,
+                 connection_manager: SensorConnectionManager = None,
+                 batch_max_frames: int = config.PIPELINE_BATCH_MAX_FRAMES,
+                 batch_max_ms: float = config.PIPELINE_BATCH_MAX_MS,
+                 timestamper: Optional[FrameTimestamper] = None,
+                 device_id: Optional[str] = None):
+        super().__init__(data_decoder=data_decoder, running_flag=running_flag,
+                         connection_manager=connection_manager, device_id=device_id)
+        self.raw_data_queue = raw_data_queue
+        self.timestamper = timestamper or FrameTimestamper(config.SENSOR_OUTPUT_RATE_HZ)
+        self.batch_max_frames = max(1, batch_max_frames)
+        self.batch_max_age = max(0.0, batch_max_ms) / 1000.0
+        self.raw_packet_count = 0
+        self.batch_count = 0
+
+        self._pending_frames = []
+        self._pending_timestamps = []
+        self._pending_since = 0.0
+
+    def _flush_batch(self):
+        """Đưa lô đang gom vào hàng đợi (chặn nếu hàng đợi đã đầy)."""
+        if not self._pending_frames:
+            return
+        batch = FrameBatch(self._pending_frames, self._pending_timestamps, self.link_generation,
+                           captured_at=self._pending_since)
+        self._pending_frames = []
+        self._pending_timestamps = []
+        self.raw_data_queue.put(batch)
+        self.raw_packet_count += len(batch)
+        self.batch_count += 1
+
+    def _read_step(self) -> bool:
+        """Đọc một lần từ serial và gom vào lô. Trả về True nếu có dữ liệu."""
+        frames = self.data_decoder.read_raw_packets()
+        now = time.monotonic()
+        if frames:
+            if not self._pending_frames:
+                self._pending_since = now
+            self._pending_frames.extend(frames)
+            self._pending_timestamps.extend(self.timestamper.stamp(frames, self.timestamper.read_time_ns(self.data_decoder)))
+
+        if self._pending_frames and (len(self._pending_frames) >= self.batch_max_frames
+                                     or now - self._pending_since >= self.batch_max_age):
+            self._flush_batch()
+        elif not frames:
+            # Nếu không có dữ liệu, ngủ một chút để tránh chiếm dụng CPU
+            time.sleep(0.001)
+        return bool(frames)
+
+    def _log_rates(self):
+        """Ghi log định kỳ tốc độ đọc và kích thước lô."""
+        current_time = time.time()
+        if current_time - self.last_log_time < 10.0:
+            return
+        interval = current_time - self.last_log_time
+        rate = self.raw_packet_count / interval
+        avg_batch = self.raw_packet_count / self.batch_count if self.batch_count else 0
+        logger.info(f"{self.log_prefix}Tốc độ đọc: {rate:.2f} packets/s, {self.batch_count / interval:.1f} lô/s, "
+                    f"kích thước lô TB: {avg_batch:.1f} gói. Queue size: {self.raw_data_queue.qsize()} gói. "
+                    f"{format_jitter_stats(self.timestamper)}")
+        self.raw_packet_count = 0
+        self.batch_count = 0
+        self.last_log_time = current_time
+
+    def _on_stop(self):
+        """Đẩy nốt các gói đã đọc để DecoderThread xử lý trước khi dừng."""
+        self._flush_batch()
+
+    def _on_link_end(self):
+        """Đẩy nốt các gói của kết nối cũ, rồi một lô rỗng làm mốc kết thúc kết nối: DecoderThread phát chu kỳ đang ghép dở ngay."""
+        self._flush_batch()
+        self.raw_data_queue.put(FrameBatch([], [], self.link_generation))
+
+    def _on_new_link(self):
+        self.timestamper.reanchor()
+
+
 class DecoderThread(threading.Thread):
     """
-    Luồng chuyên lấy dữ liệu thô từ hàng đợi, giải mã và lưu trữ TẤT CẢ dữ liệu góc.
+    Luồng chuyên lấy từng lô dữ liệu thô từ hàng đợi, giải mã và lưu trữ TẤT CẢ dữ liệu góc.
+    Việc xử lý từng gói (giải mã, ghép chu kỳ, kênh dẫn xuất, ghi theo lô) do FrameProcessor đảm nhận.
     """
     def __init__(self,
                  data_decoder: HWT905DataDecoder,
-                 raw_data_queue: Queue,
+                 raw_data_queue: FrameBatchQueue,
                  running_flag: threading.Event,
                  storage_manager: StorageManager,
-                 reader_thread: SerialReaderThread):
-        super().__init__(daemon=True, name="DecoderThread")
+                 reader_thread: BaseSerialReaderThread,
+                 device_id: Optional[str] = None,
+                 row_mode: str = config.STORAGE_ROW_MODE):
+        super().__init__(daemon=True, name=f"DecoderThread-{device_id}" if device_id else "DecoderThread")
+        self.device_id = device_id  # Nếu có, được ghi kèm vào mỗi dòng dữ liệu
+        self.log_prefix = f"[{device_id}] " if device_id else ""
         self.data_decoder = data_decoder
         self.raw_data_queue = raw_data_queue
         self.running_flag = running_flag
         self.storage_manager = storage_manager
         self.reader_thread = reader_thread  # Reference để kiểm tra trạng thái
-        
-        self.decoded_packet_count = 0
-        self.saved_packet_count = 0  # Số packet thực sự được lưu
+        self.processor = FrameProcessor(data_decoder, storage_manager, row_mode=row_mode, device_id=device_id)
+        self._link_generation = reader_thread.link_generation
+
+        self.batch_count = 0
+        self.batch_frame_count = 0
+        self.batch_latency_total = 0.0  # Tổng thời gian lô chờ trong hàng đợi (giây)
+        self.batch_latency_max = 0.0
         self.last_log_time = time.time()
 
+    @property
+    def assembler(self) -> Optional[SampleAssembler]:
+        return self.processor.assembler
+
+    @property
+    def total_decoded_count(self) -> int:
+        return self.processor.total_decoded_count
+
+    @property
+    def total_saved_count(self) -> int:
+        return self.processor.total_saved_count
+
+    @property
+    def total_skipped_count(self) -> int:
+        """Tổng số gói đã bỏ qua vì không có consumer nào đăng ký packet type của chúng."""
+        return self.processor.total_skipped_count
+
+    def _transport_info(self) -> str:
+        """Mô tả trạng thái lô/hàng đợi cho log định kỳ."""
+        avg_batch = self.batch_frame_count / self.batch_count if self.batch_count else 0
+        avg_latency_ms = self.batch_latency_total / self.batch_count * 1000 if self.batch_count else 0
+        return (f"Lô: {self.batch_count} (TB {avg_batch:.1f} gói), độ trễ lô TB {avg_latency_ms:.1f}ms / "
+                f"max {self.batch_latency_max * 1000:.1f}ms. "
+                f"Queue raw: {self.raw_data_queue.qsize()} gói / {self.raw_data_queue.batch_count()} lô")
+
+    def _log_rates(self):
+        """Ghi log định kỳ tốc độ giải mã, kích thước lô và độ trễ lô."""
+        current_time = time.time()
+        if current_time - self.last_log_time < 10.0:
+            return
+
+        time_interval = current_time - self.last_log_time
+        logger.info(f"{self.log_prefix}{self.processor.rate_summary(time_interval)}. {self._transport_info()}. "
+                    f"{self.processor.durability_summary()}")
+        self.batch_count = 0
+        self.batch_frame_count = 0
+        self.batch_latency_total = 0.0
+        self.batch_latency_max = 0.0
+        self.last_log_time = current_time
+
+    def _reader_active(self) -> bool:
+        """Luồng đọc còn chạy: có thể còn đẩy lô cuối (_on_stop) sau khi cờ đã tắt."""
+        return self.reader_thread is not None and self.reader_thread.is_alive()
+
     def run(self):
         logger.info("Luồng Giải mã & Lưu trữ đã bắt đầu (lưu TẤT CẢ dữ liệu góc).")
         
-        while self.running_flag.is_set() or not self.raw_data_queue.empty():
+        while self.running_flag.is_set() or self._reader_active() or not self.raw_data_queue.empty():
             try:
-                raw_packet = self.raw_data_queue.get(timeout=1)
-                
-                # 1. Giải mã gói tin
-                packet_info = self.data_decoder.decode_raw_packet(raw_packet)
-
-                if not packet_info or "error" in packet_info:
+                batch = self.raw_data_queue.get(timeout=1)
+                try:
+                    if not batch.frames or batch.link_generation != self._link_generation:
+                        # Mất kết nối (lô rỗng làm mốc) hoặc lô đầu tiên của kết nối mới:
+                        # phát chu kỳ đang ghép dở, không ghép chu kỳ qua khoảng mất kết nối
+                        self._link_generation = batch.link_generation
+                        self.processor.new_link()
+                    if batch.frames:
+                        latency = time.monotonic() - batch.created_at
+                        self.batch_count += 1
+                        self.batch_frame_count += len(batch)
+                        self.batch_latency_total += latency
+                        if latency > self.batch_latency_max:
+                            self.batch_latency_max = latency
+                        self.processor.process_batch(batch.frames, batch.timestamps, batch.captured_at)
+                finally:
                     self.raw_data_queue.task_done()
-                    continue
-                
-                self.decoded_packet_count += 1
-                
-                # 2. Chỉ xử lý dữ liệu góc (angle packet type 0x53)
-                packet_type = packet_info.get("type")
-                if packet_type == PACKET_TYPE_ANGLE and "angle_roll" in packet_info and "angle_pitch" in packet_info and "angle_yaw" in packet_info:
-                    current_time = time.time()
-                    
-                    # 3. Lưu TẤT CẢ dữ liệu góc - không có rate limiting
-                    data_to_store = {
-                        "timestamp": packet_info.get("timestamp", current_time),
-                        "angle_roll": packet_info.get("angle_roll"),
-                        "angle_pitch": packet_info.get("angle_pitch"), 
-                        "angle_yaw": packet_info.get("angle_yaw")
-                    }
-                    
-                    # Thêm nhiệt độ nếu có
-                    if "temperature" in packet_info:
-                        data_to_store["temperature"] = packet_info.get("temperature")
-                    
-                    self.saved_packet_count += 1
-                    
-                    # Ghi vào file
-                    self.storage_manager.write_data(data_to_store)
-
-                self.raw_data_queue.task_done()
 
                 # Ghi log định kỳ
-                current_time = time.time()
-                if current_time - self.last_log_time >= 10.0:
-                    time_interval = current_time - self.last_log_time
-                    decode_rate = self.decoded_packet_count / time_interval
-                    save_rate = self.saved_packet_count / time_interval
-                    q_info = f"Queue raw: {self.raw_data_queue.qsize()}"
-                    efficiency = (self.saved_packet_count / self.decoded_packet_count * 100) if self.decoded_packet_count > 0 else 0
-                    
-                    logger.info(f"Decode: {decode_rate:.1f}Hz, Lưu góc: {save_rate:.1f}Hz, Hiệu suất: {efficiency:.1f}%. {q_info}")
-                    self.decoded_packet_count = 0
-                    self.saved_packet_count = 0
-                    self.last_log_time = current_time
+                self._log_rates()
 
             except Empty:
-                if not self.running_flag.is_set():
+                if not self.running_flag.is_set() and not self._reader_active():
                     logger.info("Hàng đợi thô trống và cờ đã tắt, thoát luồng Decoder.")
                     break
+                # Không có dữ liệu mới: vẫn flush/fsync dòng cuối theo chính sách ghi
+                self.storage_manager.check_durability()
                 continue
                 
             except Exception as e:
@@ -180,4 +342,208 @@ class DecoderThread(threading.Thread):
                 
         logger.info("Luồng Giải mã & Lưu trữ đã dừng.")
         # Đóng file đang mở khi luồng dừng
-        self.storage_manager.close_current_file()
\ No newline at end of file
+        self.processor.close()
+
+
+class RingSerialReaderThread(BaseSerialReaderThread):
+    """
+    Luồng đọc serial ghi thẳng byte thô vào ByteRingBuffer (readinto), không tạo
+    đối tượng bytes cho từng gói. Khi buffer đầy, dữ liệu mới bị bỏ và được tính là overrun,
+    trừ khi block_when_full (nguồn không theo thời gian thực như ReplaySerial): khi đó luồng
+    đọc chờ luồng giải mã giải phóng chỗ, giống put() chặn của FrameBatchQueue.
+    """
+    def __init__(self, data_decoder: HWT905DataDecoder, ring_buffer: ByteRingBuffer, running_flag: threading.Event,
+                 connection_manager: SensorConnectionManager = None,
+                 read_chunk_size: int = config.SENSOR_READ_CHUNK_SIZE,
+                 device_id: Optional[str] = None,
+                 block_when_full: bool = False):
+        super().__init__(data_decoder=data_decoder, running_flag=running_flag,
+                         connection_manager=connection_manager, device_id=device_id)
+        self.ring_buffer = ring_buffer
+        self.read_chunk_size = read_chunk_size
+        self.block_when_full = block_when_full
+        self.raw_byte_count = 0
+        self._overrun_scratch = memoryview(bytearray(read_chunk_size))
+        self._logged_overrun_events = 0
+
+    def _read_step(self) -> bool:
+        view = self.ring_buffer.writable_view(self.read_chunk_size)
+        if not len(view) and self.block_when_full:
+            time.sleep(0.0005)
+            return False
+        if not len(view):
+            # Buffer đầy: vẫn đọc để bộ đệm driver không tràn, nhưng bỏ dữ liệu
+            dropped = self.data_decoder.read_into(self._overrun_scratch)
+            if dropped:
+                self.ring_buffer.record_overrun(dropped)
+            return bool(dropped)
+
+        size = self.data_decoder.read_into(view)
+        # Mốc của khối: wall-clock đã ghi khi phát lại segment raw capture (xem FrameTimestamper.read_time_ns)
+        recorded_ns = self.data_decoder.last_read_wall_ns
+        self.ring_buffer.commit_write(size, self.data_decoder.last_read_ns if recorded_ns is None else recorded_ns)
+        self.raw_byte_count += size
+        return size > 0
+
+    def _log_rates(self):
+        current_time = time.time()
+        if current_time - self.last_log_time < 10.0:
+            return
+        interval = current_time - self.last_log_time
+        ring = self.ring_buffer
+        logger.info(f"{self.log_prefix}Tốc độ đọc: {self.raw_byte_count / interval:.0f} bytes/s. Ring buffer: {ring.fill_level}/"
+                    f"{ring.capacity} bytes ({ring.fill_ratio() * 100:.1f}%), đỉnh {ring.peak_fill} bytes, "
+                    f"overrun {ring.overrun_events} lần / {ring.overrun_bytes} bytes")
+        if ring.overrun_events > self._logged_overrun_events:
+            logger.warning(f"{self.log_prefix}Ring buffer bị tràn {ring.overrun_events - self._logged_overrun_events} lần "
+                           f"trong {interval:.0f}s - luồng giải mã không theo kịp")
+            self._logged_overrun_events = ring.overrun_events
+        self.raw_byte_count = 0
+        self.last_log_time = current_time
+
+
+class RingDecoderThread(DecoderThread):
+    """
+    Luồng giải mã đọc trực tiếp từ ByteRingBuffer: tách gói tại chỗ trên vùng dữ liệu
+    liền mạch của buffer rồi giải phóng phần đã xử lý.
+    """
+    def __init__(self,
+                 data_decoder: HWT905DataDecoder,
+                 ring_buffer: ByteRingBuffer,
+                 running_flag: threading.Event,
+                 storage_manager: StorageManager,
+                 reader_thread: BaseSerialReaderThread,
+                 poll_interval: float = 0.002,
+                 device_id: Optional[str] = None,
+                 row_mode: str = config.STORAGE_ROW_MODE):
+        super().__init__(data_decoder=data_decoder, raw_data_queue=None, running_flag=running_flag,
+                         storage_manager=storage_manager, reader_thread=reader_thread, device_id=device_id,
+                         row_mode=row_mode)
+        self.ring_buffer = ring_buffer
+        self.frame_parser = HWT905FrameParser()
+        self.poll_interval = poll_interval
+        self.timestamper = FrameTimestamper(config.SENSOR_OUTPUT_RATE_HZ)
+        self._link_end_handled = False
+
+    def _transport_info(self) -> str:
+        ring = self.ring_buffer
+        avg_batch = self.batch_frame_count / self.batch_count if self.batch_count else 0
+        return (f"Vùng đọc: {self.batch_count} (TB {avg_batch:.1f} gói). Ring buffer: {ring.fill_level}/{ring.capacity} "
+                f"bytes, đỉnh {ring.peak_fill} bytes, overrun {ring.overrun_events} lần, "
+                f"checksum lỗi {self.frame_parser.checksum_errors}. {format_jitter_stats(self.timestamper)}")
+
+    def run(self):
+        logger.info("Luồng Giải mã & Lưu trữ (ring buffer) đã bắt đầu (lưu TẤT CẢ dữ liệu góc).")
+        ring = self.ring_buffer
+
+        while True:
+            try:
+                start, end = ring.readable_region()
+                if end - start < DATA_PACKET_LENGTH:
+                    if not self.running_flag.is_set() and not self._reader_active():
+                        break
+                    if self.reader_thread.link_lost.is_set() and not self._link_end_handled:
+                        # Đã xử lý hết dữ liệu của kết nối vừa mất: phát chu kỳ đang ghép dở ngay
+                        self._link_end_handled = True
+                        self.processor.new_link()
+                    self.storage_manager.check_durability()
+                    time.sleep(self.poll_interval)
+                    continue
+
+                if self.reader_thread.link_generation != self._link_generation:
+                    # Kết nối mới: không nội suy hay ghép chu kỳ qua khoảng mất kết nối
+                    self._link_generation = self.reader_thread.link_generation
+                    self._link_end_handled = False
+                    self.timestamper.reanchor()
+                    self.processor.new_link()
+
+                # Giải mã tại chỗ trên ring buffer: chỉ lấy vị trí gói, vùng được giải phóng sau khi xử lý xong
+                offsets, consumed = self.frame_parser.parse_region_offsets(ring.buffer, start, end)
+                if offsets:
+                    # Thời điểm đọc khối chứa gói đầu vùng (mốc độ trễ ghi đĩa); gói cuối vùng được gán
+                    # thời điểm đọc của khối serial chứa nó
+                    captured_ns = ring.chunk_read_ns(offsets[0] - start + DATA_PACKET_LENGTH)
+                    recorded = self.data_decoder.last_read_wall_ns is not None
+                    self.timestamper.use_recorded_clock(recorded)
+                    timestamps = self.timestamper.stamp_region(ring.buffer, offsets, ring.chunk_read_ns(consumed))
+                    # Mốc đã ghi (phát lại) không dùng để đo độ trễ ghi đĩa
+                    captured_at = None if recorded else captured_ns / 1e9
+                    self.processor.process_region(ring.buffer, offsets, timestamps, captured_at)
+                ring.commit_read(consumed)
+
+                if offsets:
+                    self.batch_count += 1
+                    self.batch_frame_count += len(offsets)
+                elif not consumed:
+                    self.storage_manager.check_durability()
+                    time.sleep(self.poll_interval)
+
+                self._log_rates()
+
+            except Exception as e:
+                logger.error(f"Lỗi trong luồng Decoder: {e}", exc_info=True)
+                self.running_flag.clear()
+                break
+
+        logger.info("Luồng Giải mã & Lưu trữ đã dừng.")
+        # Đóng file đang mở khi luồng dừng
+        self.processor.close()
+
+
+def create_pipeline_threads(data_decoder: HWT905DataDecoder,
+                            storage_manager: StorageManager,
+                            running_flag: threading.Event,
+                            connection_manager: SensorConnectionManager = None,
+                            transport: str = config.PIPELINE_TRANSPORT,
+                            device_id: Optional[str] = None,
+                            lossless: bool = False,
+                            row_mode: str = config.STORAGE_ROW_MODE):
+    """
+    Tạo cặp luồng đọc/giải mã theo kiểu truyền dữ liệu đã cấu hình.
+    Args:
+        transport (str): "queue" (lô gói tin qua FrameBatchQueue) hoặc "ring" (ByteRingBuffer).
+        device_id (Optional[str]): Mã thiết bị, dùng cho tên luồng và ghi kèm vào dữ liệu.
+        lossless (bool): Luồng đọc chờ thay vì bỏ dữ liệu khi ring buffer đầy (cho nguồn phát lại từ file).
+        row_mode (str): "angle" (một dòng mỗi gói góc) hoặc "cycle" (một dòng rộng mỗi chu kỳ output).
+    Returns:
+        Tuple (reader_thread, decoder_thread) chưa được start.
+    """
+    if transport == "ring":
+        ring_buffer = ByteRingBuffer(capacity=config.PIPELINE_RING_BUFFER_KB * 1024)
+        reader_thread = RingSerialReaderThread(
+            data_decoder=data_decoder,
+            ring_buffer=ring_buffer,
+            running_flag=running_flag,
+            connection_manager=connection_manager,
+            read_chunk_size=data_decoder.read_chunk_size,
+            device_id=device_id,
+            block_when_full=lossless
+        )
+        decoder_thread = RingDecoderThread(
+            data_decoder=data_decoder,
+            ring_buffer=ring_buffer,
+            running_flag=running_flag,
+            storage_manager=storage_manager,
+            reader_thread=reader_thread,
+            device_id=device_id,
+            row_mode=row_mode
+        )
+    else:
+        raw_data_queue = FrameBatchQueue(maxsize=config.PIPELINE_QUEUE_MAX_FRAMES)
+        reader_thread = SerialReaderThread(
+            data_decoder=data_decoder,
+            raw_data_queue=raw_data_queue,
+            running_flag=running_flag,
+            connection_manager=connection_manager,
+            device_id=device_id
+        )
+        decoder_thread = DecoderThread(
+            data_decoder=data_decoder,
+            raw_data_queue=raw_data_queue,
+            running_flag=running_flag,
+            storage_manager=storage_manager,
+            reader_thread=reader_thread,
+            device_id=device_id,
+            row_mode=row_mode
+        )
+    return reader_thread, decoder_thread
@@ -0,0 +1,239 @@
+# src/core/async_runtime.py
+"""
+Chế độ thu thập dựa trên asyncio, thay cho cặp SerialReaderThread/DecoderThread.
+
+File descriptor của cổng serial được đăng ký với loop.add_reader: event loop chỉ thức
+dậy khi kernel báo có dữ liệu, không có vòng lặp sleep/poll và không có chuyển ngữ cảnh
+giữa các luồng. Việc giải mã, flush file lưu trữ và ping watchdog của systemd đều là
+coroutine chạy trên cùng một luồng.
+"""
+import asyncio
+import logging
+import signal
+import threading
+import time
+from typing import Optional
+
+import serial
+
+from ..sensors.hwt905_data_decoder import HWT905DataDecoder
+from ..storage.storage_manager import StorageManager
+from ..storage.background_writer import shutdown_storage
+from .connection_manager import SensorConnectionManager
+from .frame_queue import FrameBatch
+from .frame_processor import FrameProcessor
+from .frame_timestamper import FrameTimestamper
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAcquisitionRuntime:
+    """
+    Chạy toàn bộ pipeline đọc → giải mã → lưu trữ trên một event loop asyncio,
+    tự kết nối lại khi mất cảm biến mà vẫn giữ nguyên decoder và storage.
+    """
+
+    def __init__(self,
+                 connection_manager: SensorConnectionManager,
+                 data_decoder: HWT905DataDecoder,
+                 storage_manager: StorageManager,
+                 running_flag: threading.Event,
+                 notifier=None,
+                 flush_interval: float = 0.1,
+                 watchdog_interval: float = 2.0,
+                 reconnect_delay: float = 3.0,
+                 row_mode: str = config.STORAGE_ROW_MODE):
+        """
+        Args:
+            connection_manager: Quản lý kết nối serial.
+            data_decoder: Decoder dùng chung cho mọi lần kết nối.
+            storage_manager: Nơi lưu dữ liệu góc.
+            running_flag: Cờ toàn cục; bị clear khi ứng dụng cần thoát.
+            notifier: sdnotify.SystemdNotifier (tùy chọn) để gửi READY/WATCHDOG.
+            flush_interval: Chu kỳ áp dụng chính sách flush/fsync của storage khi không có dữ liệu mới (giây).
+            watchdog_interval: Chu kỳ ping watchdog systemd (giây).
+            reconnect_delay: Thời gian tối đa giữa các lần thử kết nối lại khi không có sự kiện hotplug (giây).
+            row_mode: "angle" (một dòng mỗi gói góc) hoặc "cycle" (một dòng rộng mỗi chu kỳ output).
+        """
+        self.connection_manager = connection_manager
+        self.data_decoder = data_decoder
+        self.storage_manager = storage_manager
+        self.running_flag = running_flag
+        self.notifier = notifier
+        self.flush_interval = flush_interval
+        self.watchdog_interval = watchdog_interval
+        self.reconnect_delay = reconnect_delay
+
+        self.timestamper = FrameTimestamper(config.SENSOR_OUTPUT_RATE_HZ)
+        self.processor = FrameProcessor(data_decoder, storage_manager, row_mode=row_mode)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batches: Optional[asyncio.Queue] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._disconnected: Optional[asyncio.Event] = None
+        self._ser: Optional[serial.Serial] = None
+        self._link_generation = 0     # Tăng mỗi lần gắn kết nối mới, được gắn vào từng lô
+        self._decoded_generation = 0  # Lần kết nối của lô giải mã gần nhất
+
+        self.read_callbacks = 0
+        self.last_log_time = time.time()
+
+    def stop(self):
+        """Yêu cầu runtime dừng (an toàn khi gọi từ signal handler của loop)."""
+        self.running_flag.clear()
+        if self._stop_event:
+            self._stop_event.set()
+
+    async def run(self):
+        """Điểm vào chính: chạy cho tới khi running_flag bị clear."""
+        self._loop = asyncio.get_running_loop()
+        self._batches = asyncio.Queue()
+        self._stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Không chạy trên luồng chính, dựa vào running_flag
+
+        tasks = [
+            asyncio.create_task(self._decode_loop(), name="decode"),
+            asyncio.create_task(self._flush_loop(), name="storage-flush"),
+            asyncio.create_task(self._watchdog_loop(), name="watchdog"),
+        ]
+        try:
+            await self._connection_loop()
+        finally:
+            self._detach_serial()
+            # Chờ giải mã hết các lô còn lại trước khi hủy các task nền
+            await self._batches.join()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.processor.close()
+            shutdown_storage(self.storage_manager)
+            logger.info("Runtime asyncio đã dừng.")
+
+    # ------------------------------------------------------------------
+    # Kết nối
+    # ------------------------------------------------------------------
+    async def _connection_loop(self):
+        ready_sent = False
+        while self.running_flag.is_set():
+            logger.info("Đang thử thiết lập kết nối với cảm biến...")
+            # establish_connection là hàm chặn, chạy trong executor để loop vẫn phục vụ watchdog
+            ser = await self._loop.run_in_executor(None, self.connection_manager.establish_connection)
+            if not ser or not ser.is_open:
+                logger.info(f"Chưa có kết nối. Thử lại khi cổng xuất hiện hoặc sau {self.reconnect_delay} giây...")
+                await self._wait_for_port()
+                continue
+
+            self._attach_serial(ser)
+            if self.notifier and not ready_sent:
+                self.notifier.notify("READY=1")
+                ready_sent = True
+            logger.info("Ứng dụng đã sẵn sàng (runtime asyncio).")
+
+            stop_wait = asyncio.create_task(self._stop_event.wait())
+            lost_wait = asyncio.create_task(self._disconnected.wait())
+            await asyncio.wait({stop_wait, lost_wait}, return_when=asyncio.FIRST_COMPLETED)
+            stop_wait.cancel()
+            lost_wait.cancel()
+
+            self._detach_serial()
+            if self.running_flag.is_set():
+                logger.warning("Phát hiện mất kết nối. Đang kết nối lại...")
+
+    def _attach_serial(self, ser: serial.Serial):
+        self._ser = ser
+        self._disconnected = asyncio.Event()
+        self.data_decoder.set_ser_instance(ser)
+        self.timestamper.reanchor()
+        self._link_generation += 1
+        self._loop.add_reader(ser.fileno(), self._on_readable)
+
+    def _detach_serial(self):
+        if self._ser is None:
+            return
+        try:
+            self._loop.remove_reader(self._ser.fileno())
+        except Exception:
+            pass  # fd có thể đã bị đóng
+        self.connection_manager.close_connection()
+        self.data_decoder.set_ser_instance(None)
+        self._ser = None
+        # Lô rỗng làm mốc kết thúc kết nối: coroutine giải mã phát chu kỳ đang ghép dở ngay
+        self._batches.put_nowait(FrameBatch([], [], self._link_generation))
+
+    async def _wait_for_port(self):
+        """Chờ cổng xuất hiện lại (sự kiện hotplug, chạy trong executor) tối đa reconnect_delay giây."""
+        deadline = time.monotonic() + self.reconnect_delay
+        while self.running_flag.is_set() and not self._stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if await self._loop.run_in_executor(None, self.connection_manager.wait_for_port_change,
+                                                min(remaining, 1.0)):
+                return
+
+    # ------------------------------------------------------------------
+    # Đọc (callback của event loop)
+    # ------------------------------------------------------------------
+    def _on_readable(self):
+        """Được gọi khi fd serial có dữ liệu: đọc hết, tách gói và đưa lô cho coroutine giải mã."""
+        self.read_callbacks += 1
+        try:
+            # Dữ liệu đã sẵn sàng nên read_raw_packets không bị chặn
+            frames = self.data_decoder.read_raw_packets()
+        except serial.SerialException as e:
+            logger.warning(f"Lỗi đọc serial: {e}")
+            self._loop.remove_reader(self._ser.fileno())
+            self._disconnected.set()
+            return
+
+        if frames:
+            timestamps = self.timestamper.stamp(frames, self.timestamper.read_time_ns(self.data_decoder))
+            self._batches.put_nowait(FrameBatch(frames, timestamps, self._link_generation))
+
+    # ------------------------------------------------------------------
+    # Các coroutine nền
+    # ------------------------------------------------------------------
+    async def _decode_loop(self):
+        while True:
+            batch = await self._batches.get()
+            try:
+                if not batch.frames or batch.link_generation != self._decoded_generation:
+                    # Mất kết nối (lô rỗng làm mốc) hoặc lô đầu tiên của kết nối mới (lô cũ có thể vẫn
+                    # còn trong hàng đợi khi gắn kết nối): không ghép chu kỳ qua khoảng mất kết nối
+                    self._decoded_generation = batch.link_generation
+                    self.processor.new_link()
+                if batch.frames:
+                    self.processor.process_batch(batch.frames, batch.timestamps, batch.captured_at)
+            except Exception as e:
+                logger.error(f"Lỗi khi giải mã lô: {e}", exc_info=True)
+            finally:
+                self._batches.task_done()
+            self._log_rates()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.storage_manager.check_durability()
+
+    async def _watchdog_loop(self):
+        while True:
+            if self.notifier:
+                self.notifier.notify("WATCHDOG=1")
+            await asyncio.sleep(self.watchdog_interval)
+
+    def _log_rates(self):
+        current_time = time.time()
+        if current_time - self.last_log_time < 10.0:
+            return
+        interval = current_time - self.last_log_time
+        stats = self.timestamper.jitter_stats()
+        logger.info(f"{self.processor.rate_summary(interval)}. "
+                    f"{self.read_callbacks / interval:.1f} lần đọc/s, lô chờ: {self._batches.qsize()}. "
+                    f"Chu kỳ mẫu: TB {stats['mean_ms']:.3f}ms, jitter {stats['std_ms']:.3f}ms. "
+                    f"{self.processor.durability_summary()}")
+        self.read_callbacks = 0
+        self.last_log_time = current_time
@@ -1,38 +1,89 @@
 import logging
+import threading
 import time
 import serial
 import glob
 import os
-from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, List, Tuple
+
+from ..sensors.hwt905_configurator import HWT905Configurator, SensorOutputProfile
+from ..sensors.hwt905_frame_parser import HWT905FrameParser
+from ..sensors.hwt905_constants import DATA_PACKET_LENGTH
+from .hotplug import DeviceHotplugWatcher
+from .. import config
 
 logger = logging.getLogger(__name__)
 
+SERIAL_BY_ID_DIR = '/dev/serial/by-id'
+SERIAL_READ_TIMEOUT = 0.5   # Timeout đọc khi đã kết nối (giây)
+PROBE_READ_TIMEOUT = 0.05   # Timeout đọc trong lúc dò cổng/baudrate (giây)
+
+
+def _close_probe_result(future):
+    """Đóng cổng của một lần dò không được chọn."""
+    result = future.result() if not future.exception() else None
+    if result:
+        try:
+            result[0].close()
+        except Exception:
+            pass
+
+
 class SensorConnectionManager:
     """
     Quản lý kết nối với cảm biến HWT905 đơn giản.
     """
 
-    def __init__(self, port: str, baudrate: int):
+    def __init__(self, port: str, baudrate: int, auto_discover: bool = True,
+                 output_profile: Optional[SensorOutputProfile] = None,
+                 probe_baudrate: bool = config.SENSOR_BAUD_PROBE,
+                 baud_candidates: Optional[List[int]] = None,
+                 target_baudrate: int = config.SENSOR_TARGET_BAUD_RATE):
         """
         Khởi tạo ConnectionManager.
 
         Args:
             port (str): Cổng UART ưu tiên, ví dụ: "/dev/ttyUSB0".
             baudrate (int): Baudrate để kết nối.
+            auto_discover (bool): Quét các cổng USB khác nếu cổng ưu tiên không dùng được.
+                                  False để chỉ dùng đúng cổng đã chỉ định (ví dụ mỗi cảm biến một pipeline).
+            output_profile (Optional[SensorOutputProfile]): Cấu hình output ghi vào cảm biến sau mỗi lần kết nối.
+            probe_baudrate (bool): Dò baudrate thực của cảm biến theo tỉ lệ gói tin hợp lệ sau khi mở cổng.
+            baud_candidates (Optional[List[int]]): Các baudrate thử khi dò, mặc định SENSOR_BAUD_CANDIDATES.
+            target_baudrate (int): Nếu khác 0, chuyển cảm biến sang baudrate này (REG_BAUD) rồi kết nối lại.
         """
         self.preferred_port = port
         self.baudrate = baudrate
+        self.auto_discover = auto_discover
+        self.output_profile = output_profile
+        self.probe_baudrate = probe_baudrate
+        self.baud_candidates = baud_candidates or config.SENSOR_BAUD_CANDIDATES
+        self.target_baudrate = target_baudrate
+        self.probe_window = 0.3          # Thời gian nghe ở mỗi baudrate khi dò (giây)
+        self.probe_min_frames = 3        # Số gói hợp lệ tối thiểu để chấp nhận một baudrate
+        self.probe_min_score = 0.9       # Tỉ lệ byte thuộc gói hợp lệ tối thiểu
+        self.signature_frames = config.SENSOR_SIGNATURE_FRAMES  # Số gói hợp lệ để xác nhận cổng là HWT905
+        self.signature_timeout = 0.5     # Thời gian chờ đủ gói xác nhận ở baudrate hiện tại (giây)
+        self._known_ports: set = set()   # Cổng đã thấy ở lần thử kết nối gần nhất
+        self._hotplug_watcher: Optional[DeviceHotplugWatcher] = None
+        self._cached_port_id: Optional[str] = None  # Đường dẫn ổn định của cảm biến đã xác nhận
         self.ser: Optional[serial.Serial] = None
         self.current_port: Optional[str] = None
 
     def find_available_ports(self) -> List[str]:
         """
-        Tìm tất cả cổng USB serial có sẵn.
+        Tìm tất cả cổng USB serial có sẵn, cùng với cổng đã cấu hình nếu nó tồn tại.
         
         Returns:
-            Danh sách các cổng USB serial
+            Danh sách các cổng serial, cổng đã cấu hình đứng đầu
         """
         ports = []
+
+        if not self.auto_discover:
+            if os.path.exists(self.preferred_port) and os.access(self.preferred_port, os.R_OK | os.W_OK):
+                ports.append(self.preferred_port)
+            return ports
         
         # Tìm tất cả ttyUSB devices
         usb_ports = glob.glob('/dev/ttyUSB*')
@@ -40,16 +91,22 @@ class SensorConnectionManager:
             if os.path.exists(port) and os.access(port, os.R_OK | os.W_OK):
                 ports.append(port)
         
-        # Ưu tiên preferred port lên đầu nếu có
+        # Ưu tiên preferred port lên đầu nếu có. Cổng cấu hình không phải ttyUSB
+        # (pty của simulator, /dev/ttyACM*, symlink udev) cũng được thử.
         if self.preferred_port in ports:
             ports.remove(self.preferred_port)
             ports.insert(0, self.preferred_port)
+        elif os.path.exists(self.preferred_port) and os.access(self.preferred_port, os.R_OK | os.W_OK):
+            ports.insert(0, self.preferred_port)
         
         return ports
 
     def establish_connection(self) -> Optional[serial.Serial]:
         """
         Thiết lập kết nối với cảm biến.
+        Cổng đã xác nhận ở lần trước (theo /dev/serial/by-id nếu có) được thử riêng trước;
+        nếu không được, tất cả cổng ứng viên được dò song song và chỉ cổng cho thấy
+        signature_frames gói HWT905 hợp lệ mới được chấp nhận.
 
         Returns:
             Instance serial.Serial nếu thành công, None nếu thất bại.
@@ -60,65 +117,313 @@ class SensorConnectionManager:
             
             # Tìm cổng có sẵn
             available_ports = self.find_available_ports()
+            cached_port = self._resolve_cached_port()
+            if cached_port and cached_port not in available_ports and os.access(cached_port, os.R_OK | os.W_OK):
+                available_ports.insert(0, cached_port)
+            self._known_ports = set(available_ports)
             if not available_ports:
                 logger.error("Không tìm thấy cổng USB serial nào có sẵn")
                 return None
-            
-            # Thử kết nối từng cổng
-            for port in available_ports:
-                try:
-                    logger.info(f"Đang kết nối tới {port} @ {self.baudrate} bps...")
-                    
-                    self.ser = serial.Serial(
-                        port=port,
-                        baudrate=self.baudrate,
-                        timeout=0.5,
-                        write_timeout=1.0,
-                        bytesize=serial.EIGHTBITS,
-                        parity=serial.PARITY_NONE,
-                        stopbits=serial.STOPBITS_ONE
-                    )
-                    
-                    if self.ser.is_open:
-                        self.current_port = port
-                        self.ser.reset_input_buffer()
-                        self.ser.reset_output_buffer()
-                        
-                        logger.info(f"Kết nối {port} thành công")
-                        return self.ser
-                
-                except serial.SerialException as e:
-                    logger.warning(f"Không thể kết nối {port}: {e}")
-                    continue
-            
-            logger.error("Không thể kết nối bất kỳ cổng nào")
-            return None
+
+            result = None
+            if cached_port in available_ports:
+                # Kết nối lại: xác nhận đúng cổng đã biết, không cần dò các cổng khác
+                probed = self._probe_port(cached_port)
+                if probed:
+                    result = (cached_port,) + probed
+                else:
+                    available_ports.remove(cached_port)
+
+            if result is None and available_ports:
+                result = self._probe_ports_parallel(available_ports)
+
+            if result is None:
+                logger.error("Không tìm thấy cảm biến HWT905 trên các cổng: " + ", ".join(available_ports or [cached_port]))
+                return None
+
+            port, self.ser, detected_baudrate = result
+            self.current_port = port
+            if detected_baudrate != self.baudrate:
+                logger.info(f"Cảm biến đang chạy ở {detected_baudrate} bps (cấu hình {self.baudrate} bps), dùng {detected_baudrate} bps.")
+                self.baudrate = detected_baudrate
+            self._remember_port(port)
+            logger.info(f"Kết nối {port} @ {self.baudrate} bps thành công")
+
+            if self.target_baudrate and self.baudrate != self.target_baudrate:
+                self._upgrade_baudrate(port)
+            if self.output_profile:
+                self._apply_output_profile()
+            self.ser.timeout = SERIAL_READ_TIMEOUT
+            self.ser.reset_input_buffer()
+            return self.ser
 
         except Exception as e:
             logger.error(f"Lỗi không xác định: {e}")
             return None
 
-    def wait_for_connection(self, check_interval: int = 5) -> Optional[serial.Serial]:
+    def _open_port(self, port: str, baudrate: int) -> serial.Serial:
+        """
+        Mở cổng serial với các tham số chuẩn của cảm biến và xóa bộ đệm.
+        Timeout đọc ngắn trong lúc dò; establish_connection đặt lại SERIAL_READ_TIMEOUT khi đã chọn cổng.
+        """
+        ser = serial.Serial(
+            port=port,
+            baudrate=baudrate,
+            timeout=PROBE_READ_TIMEOUT,
+            write_timeout=1.0,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE
+        )
+        ser.reset_input_buffer()
+        ser.reset_output_buffer()
+        return ser
+
+    # ------------------------------------------------------------------
+    # Dò cổng
+    # ------------------------------------------------------------------
+    @staticmethod
+    def stable_port_id(port: str) -> str:
+        """
+        Trả về đường dẫn ổn định của cổng dưới /dev/serial/by-id (gồm số serial USB) nếu có,
+        để nhận lại đúng thiết bị khi tên ttyUSBx thay đổi sau khi cắm lại.
+        """
+        real_port = os.path.realpath(port)
+        for link in glob.glob(os.path.join(SERIAL_BY_ID_DIR, '*')):
+            if os.path.realpath(link) == real_port:
+                return link
+        return port
+
+    def _remember_port(self, port: str):
+        """Ghi nhớ thiết bị vừa xác nhận để lần kết nối lại bỏ qua bước dò."""
+        stable_id = self.stable_port_id(port)
+        if stable_id != self._cached_port_id:
+            logger.info(f"Ghi nhớ cảm biến: {stable_id}" + (f" -> {port}" if stable_id != port else ""))
+        self._cached_port_id = stable_id
+
+    def _resolve_cached_port(self) -> Optional[str]:
+        """Cổng hiện tại của thiết bị đã ghi nhớ, hoặc None nếu chưa có / không còn cắm."""
+        if not self._cached_port_id or not os.path.exists(self._cached_port_id):
+            return None
+        if self._cached_port_id.startswith(SERIAL_BY_ID_DIR):
+            return os.path.realpath(self._cached_port_id)
+        return self._cached_port_id
+
+    def _wait_for_signature(self, ser: serial.Serial, timeout: float) -> bool:
+        """Đọc tới khi thấy signature_frames gói hợp lệ (True) hoặc hết timeout (False)."""
+        parser = HWT905FrameParser()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            parser.feed(ser.read(max(ser.in_waiting, 1)))
+            if parser.frames_parsed >= self.signature_frames:
+                return True
+        return False
+
+    def _probe_port(self, port: str) -> Optional[Tuple[serial.Serial, int]]:
+        """
+        Mở một cổng và xác nhận đó là cảm biến HWT905.
+        Thử baudrate hiện tại trước; nếu không thấy gói hợp lệ và probe_baudrate bật thì dò các baudrate khác.
+        Returns:
+            (serial đang mở, baudrate) nếu xác nhận được, None nếu không (cổng đã được đóng).
+        """
+        try:
+            ser = self._open_port(port, self.baudrate)
+        except (serial.SerialException, OSError) as e:
+            logger.warning(f"Không thể mở {port}: {e}")
+            return None
+
+        try:
+            if self._wait_for_signature(ser, self.signature_timeout):
+                return ser, self.baudrate
+            if self.probe_baudrate:
+                candidates = []
+                for baudrate in [self.target_baudrate] + list(self.baud_candidates):
+                    if baudrate and baudrate != self.baudrate and baudrate not in candidates:
+                        candidates.append(baudrate)
+                detected = self._probe_baudrates(ser, candidates)
+                if detected:
+                    return ser, detected
+            logger.debug(f"{port}: không thấy gói HWT905 hợp lệ")
+        except (serial.SerialException, OSError) as e:
+            logger.warning(f"Lỗi khi dò {port}: {e}")
+
+        try:
+            ser.close()
+        except Exception:
+            pass
+        return None
+
+    def _probe_ports_parallel(self, ports: List[str]) -> Optional[Tuple[str, serial.Serial, int]]:
+        """
+        Dò tất cả cổng đồng thời và chọn cổng xác nhận được sớm nhất. Riêng cổng ưu tiên
+        (preferred_port, luôn đứng đầu danh sách) được chờ tới khi có kết quả, để khi có nhiều
+        cảm biến thì cổng đã cấu hình được chọn. Các cổng không được chọn sẽ được đóng.
+        """
+        if len(ports) == 1:
+            result = self._probe_port(ports[0])
+            return (ports[0],) + result if result else None
+
+        logger.info(f"Đang dò song song {len(ports)} cổng: {', '.join(ports)}")
+        executor = ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="PortProbe")
+        futures = {executor.submit(self._probe_port, port): index for index, port in enumerate(ports)}
+        results = {}
+        chosen = None
+        try:
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                preferred_pending = ports[0] == self.preferred_port and 0 not in results
+                successes = [index for index in sorted(results) if results[index]]
+                if successes and not (preferred_pending and successes[0] != 0):
+                    chosen = successes[0]
+                    break
+        finally:
+            for future, index in futures.items():
+                if index != chosen:
+                    future.add_done_callback(_close_probe_result)
+            executor.shutdown(wait=False)
+
+        if chosen is None:
+            return None
+        return (ports[chosen],) + results[chosen]
+
+    def _score_baudrate(self, ser: serial.Serial, baudrate: int) -> Tuple[float, int]:
+        """
+        Nghe cổng ở baudrate trong probe_window giây.
+        Returns:
+            (tỉ lệ byte nằm trong gói hợp lệ, số gói hợp lệ).
+        """
+        if ser.baudrate != baudrate:
+            ser.baudrate = baudrate
+        ser.reset_input_buffer()
+        parser = HWT905FrameParser()
+        received = 0
+        deadline = time.monotonic() + self.probe_window
+        while time.monotonic() < deadline:
+            chunk = ser.read(max(ser.in_waiting, 1))
+            received += len(chunk)
+            parser.feed(chunk)
+        frames = parser.frames_parsed
+        score = frames * DATA_PACKET_LENGTH / received if received else 0.0
+        return score, frames
+
+    def _probe_baudrates(self, ser: serial.Serial, candidates: List[int]) -> Optional[int]:
+        """Thử lần lượt các baudrate, trả về baudrate đầu tiên đạt ngưỡng hoặc None."""
+        for baudrate in candidates:
+            score, frames = self._score_baudrate(ser, baudrate)
+            logger.debug(f"Dò baudrate {baudrate} trên {ser.port}: {frames} gói hợp lệ, tỉ lệ {score * 100:.0f}%")
+            if frames >= self.probe_min_frames and score >= self.probe_min_score:
+                return baudrate
+        return None
+
+    def _upgrade_baudrate(self, port: str):
+        """
+        Chuyển cảm biến sang target_baudrate qua REG_BAUD, mở lại cổng ở baudrate mới và xác nhận
+        bằng tỉ lệ gói hợp lệ. Nếu thất bại, dò lại để quay về baudrate cảm biến đang dùng.
+        """
+        target = self.target_baudrate
+        logger.info(f"Nâng baudrate cảm biến {self.baudrate} -> {target} bps...")
+        try:
+            HWT905Configurator(self.ser).write_baudrate(target)
+            self.ser.close()
+            self.ser = self._open_port(port, target)
+            if self._probe_baudrates(self.ser, [target]) == target:
+                self.baudrate = target
+                logger.info(f"Đã chuyển cảm biến sang {target} bps.")
+            else:
+                logger.warning(f"Không nhận được dữ liệu hợp lệ ở {target} bps, dò lại baudrate...")
+                candidates = [self.baudrate] + [b for b in self.baud_candidates if b not in (self.baudrate, target)]
+                detected = self._probe_baudrates(self.ser, candidates)
+                if detected:
+                    self.baudrate = detected
+                self.ser.baudrate = self.baudrate
+            self.ser.reset_input_buffer()
+        except (serial.SerialException, OSError, ValueError) as e:
+            logger.warning(f"Lỗi khi nâng baudrate cảm biến: {e}")
+
+    def _apply_output_profile(self):
+        """Ghi và xác nhận cấu hình output trên kết nối vừa mở. Lỗi cấu hình không làm hỏng kết nối."""
+        try:
+            configurator = HWT905Configurator(self.ser)
+            if configurator.apply_output_profile(self.output_profile, config.SENSOR_PROFILE_MEASURE_SECONDS):
+                # Cảm biến có thể đã chuyển baudrate, các lần kết nối lại dùng baudrate mới
+                self.baudrate = self.ser.baudrate
+            else:
+                logger.warning("Không xác nhận được cấu hình output, tiếp tục với cấu hình hiện tại của cảm biến.")
+            self.ser.reset_input_buffer()
+        except (serial.SerialException, OSError) as e:
+            logger.warning(f"Lỗi khi cấu hình output cảm biến: {e}")
+
+    def _candidate_port_set(self) -> set:
+        """Tập cổng có thể thử kết nối: cổng tìm thấy và cổng của thiết bị đã ghi nhớ."""
+        ports = set(self.find_available_ports())
+        cached_port = self._resolve_cached_port()
+        if cached_port and os.access(cached_port, os.R_OK | os.W_OK):
+            ports.add(cached_port)
+        return ports
+
+    def _get_hotplug_watcher(self) -> DeviceHotplugWatcher:
+        if self._hotplug_watcher is None:
+            directories = ['/dev', os.path.dirname(os.path.abspath(self.preferred_port))]
+            if self._cached_port_id:
+                directories.append(os.path.dirname(self._cached_port_id))
+            self._hotplug_watcher = DeviceHotplugWatcher(directories, mode=config.SENSOR_HOTPLUG_MODE)
+        return self._hotplug_watcher
+
+    def wait_for_port_change(self, timeout: float) -> bool:
+        """
+        Chờ tới khi có cổng mới so với lần establish_connection gần nhất (ví dụ cảm biến được cắm lại).
+        Dùng inotify nếu có, nếu không thì thăm dò nhanh.
+
+        Args:
+            timeout: Thời gian chờ tối đa (giây)
+
+        Returns:
+            True nếu có cổng mới, False nếu hết thời gian chờ
+        """
+        watcher = self._get_hotplug_watcher()
+        deadline = time.monotonic() + timeout
+        while True:
+            ports = self._candidate_port_set()
+            new_ports = ports - self._known_ports
+            # Cổng biến mất cũng được cập nhật để lần cắm lại được nhận ra là cổng mới
+            self._known_ports = ports
+            if new_ports:
+                logger.info(f"Phát hiện cổng mới: {', '.join(sorted(new_ports))}")
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not watcher.wait(remaining):
+                return False
+
+    def wait_for_connection(self, check_interval: int = 5,
+                            running_flag: Optional[threading.Event] = None) -> Optional[serial.Serial]:
         """
         Đợi cho đến khi có kết nối thành công.
+        Việc dò được chạy ngay khi có cổng mới xuất hiện (cắm lại cảm biến, nhận qua hotplug watcher);
+        ngoài ra vẫn thử lại toàn bộ mỗi check_interval giây.
         
         Args:
-            check_interval: Thời gian chờ giữa các lần kiểm tra (giây)
+            check_interval: Thời gian tối đa giữa các lần thử kết nối đầy đủ (giây)
+            running_flag: Nếu có, dừng đợi và trả về None khi cờ bị clear (được kiểm tra ít nhất mỗi giây)
             
         Returns:
             Instance serial.Serial khi có kết nối thành công
         """
         logger.warning("Đang đợi kết nối...")
+        last_attempt = time.monotonic()
         
-        while True:
+        while running_flag is None or running_flag.is_set():
             try:
+                remaining = check_interval - (time.monotonic() - last_attempt)
+                if remaining > 0 and not self.wait_for_port_change(min(remaining, 1.0)):
+                    continue
+
+                last_attempt = time.monotonic()
                 connection = self.establish_connection()
                 if connection and connection.is_open:
                     logger.info(f"Đã có kết nối! (Port: {self.current_port})")
                     return connection
                 else:
-                    logger.info(f"Chưa có kết nối. Thử lại sau {check_interval} giây...")
-                    time.sleep(check_interval)
+                    logger.info(f"Chưa có kết nối. Thử lại khi có cổng mới hoặc sau {check_interval} giây...")
                     
             except KeyboardInterrupt:
                 logger.info("Dừng đợi kết nối do người dùng hủy")
@@ -126,6 +431,7 @@ class SensorConnectionManager:
             except Exception as e:
                 logger.error(f"Lỗi khi đợi kết nối: {e}")
                 time.sleep(check_interval)
+        return None
 
     def handle_serial_error(self, error: Exception, consecutive_failures: int, max_failures: int = 3) -> bool:
         """
@@ -139,6 +445,12 @@ class SensorConnectionManager:
         Returns:
             True nếu cần dừng và đợi kết nối lại
         """
+        if self.current_port and not os.path.exists(self.current_port):
+            # Node thiết bị đã biến mất (rút cáp): không cần chờ thêm lần thử nào
+            logger.warning(f"Cổng {self.current_port} không còn tồn tại. Đang dừng và đợi kết nối lại...")
+            self.close_connection()
+            return True
+
         if consecutive_failures >= max_failures:
             logger.warning("Kết nối bị mất. Đang dừng và đợi kết nối lại...")
             self.close_connection()
@@ -0,0 +1,243 @@
+# src/core/derived_channels.py
+"""
+Kênh dẫn xuất tính theo lô mẫu bằng NumPy: ma trận quay, yaw liên tục (unwrap), góc nghiêng
+từ trọng trường (acc_x/y/z) và độ lệch góc so với mốc.
+
+Mỗi kênh nhận các cột đầu vào (mảng cùng độ dài) và trả về các cột đầu ra; engine tính một lần
+cho cả lô rồi điền vào từng dòng, nên storage và publisher đọc thẳng cột dẫn xuất mà không tính lại.
+Kênh được chọn theo tên cột đầu ra có trong danh sách cột lưu trữ (DerivedChannelEngine.for_fields).
+"""
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+logger = logging.getLogger(__name__)
+
+EULER_FIELDS = ("angle_roll", "angle_pitch", "angle_yaw")
+QUATERNION_FIELDS = ("q0", "q1", "q2", "q3")
+ACC_FIELDS = ("acc_x", "acc_y", "acc_z")
+
+
+def _column(columns: Dict[str, np.ndarray], name: str, size: int) -> np.ndarray:
+    values = columns.get(name)
+    if values is None:
+        return np.full(size, np.nan)
+    return np.asarray(values, dtype=np.float64)
+
+
+class DerivedChannel(ABC):
+    """Một kênh dẫn xuất: inputs là các trường gói cần giải mã, outputs là các cột sinh ra."""
+    name = ""
+    inputs: Sequence[str] = ()
+    outputs: Sequence[str] = ()
+
+    @abstractmethod
+    def compute(self, columns: Dict[str, np.ndarray], size: int) -> Dict[str, np.ndarray]:
+        """Tính các cột đầu ra từ các cột đầu vào (mảng độ dài size)."""
+        pass
+
+    def reset(self):
+        """Xóa trạng thái giữa các lô (ví dụ sau khi mất kết nối)."""
+
+
+class RotationMatrixChannel(DerivedChannel):
+    """
+    Ma trận quay cảm biến -> hệ tham chiếu (rot_11 .. rot_33, theo hàng). Dùng quaternion (q0 = w)
+    nếu lô có cột q0..q3, ngược lại dùng góc Euler của gói ANGLE theo thứ tự Z-Y-X (yaw, pitch, roll).
+    """
+    name = "rotation_matrix"
+    inputs = EULER_FIELDS
+    outputs = tuple(f"rot_{row}{col}" for row in range(1, 4) for col in range(1, 4))
+
+    def compute(self, columns, size):
+        matrices = np.full((size, 3, 3), np.nan)
+        if all(name in columns for name in QUATERNION_FIELDS):
+            q0, q1, q2, q3 = (_column(columns, name, size) for name in QUATERNION_FIELDS)
+            quaternions = np.column_stack([q1, q2, q3, q0])  # scipy: vô hướng đứng cuối
+            norms = np.linalg.norm(quaternions, axis=1)
+            valid = np.isfinite(norms) & (norms > 0)
+            if valid.any():
+                matrices[valid] = Rotation.from_quat(quaternions[valid]).as_matrix()
+        else:
+            roll, pitch, yaw = (_column(columns, name, size) for name in EULER_FIELDS)
+            angles = np.column_stack([yaw, pitch, roll])
+            valid = np.isfinite(angles).all(axis=1)
+            if valid.any():
+                matrices[valid] = Rotation.from_euler('ZYX', angles[valid], degrees=True).as_matrix()
+        flat = matrices.reshape(size, 9)
+        return {name: flat[:, index] for index, name in enumerate(self.outputs)}
+
+
+class UnwrappedYawChannel(DerivedChannel):
+    """Yaw liên tục (angle_yaw_unwrapped, độ): bỏ bước nhảy ±360° của góc yaw, nối tiếp giữa các lô."""
+    name = "yaw_unwrapped"
+    inputs = ("angle_yaw",)
+    outputs = ("angle_yaw_unwrapped",)
+
+    def __init__(self):
+        self._last_yaw: Optional[float] = None  # Yaw liên tục của mẫu hợp lệ cuối lô trước
+
+    def reset(self):
+        self._last_yaw = None
+
+    def compute(self, columns, size):
+        yaw = _column(columns, "angle_yaw", size)
+        result = np.full(size, np.nan)
+        valid = np.isfinite(yaw)
+        if valid.any():
+            raw = yaw[valid]
+            if self._last_yaw is not None:
+                # Nối với lô trước: unwrap cả mẫu cuối lô trước rồi dịch về đúng giá trị liên tục của nó
+                unwrapped = np.unwrap(np.concatenate(([self._last_yaw], raw)), period=360.0)[1:]
+            else:
+                unwrapped = np.unwrap(raw, period=360.0)
+            result[valid] = unwrapped
+            self._last_yaw = float(unwrapped[-1])
+        return {"angle_yaw_unwrapped": result}
+
+
+class InclinationChannel(DerivedChannel):
+    """
+    Góc nghiêng từ vector gia tốc trọng trường (độ): incl_roll = atan2(ay, az),
+    incl_pitch = atan2(-ax, sqrt(ay² + az²)) và inclination = góc giữa trục Z cảm biến và phương thẳng đứng.
+    Chỉ đúng khi cảm biến gần như đứng yên (gia tốc chuyển động nhỏ so với 1 g).
+    """
+    name = "inclination"
+    inputs = ACC_FIELDS
+    outputs = ("incl_roll", "incl_pitch", "inclination")
+
+    def compute(self, columns, size):
+        ax, ay, az = (_column(columns, name, size) for name in ACC_FIELDS)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            magnitude = np.sqrt(ax * ax + ay * ay + az * az)
+            return {
+                "incl_roll": np.degrees(np.arctan2(ay, az)),
+                "incl_pitch": np.degrees(np.arctan2(-ax, np.hypot(ay, az))),
+                "inclination": np.degrees(np.arccos(np.clip(az / magnitude, -1.0, 1.0))),
+            }
+
+
+class AngleDeltaChannel(DerivedChannel):
+    """
+    Độ lệch góc so với mốc (delta_roll/pitch/yaw, độ; delta_yaw gói trong [-180, 180)).
+    Mốc là giá trị cấu hình (roll, pitch, yaw) hoặc mẫu hợp lệ đầu tiên mà engine nhận được.
+    """
+    name = "angle_delta"
+    inputs = EULER_FIELDS
+    outputs = ("delta_roll", "delta_pitch", "delta_yaw")
+
+    def __init__(self, baseline: Optional[Sequence[float]] = None):
+        self.configured_baseline = tuple(baseline) if baseline else None
+        self.baseline = self.configured_baseline
+
+    def reset(self):
+        self.baseline = self.configured_baseline
+
+    def compute(self, columns, size):
+        angles = [_column(columns, name, size) for name in EULER_FIELDS]
+        if self.baseline is None:
+            valid = np.flatnonzero(np.isfinite(np.column_stack(angles)).all(axis=1))
+            if not len(valid):
+                return {name: np.full(size, np.nan) for name in self.outputs}
+            self.baseline = tuple(float(values[valid[0]]) for values in angles)
+            logger.info(f"Mốc góc cho kênh angle_delta: roll/pitch/yaw = {self.baseline}")
+        roll, pitch, yaw = angles
+        base_roll, base_pitch, base_yaw = self.baseline
+        return {
+            "delta_roll": roll - base_roll,
+            "delta_pitch": pitch - base_pitch,
+            "delta_yaw": (yaw - base_yaw + 180.0) % 360.0 - 180.0,
+        }
+
+
+CHANNEL_TYPES = {channel.name: channel for channel in (
+    RotationMatrixChannel, UnwrappedYawChannel, InclinationChannel, AngleDeltaChannel
+)}
+
+
+def _channel_type(name: str):
+    channel_type = CHANNEL_TYPES.get(name)
+    if channel_type is None:
+        raise ValueError(f"Kênh dẫn xuất không hợp lệ: '{name}'. Hợp lệ: {', '.join(CHANNEL_TYPES)}")
+    return channel_type
+
+
+class DerivedChannelEngine:
+    """Tính các kênh dẫn xuất đã cấu hình cho từng lô mẫu."""
+
+    def __init__(self, channels: Iterable[str], baseline: Optional[Sequence[float]] = None):
+        """
+        Args:
+            channels: Tên kênh trong CHANNEL_TYPES (rotation_matrix, yaw_unwrapped, inclination, angle_delta).
+            baseline: Mốc (roll, pitch, yaw) cho angle_delta; None để lấy mẫu đầu tiên.
+        """
+        self.channels: List[DerivedChannel] = []
+        for name in channels:
+            channel_type = _channel_type(name)
+            self.channels.append(channel_type(baseline) if channel_type is AngleDeltaChannel else channel_type())
+        self._warned_missing = set()
+
+    @classmethod
+    def for_fields(cls, fields: Iterable[str], baseline: Optional[Sequence[float]] = None):
+        """Engine cho các kênh có cột đầu ra nằm trong fields, hoặc None nếu không có kênh nào."""
+        fields = set(fields)
+        names = [name for name, channel_type in CHANNEL_TYPES.items() if fields.intersection(channel_type.outputs)]
+        return cls(names, baseline) if names else None
+
+    @staticmethod
+    def output_fields_for(channels: Iterable[str]) -> List[str]:
+        """Các cột đầu ra của những kênh cho trước (để thêm vào danh sách cột lưu trữ)."""
+        return [name for channel_type in map(_channel_type, channels) for name in channel_type.outputs]
+
+    @property
+    def required_fields(self) -> List[str]:
+        """Trường gói mà các kênh cần (đăng ký giải mã cho chúng)."""
+        return sorted({name for channel in self.channels for name in channel.inputs})
+
+    @property
+    def output_fields(self) -> List[str]:
+        return [name for channel in self.channels for name in channel.outputs]
+
+    def reset(self):
+        for channel in self.channels:
+            channel.reset()
+
+    def compute(self, columns: Dict[str, Any], size: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Tính mọi kênh cho một lô.
+        Args:
+            columns: Tên trường -> mảng/danh sách giá trị cùng độ dài (None hoặc NaN là thiếu).
+            size: Số mẫu của lô (mặc định lấy theo một cột bất kỳ).
+        Returns:
+            Dict[str, np.ndarray]: cột dẫn xuất (NaN ở mẫu thiếu đầu vào).
+        """
+        if size is None:
+            size = len(next(iter(columns.values()))) if columns else 0
+        derived: Dict[str, np.ndarray] = {}
+        if not size:
+            return {name: np.empty(0) for name in self.output_fields}
+        for channel in self.channels:
+            missing = [name for name in channel.inputs if name not in columns]
+            if missing and channel.name not in self._warned_missing:
+                self._warned_missing.add(channel.name)
+                logger.warning(f"Kênh dẫn xuất '{channel.name}' thiếu cột {missing} trong lô mẫu "
+                               f"(cần STORAGE_ROW_MODE=cycle để có dữ liệu ngoài gói góc)")
+            derived.update(channel.compute(columns, size))
+        return derived
+
+    def apply_rows(self, rows: List[Dict[str, Any]]):
+        """Tính các kênh cho một lô dòng dict và điền cột dẫn xuất vào từng dòng (NaN được ghi là None)."""
+        if not rows:
+            return
+        first = rows[0]
+        names = {name for channel in self.channels for name in channel.inputs}
+        names.update(QUATERNION_FIELDS)
+        columns = {name: np.array([row.get(name) for row in rows], dtype=np.float64)
+                   for name in names if name in first}
+        derived = self.compute(columns, len(rows))
+        for name, values in derived.items():
+            for row, value in zip(rows, values.tolist()):
+                row[name] = value if value == value else None
@@ -0,0 +1,275 @@
+# src/core/frame_processor.py
+"""
+Xử lý gói tin dùng chung cho mọi kiểu pipeline (DecoderThread, RingDecoderThread và
+AsyncAcquisitionRuntime): lọc theo mask giải mã, giải mã thành bản ghi gọn, ghép chu kỳ
+(row_mode "cycle") hoặc giữ gói thô (chế độ lazy), tính kênh dẫn xuất và ghi theo lô.
+Các lớp pipeline chỉ lo việc vận chuyển gói (hàng đợi, ring buffer, event loop) và gọi
+process_batch() (hoặc process_region() để giải mã tại chỗ trên ring buffer) / new_link() / close().
+"""
+import logging
+from typing import List, Optional
+
+from ..sensors.hwt905_data_decoder import HWT905DataDecoder
+from ..sensors.hwt905_constants import DATA_PACKET_LENGTH, PACKET_TYPE_ANGLE
+from ..sensors.decoders import AngleSample, format_skip_counts
+from ..storage.storage_manager import StorageManager, format_durability_stats
+from .sample_assembler import SampleAssembler
+from .derived_channels import DerivedChannelEngine
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+
+class FrameProcessor:
+    """
+    Biến các gói 11 byte đã xác thực (kèm timestamp thu nhận) thành dòng lưu trữ.
+    Dòng được gom tới cuối mỗi lô và ghi một lần bằng write_batch (hoặc write_frames khi lưu gói thô).
+    """
+
+    def __init__(self,
+                 data_decoder: HWT905DataDecoder,
+                 storage_manager: StorageManager,
+                 row_mode: str = config.STORAGE_ROW_MODE,
+                 device_id: Optional[str] = None):
+        """
+        Args:
+            data_decoder: Decoder cung cấp decode_record/decode_raw_packet và bảng đăng ký giải mã.
+            storage_manager: Nơi ghi dòng (hoặc gói thô với RawFrameStorageManager).
+            row_mode: "angle" (một dòng mỗi gói góc) hoặc "cycle" (một dòng rộng mỗi chu kỳ output).
+            device_id: Mã thiết bị ghi kèm vào mỗi dòng (chế độ nhiều cảm biến), hoặc None.
+        """
+        self.data_decoder = data_decoder
+        self.storage_manager = storage_manager
+        self.device_id = device_id
+        self.verbose = data_decoder.debug  # Dạng dict đầy đủ chỉ dùng khi chạy với --debug
+        # Chỉ giải mã packet type có consumer đăng ký; mask tự cập nhật khi đổi cột lưu trữ
+        self.subscriptions = data_decoder.subscriptions
+        self.subscriptions.track_storage(storage_manager)
+        self._decode_mask = self.subscriptions.mask
+        self.skipped_by_type = [0] * 256  # Gói bỏ qua không giải mã, theo packet type (tích lũy)
+        # Lưu gói thô (RawFrameStorageManager): không giải mã, việc giải mã diễn ra khi đọc file
+        self.store_frames = getattr(storage_manager, "stores_frames", False)
+        # row_mode "cycle": gộp các gói của một chu kỳ output thành một dòng rộng thay cho dòng góc
+        self.assembler: Optional[SampleAssembler] = None
+        if row_mode == "cycle" and not self.store_frames:
+            self._assembler_version = self.subscriptions.version
+            self.assembler = SampleAssembler(self.subscriptions.packet_types(), self._store_row,
+                                             {"device_id": device_id} if device_id else None)
+        # Dòng được gom theo lô transport và ghi bằng write_batch; kênh dẫn xuất có cột trong danh sách
+        # lưu trữ được tính một lần cho cả lô
+        # (ở chế độ lazy chỉ đăng ký gói đầu vào; kênh được tính khi file được đọc)
+        self._pending_rows: List = []
+        self._captured_at: Optional[float] = None  # time.monotonic() lúc đọc gói đầu tiên của lô đang xử lý
+        self.derived = DerivedChannelEngine.for_fields(storage_manager.fields_to_write, config.DERIVED_BASELINE)
+        if self.derived is not None:
+            self.subscriptions.subscribe("derived", fields=self.derived.required_fields)
+            if self.store_frames:
+                self.derived = None
+
+        self.decoded_packet_count = 0
+        self.saved_packet_count = 0  # Số packet thực sự được lưu
+        self.total_decoded_count = 0  # Tích lũy, không reset theo chu kỳ log
+        self.total_saved_count = 0  # Tích lũy, không reset theo chu kỳ log
+
+    # ------------------------------------------------------------------
+    # Xử lý gói
+    # ------------------------------------------------------------------
+    def process_batch(self, frames, timestamps, captured_at: Optional[float] = None):
+        """
+        Xử lý một lô gói kèm timestamp rồi ghi các dòng của lô.
+        captured_at (time.monotonic() lúc đọc gói đầu tiên) được chuyển cho storage để đo độ trễ
+        từ lúc thu nhận tới khi dữ liệu được flush/fsync.
+        """
+        self._captured_at = captured_at
+        process_packet = self.process_packet
+        for raw_packet, timestamp in zip(frames, timestamps):
+            process_packet(raw_packet, timestamp)
+        self.flush_rows()
+
+    def process_region(self, buf: bytearray, offsets: List[int], timestamps: List[float],
+                       captured_at: Optional[float] = None):
+        """
+        Như process_batch cho các gói nằm tại các vị trí offsets trong buf (ring buffer): bản ghi được
+        giải mã thẳng từ buf, không tạo đối tượng bytes cho từng gói. Chỉ khi lưu gói thô hoặc chạy
+        --debug mới sao chép từng gói, vì gói phải tồn tại sau khi vùng ring được giải phóng.
+        """
+        if self.store_frames or self.verbose:
+            frames = [bytes(buf[offset:offset + DATA_PACKET_LENGTH]) for offset in offsets]
+            self.process_batch(frames, timestamps, captured_at)
+            return
+        self._captured_at = captured_at
+        decode_mask = self._decode_mask
+        skipped_by_type = self.skipped_by_type
+        assembler = self.assembler
+        struct_decoder = self.data_decoder.struct_decoder
+        decode_record = struct_decoder.decode_record if struct_decoder is not None else self.data_decoder.decode_record
+        for offset, timestamp in zip(offsets, timestamps):
+            packet_type = buf[offset + 1]
+            if not decode_mask[packet_type]:
+                skipped_by_type[packet_type] += 1
+                continue
+            if assembler is not None:
+                self._assemble_packet(buf, timestamp, offset)
+                continue
+            record = decode_record(buf, offset)
+            if record is not None:
+                self._store_record(record, timestamp)
+        self.flush_rows()
+
+    def process_packet(self, raw_packet: bytes, timestamp: float):
+        """Giải mã một gói tin và lưu nếu là dữ liệu góc, với timestamp thu nhận tại luồng đọc."""
+        packet_type = raw_packet[1]
+        if not self._decode_mask[packet_type]:
+            self.skipped_by_type[packet_type] += 1
+            return
+        if self.store_frames:
+            self.saved_packet_count += 1
+            self.total_saved_count += 1
+            self._pending_rows.append((raw_packet, timestamp))
+            return
+        if self.assembler is not None:
+            self._assemble_packet(raw_packet, timestamp)
+            return
+        if self.verbose:
+            self._process_packet_verbose(raw_packet, timestamp)
+            return
+
+        # Giải mã thành bản ghi gọn (chỉ các trường vật lý)
+        record = self.data_decoder.decode_record(raw_packet)
+        if record is None:
+            return
+        self._store_record(record, timestamp)
+
+    def _store_record(self, record: tuple, timestamp: float):
+        """Đếm một bản ghi đã giải mã và lưu nó nếu là dữ liệu góc (row_mode "angle")."""
+        self.decoded_packet_count += 1
+        self.total_decoded_count += 1
+
+        # Chỉ lưu dữ liệu góc (angle packet type 0x53) - không có rate limiting
+        if type(record) is AngleSample:
+            data_to_store = {
+                "timestamp": timestamp,
+                "angle_roll": record.angle_roll,
+                "angle_pitch": record.angle_pitch,
+                "angle_yaw": record.angle_yaw,
+                "temperature": record.temperature
+            }
+            if self.device_id:
+                data_to_store["device_id"] = self.device_id
+
+            self.saved_packet_count += 1
+            self.total_saved_count += 1
+            self._write_row(data_to_store)
+
+    def _assemble_packet(self, raw_packet: bytes, timestamp: float, offset: int = 0):
+        """Giải mã gói (tại offset trong raw_packet) thành bản ghi gọn và đưa vào SampleAssembler (row_mode "cycle")."""
+        if self.subscriptions.version != self._assembler_version:
+            # Tập packet type được giải mã vừa đổi (ví dụ cấu hình lại cột lưu trữ)
+            self._assembler_version = self.subscriptions.version
+            self.assembler.reconfigure(self.subscriptions.packet_types())
+        record = self.data_decoder.decode_record(raw_packet, offset)
+        if record is None:
+            return
+        self.decoded_packet_count += 1
+        self.total_decoded_count += 1
+        self.assembler.add(record, timestamp)
+
+    def _process_packet_verbose(self, raw_packet: bytes, timestamp: float):
+        """Như process_packet nhưng qua dict giải mã đầy đủ (raw_packet, header, payload, ...) cho chế độ debug."""
+        packet_info = self.data_decoder.decode_raw_packet(raw_packet)
+        if not packet_info or "error" in packet_info:
+            return
+
+        self.decoded_packet_count += 1
+        self.total_decoded_count += 1
+
+        if (packet_info.get("type") == PACKET_TYPE_ANGLE and "angle_roll" in packet_info
+                and "angle_pitch" in packet_info and "angle_yaw" in packet_info):
+            data_to_store = {
+                "timestamp": timestamp,
+                "angle_roll": packet_info.get("angle_roll"),
+                "angle_pitch": packet_info.get("angle_pitch"),
+                "angle_yaw": packet_info.get("angle_yaw")
+            }
+            if "temperature" in packet_info:
+                data_to_store["temperature"] = packet_info.get("temperature")
+            if self.device_id:
+                data_to_store["device_id"] = self.device_id
+
+            self.saved_packet_count += 1
+            self.total_saved_count += 1
+            self._write_row(data_to_store)
+
+    # ------------------------------------------------------------------
+    # Ghi
+    # ------------------------------------------------------------------
+    def _store_row(self, row: dict):
+        """Lưu một dòng rộng do SampleAssembler phát ra (dict được dùng lại cho chu kỳ sau)."""
+        self.saved_packet_count += 1
+        self.total_saved_count += 1
+        self._write_row(dict(row))
+
+    def _write_row(self, row: dict):
+        """Giữ một dòng tới cuối lô để ghi cả lô một lần (write_batch)."""
+        self._pending_rows.append(row)
+
+    def flush_rows(self):
+        """Tính kênh dẫn xuất (nếu có) một lần cho các dòng của lô vừa xử lý rồi ghi cả lô."""
+        if not self._pending_rows:
+            return
+        rows, self._pending_rows = self._pending_rows, []
+        captured_at, self._captured_at = self._captured_at, None
+        if self.store_frames:
+            # Chế độ lưu gói thô: _pending_rows giữ (gói, timestamp)
+            self.storage_manager.write_frames(rows, captured_at)
+            return
+        if self.derived is not None:
+            self.derived.apply_rows(rows)
+        self.storage_manager.write_batch(rows, captured_at)
+
+    def new_link(self):
+        """Kết nối serial mới: phát chu kỳ đang ghép dở thay vì ghép nó với gói của kết nối mới."""
+        if self.assembler is not None:
+            self.assembler.flush()
+        self.flush_rows()
+        if self.derived is not None:
+            # Trạng thái kênh (ví dụ yaw unwrap) không nối qua khoảng mất kết nối
+            self.derived.reset()
+
+    def close(self):
+        """Phát nốt chu kỳ đang ghép dở (nếu có), ghi các dòng còn lại rồi đóng file đang mở."""
+        if self.assembler is not None:
+            self.assembler.flush()
+        self.flush_rows()
+        self.storage_manager.close_current_file()
+
+    # ------------------------------------------------------------------
+    # Chỉ số
+    # ------------------------------------------------------------------
+    @property
+    def total_skipped_count(self) -> int:
+        """Tổng số gói đã bỏ qua vì không có consumer nào đăng ký packet type của chúng."""
+        return sum(self.skipped_by_type)
+
+    def rate_summary(self, interval: float) -> str:
+        """Mô tả tốc độ giải mã/lưu trong interval giây cho log định kỳ và đặt lại bộ đếm theo chu kỳ."""
+        decode_rate = self.decoded_packet_count / interval
+        save_rate = self.saved_packet_count / interval
+        if self.store_frames:
+            saved_info = f"Lưu gói thô (giải mã khi đọc): {save_rate:.1f}Hz"
+        elif self.assembler is not None:
+            saved_info = (f"Lưu chu kỳ: {save_rate:.1f}Hz, chu kỳ thiếu gói: {self.assembler.incomplete_count}/"
+                          f"{self.assembler.cycle_count} (theo type: {format_skip_counts(self.assembler.missing_by_type)})")
+        else:
+            efficiency = (self.saved_packet_count / self.decoded_packet_count * 100) if self.decoded_packet_count else 0
+            saved_info = f"Lưu góc: {save_rate:.1f}Hz, Hiệu suất: {efficiency:.1f}%"
+        self.decoded_packet_count = 0
+        self.saved_packet_count = 0
+        return f"Decode: {decode_rate:.1f}Hz, {saved_info}. Bỏ qua (không đăng ký): {format_skip_counts(self.skipped_by_type)}"
+
+    def durability_summary(self) -> str:
+        """Số liệu flush/fsync của storage cho log định kỳ."""
+        if getattr(self.storage_manager, "logs_durability", False):
+            # BackgroundStorageWriter tự log số liệu này trên luồng ghi
+            return "Ghi đĩa: xem log luồng ghi nền"
+        return f"Ghi đĩa: {format_durability_stats(self.storage_manager.durability_stats())}"
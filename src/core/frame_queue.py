@@ -0,0 +1,84 @@
+# src/core/frame_queue.py
+"""
+Hàng đợi chuyển giao gói tin theo lô giữa SerialReaderThread và DecoderThread.
+Mỗi phần tử là một FrameBatch chứa nhiều gói 11 byte, nên chi phí khóa/điều kiện
+của Queue chỉ phát sinh một lần cho mỗi lô thay vì cho mỗi gói.
+"""
+import time
+from collections import deque
+from queue import Empty, Queue
+from typing import List, Optional
+
+
+class FrameBatch:
+    """Một lô gói tin thô đọc được từ serial, kèm timestamp thu nhận của từng gói."""
+
+    __slots__ = ("frames", "timestamps", "created_at", "captured_at", "link_generation")
+
+    def __init__(self, frames: List[bytes], timestamps: List[float], link_generation: int = 0,
+                 captured_at: Optional[float] = None):
+        self.frames = frames
+        self.timestamps = timestamps  # Unix timestamp (giây) song song với frames
+        self.created_at = time.monotonic()  # Thời điểm lô được đóng, dùng để đo độ trễ
+        # time.monotonic() lúc đọc gói đầu tiên của lô: mốc đo độ trễ thu nhận -> ghi đĩa
+        self.captured_at = self.created_at if captured_at is None else captured_at
+        # Lần kết nối serial mà các gói thuộc về; bên giải mã không ghép chu kỳ qua hai lần kết nối
+        self.link_generation = link_generation
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+
+class FrameBatchQueue(Queue):
+    """
+    Queue chứa các FrameBatch, với maxsize và qsize() tính theo SỐ GÓI TIN
+    chứ không phải số lô. put() sẽ chặn khi tổng số gói đang chờ đạt maxsize.
+    get()/empty() tính theo số lô, để lô rỗng (mốc kết thúc kết nối) được lấy ngay.
+    """
+
+    def _init(self, maxsize):
+        self.queue = deque()
+        self.frame_count = 0
+
+    def _qsize(self):
+        return self.frame_count
+
+    def _put(self, batch: FrameBatch):
+        self.queue.append(batch)
+        self.frame_count += len(batch)
+
+    def _get(self) -> FrameBatch:
+        batch = self.queue.popleft()
+        self.frame_count -= len(batch)
+        return batch
+
+    def empty(self) -> bool:
+        with self.mutex:
+            return not self.queue
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> FrameBatch:
+        """Như Queue.get nhưng chờ tới khi có lô (kể cả lô rỗng), không phải tới khi có gói."""
+        with self.not_empty:
+            if not block:
+                if not self.queue:
+                    raise Empty
+            elif timeout is None:
+                while not self.queue:
+                    self.not_empty.wait()
+            elif timeout < 0:
+                raise ValueError("'timeout' must be a non-negative number")
+            else:
+                endtime = time.monotonic() + timeout
+                while not self.queue:
+                    remaining = endtime - time.monotonic()
+                    if remaining <= 0.0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+            batch = self._get()
+            self.not_full.notify()
+            return batch
+
+    def batch_count(self) -> int:
+        """Số lô đang chờ trong hàng đợi."""
+        with self.mutex:
+            return len(self.queue)
@@ -0,0 +1,169 @@
+# src/core/frame_timestamper.py
+"""
+Gán thời điểm thu nhận cho từng gói tin dựa trên thời điểm đọc khối serial.
+
+Luồng đọc ghi lại time.monotonic_ns() ngay sau mỗi lần đọc. Gói cuối cùng trong khối
+được coi là đến vào thời điểm đó; các gói trước được nội suy lùi theo chu kỳ output
+của cảm biến. Các gói trong cùng một chu kỳ output (TIME, ACC, GYRO, ANGLE, ...) được
+gửi liền nhau nên dùng chung một thời điểm; ranh giới chu kỳ được nhận ra khi mã loại
+gói không còn tăng dần.
+
+Thời gian tuyệt đối = mốc wall-clock + (monotonic - mốc monotonic), nên timestamp
+không bị nhảy khi đồng hồ hệ thống được chỉnh (NTP).
+
+Khi phát lại segment raw capture (ReplaySerial), thời điểm đọc là wall-clock đã ghi của từng khối
+(đồng hồ "đã ghi"), nên dữ liệu dẫn xuất lại từ bản ghi giữ đúng thời điểm thu nhận gốc.
+"""
+import logging
+import math
+import time
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FrameTimestamper:
+    """Nội suy timestamp cho các gói tin trong một khối đọc."""
+
+    def __init__(self, output_rate_hz: float):
+        """
+        Args:
+            output_rate_hz (float): Tần số output đã cấu hình trên cảm biến (RRATE).
+        """
+        self.output_rate_hz = output_rate_hz
+        self.cycle_period_ns = int(1e9 / output_rate_hz) if output_rate_hz > 0 else 0
+
+        self._mono_anchor_ns = 0
+        self._wall_anchor_ns = 0
+        self._last_type = -1
+        self._last_cycle_ns: Optional[int] = None
+        self.recorded_clock = False  # read_ns là wall-clock đã ghi (phát lại) thay cho monotonic
+        self.reanchor()
+
+        # Thống kê khoảng cách giữa các chu kỳ liên tiếp (ns)
+        self._interval_count = 0
+        self._interval_sum = 0.0
+        self._interval_sq_sum = 0.0
+        self._interval_max_error = 0
+
+    def reanchor(self):
+        """Đặt lại mốc wall-clock/monotonic và trạng thái chu kỳ (ví dụ sau khi kết nối lại)."""
+        if self.recorded_clock:
+            # read_ns đã là wall-clock: mốc đồng nhất
+            self._mono_anchor_ns = 0
+            self._wall_anchor_ns = 0
+        else:
+            self._mono_anchor_ns = time.monotonic_ns()
+            self._wall_anchor_ns = time.time_ns()
+        self._last_type = -1
+        self._last_cycle_ns = None
+
+    def use_recorded_clock(self, recorded: bool):
+        """
+        Chọn đồng hồ của read_ns: True khi read_ns là wall-clock đã ghi của khối (time_ns, phát lại raw
+        capture), False khi là time.monotonic_ns() của lần đọc. Đổi đồng hồ sẽ đặt lại mốc.
+        """
+        if recorded != self.recorded_clock:
+            self.recorded_clock = recorded
+            self.reanchor()
+
+    def read_time_ns(self, data_decoder) -> int:
+        """
+        Thời điểm đọc của khối vừa đọc bởi data_decoder (HWT905DataDecoder) theo đồng hồ phù hợp:
+        wall-clock đã ghi khi nguồn là segment raw capture, ngược lại last_read_ns.
+        """
+        recorded_ns = data_decoder.last_read_wall_ns
+        self.use_recorded_clock(recorded_ns is not None)
+        return data_decoder.last_read_ns if recorded_ns is None else recorded_ns
+
+    def to_wall_time(self, mono_ns: int) -> float:
+        """Chuyển thời điểm monotonic (ns) sang Unix timestamp (giây)."""
+        return (self._wall_anchor_ns + (mono_ns - self._mono_anchor_ns)) / 1e9
+
+    def stamp(self, frames: List[bytes], read_ns: int) -> List[float]:
+        """
+        Tính timestamp (Unix, giây) cho từng gói trong một khối đọc.
+        Args:
+            frames (List[bytes]): Các gói tin tách được từ khối, theo thứ tự nhận.
+            read_ns (int): time.monotonic_ns() ngay sau khi đọc khối.
+        Returns:
+            List[float]: Timestamp tương ứng với từng gói.
+        """
+        if not frames:
+            return []
+        return self.stamp_types([frame[1] for frame in frames], read_ns)
+
+    def stamp_region(self, buf: bytearray, offsets: List[int], read_ns: int) -> List[float]:
+        """Như stamp() cho các gói nằm tại các vị trí offsets trong buf (ring buffer), không sao chép gói."""
+        if not offsets:
+            return []
+        return self.stamp_types([buf[offset + 1] for offset in offsets], read_ns)
+
+    def stamp_types(self, packet_types: Iterable[int], read_ns: int) -> List[float]:
+        """Như stamp() nhưng chỉ nhận packet type của từng gói trong khối, theo thứ tự nhận."""
+        # 1. Xác định chỉ số chu kỳ của từng gói; -1 là phần tiếp của chu kỳ khối trước
+        cycle_index = []
+        cycle = -1
+        last_type = self._last_type
+        for packet_type in packet_types:
+            if packet_type <= last_type or (last_type < 0 and cycle < 0):
+                cycle += 1
+            last_type = packet_type
+            cycle_index.append(cycle)
+        self._last_type = last_type
+
+        # 2. Chu kỳ cuối cùng nhận thời điểm đọc, các chu kỳ trước lùi theo chu kỳ output
+        last_cycle = cycle
+        cycle_times = []
+        continuation_ns = self._last_cycle_ns if self._last_cycle_ns is not None else read_ns
+        previous = self._last_cycle_ns
+        for i in range(last_cycle + 1):
+            cycle_ns = read_ns - (last_cycle - i) * self.cycle_period_ns
+            if previous is not None:
+                if cycle_ns < previous:
+                    cycle_ns = previous  # Không để thời gian đi lùi
+                self._record_interval(cycle_ns - previous)
+            cycle_times.append(cycle_ns)
+            previous = cycle_ns
+        if cycle_times:
+            self._last_cycle_ns = cycle_times[-1]
+
+        wall_anchor, mono_anchor = self._wall_anchor_ns, self._mono_anchor_ns
+        return [
+            (wall_anchor + ((cycle_times[index] if index >= 0 else continuation_ns) - mono_anchor)) / 1e9
+            for index in cycle_index
+        ]
+
+    def _record_interval(self, interval_ns: int):
+        self._interval_count += 1
+        self._interval_sum += interval_ns
+        self._interval_sq_sum += float(interval_ns) * interval_ns
+        error = abs(interval_ns - self.cycle_period_ns)
+        if error > self._interval_max_error:
+            self._interval_max_error = error
+
+    def jitter_stats(self, reset: bool = True) -> dict:
+        """
+        Thống kê khoảng cách giữa các chu kỳ liên tiếp kể từ lần gọi trước.
+        Returns:
+            dict: count, mean_ms, std_ms (jitter), max_error_ms (lệch lớn nhất so với chu kỳ danh định).
+        """
+        count = self._interval_count
+        if count:
+            mean = self._interval_sum / count
+            variance = max(self._interval_sq_sum / count - mean * mean, 0.0)
+            stats = {
+                "count": count,
+                "mean_ms": mean / 1e6,
+                "std_ms": math.sqrt(variance) / 1e6,
+                "max_error_ms": self._interval_max_error / 1e6,
+            }
+        else:
+            stats = {"count": 0, "mean_ms": 0.0, "std_ms": 0.0, "max_error_ms": 0.0}
+
+        if reset:
+            self._interval_count = 0
+            self._interval_sum = 0.0
+            self._interval_sq_sum = 0.0
+            self._interval_max_error = 0
+        return stats
@@ -0,0 +1,110 @@
+# src/core/hotplug.py
+"""
+Theo dõi việc cắm/rút thiết bị serial để kết nối lại ngay khi node thiết bị xuất hiện.
+
+Trên Linux dùng inotify (qua ctypes, không cần thư viện ngoài) trên /dev và thư mục chứa
+cổng đã cấu hình: kernel tạo /dev/ttyUSBx (IN_CREATE), udev đặt quyền truy cập (IN_ATTRIB)
+và tạo symlink (IN_CREATE/IN_MOVED_TO). Nếu không có inotify, watcher chuyển sang thăm dò
+nhanh với chu kỳ poll_interval. Watcher chỉ báo "có thay đổi"; việc kiểm tra cổng nào mới
+do SensorConnectionManager thực hiện.
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import time
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+HOTPLUG_EVENT_MASK = IN_CREATE | IN_ATTRIB | IN_MOVED_TO
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        libc.inotify_init1  # Kiểm tra symbol có tồn tại
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class DeviceHotplugWatcher:
+    """Chờ sự kiện tạo/đổi quyền file trong các thư mục thiết bị."""
+
+    def __init__(self, directories: Iterable[str], mode: str = "auto", poll_interval: float = 0.1):
+        """
+        Args:
+            directories (Iterable[str]): Các thư mục cần theo dõi (ví dụ /dev).
+            mode (str): "auto" (inotify nếu có, nếu không thì poll), "inotify" hoặc "poll".
+            poll_interval (float): Chu kỳ thăm dò khi không dùng inotify (giây).
+        """
+        self.directories = [d for d in dict.fromkeys(directories) if os.path.isdir(d)]
+        self.poll_interval = poll_interval
+        self._fd: Optional[int] = None
+        if mode in ("auto", "inotify"):
+            self._fd = self._init_inotify()
+            if self._fd is None and mode == "inotify":
+                logger.warning("Không khởi tạo được inotify, chuyển sang thăm dò nhanh.")
+        self.mode = "inotify" if self._fd is not None else "poll"
+        logger.debug(f"Hotplug watcher ({self.mode}) theo dõi: {', '.join(self.directories)}")
+
+    def _init_inotify(self) -> Optional[int]:
+        libc = _load_libc()
+        if libc is None or not self.directories:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        watched = 0
+        for directory in self.directories:
+            if libc.inotify_add_watch(fd, os.fsencode(directory), HOTPLUG_EVENT_MASK) >= 0:
+                watched += 1
+            else:
+                logger.debug(f"Không theo dõi được {directory}: {os.strerror(ctypes.get_errno())}")
+        if not watched:
+            os.close(fd)
+            return None
+        return fd
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Chờ tối đa timeout giây.
+        Returns:
+            bool: True nếu có sự kiện (hoặc tới lượt thăm dò ở chế độ poll), False nếu hết thời gian.
+        """
+        if self._fd is None:
+            time.sleep(min(self.poll_interval, max(timeout, 0.0)))
+            return True
+
+        readable, _, _ = select.select([self._fd], [], [], max(timeout, 0.0))
+        if not readable:
+            return False
+        self._drain()
+        return True
+
+    def _drain(self):
+        """Đọc bỏ toàn bộ sự kiện đang chờ (chỉ cần biết là có thay đổi)."""
+        while True:
+            try:
+                if not os.read(self._fd, 4096):
+                    return
+            except BlockingIOError:
+                return
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                return
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,319 @@
+# src/core/multi_sensor.py
+"""
+Thu thập đồng thời từ nhiều cảm biến HWT905 trong một tiến trình.
+
+Mỗi cổng serial có một SensorPipeline riêng: connection manager cố định cổng,
+decoder, cặp luồng đọc/giải mã và StorageManager ghi vào thư mục riêng của thiết bị.
+Mỗi pipeline tự kết nối lại trên luồng của nó, nên việc mất một cảm biến không làm
+chậm các cảm biến còn lại. Khi kết nối lại chỉ nguồn serial được thay; hàng đợi,
+luồng và file đang ghi được giữ nguyên. MultiSensorSupervisor khởi động các pipeline, định kỳ
+quét cổng mới và gửi READY/WATCHDOG cho systemd.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from ..sensors.hwt905_data_decoder import HWT905DataDecoder
+from ..sensors.hwt905_configurator import SensorOutputProfile
+from ..storage.raw_capture import RawCaptureWriter
+from ..storage.storage_manager import StorageManager
+from ..storage.background_writer import shutdown_storage
+from .async_data_manager import create_pipeline_threads
+from .connection_manager import SensorConnectionManager
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+
+def device_id_from_port(port: str) -> str:
+    """
+    Suy ra mã thiết bị (dùng làm tên thư mục) từ đường dẫn cổng. Dùng link /dev/serial/by-id của cổng
+    (gồm số serial USB) nếu có, để cảm biến giữ nguyên thư mục khi tên ttyUSBx đổi sau khi cắm lại,
+    ví dụ usb-FTDI_FT232R_USB_UART_A50285BI-if00-port0; nếu không có thì dùng tên tty, ví dụ ttyUSB1.
+    """
+    stable_port = SensorConnectionManager.stable_port_id(port)
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', os.path.basename(stable_port.rstrip('/')))
+
+
+class SensorPipeline(threading.Thread):
+    """
+    Luồng giám sát một cảm biến: kết nối, chạy cặp luồng đọc/giải mã và kết nối lại khi mất cổng.
+    Cặp luồng được tạo một lần và sống suốt vòng đời pipeline; mỗi lần kết nối lại chỉ gắn serial mới.
+    """
+
+    def __init__(self,
+                 port: str,
+                 device_id: str,
+                 storage_factory: Callable[[str], StorageManager],
+                 running_flag: threading.Event,
+                 debug: bool = False,
+                 baudrate: int = config.SENSOR_BAUD_RATE,
+                 reconnect_delay: float = 3.0,
+                 output_profile: Optional[SensorOutputProfile] = None,
+                 raw_capture_factory: Optional[Callable[[str], Optional[RawCaptureWriter]]] = None):
+        """
+        Args:
+            port (str): Cổng serial của cảm biến.
+            device_id (str): Mã thiết bị, ghi kèm vào dữ liệu và dùng cho thư mục lưu trữ.
+            storage_factory (Callable[[str], StorageManager]): Tạo StorageManager cho một device_id.
+            running_flag (threading.Event): Cờ toàn cục; bị clear khi ứng dụng cần thoát.
+            debug (bool): Bật log chi tiết của decoder.
+            baudrate (int): Baudrate kết nối.
+            reconnect_delay (float): Thời gian tối đa giữa các lần thử kết nối lại khi không có sự kiện hotplug (giây).
+            output_profile (Optional[SensorOutputProfile]): Cấu hình output ghi vào cảm biến khi kết nối.
+            raw_capture_factory (Optional[Callable]): Tạo RawCaptureWriter (hoặc None) cho một device_id.
+        """
+        super().__init__(daemon=True, name=f"SensorPipeline-{device_id}")
+        self.port = port
+        self.device_id = device_id
+        self.running_flag = running_flag
+        self.debug = debug
+        self.reconnect_delay = reconnect_delay
+
+        self.connection_manager = SensorConnectionManager(port=port, baudrate=baudrate, auto_discover=False,
+                                                          output_profile=output_profile)
+        self.storage_manager = storage_factory(device_id)
+        self.raw_capture = raw_capture_factory(device_id) if raw_capture_factory else None
+        # Decoder dùng chung cho mọi phiên, chỉ đổi kết nối serial
+        self.data_decoder = HWT905DataDecoder(debug=debug, read_chunk_size=config.SENSOR_READ_CHUNK_SIZE,
+                                              raw_tee=self.raw_capture)
+        self._wakeup = threading.Event()  # Đánh thức các lần chờ khi cần dừng
+
+        self.connected = False
+        self.session_count = 0
+        self.saved_packet_count = 0  # Số dòng đã lưu bởi các cặp luồng trước (nếu phải tạo lại)
+        self._pipeline_flag: Optional[threading.Event] = None
+        self._reader_thread = None
+        self._decoder_thread = None
+
+    def stop(self):
+        """Yêu cầu pipeline dừng (không chờ)."""
+        self._wakeup.set()
+
+    def _wait(self, delay: float):
+        """Chờ delay giây hoặc tới khi có yêu cầu dừng."""
+        self._wakeup.wait(delay)
+
+    def _wait_for_port(self):
+        """Chờ cổng xuất hiện lại (sự kiện hotplug) tối đa reconnect_delay giây, vẫn phản hồi yêu cầu dừng."""
+        deadline = time.monotonic() + self.reconnect_delay
+        while self._should_run():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.connection_manager.wait_for_port_change(min(remaining, 1.0)):
+                return
+
+    def _should_run(self) -> bool:
+        return self.running_flag.is_set() and not self._wakeup.is_set()
+
+    def total_saved(self) -> int:
+        """Số dòng đã lưu từ khi pipeline bắt đầu."""
+        current = self._decoder_thread.total_saved_count if self._decoder_thread else 0
+        return self.saved_packet_count + current
+
+    def _threads_alive(self) -> bool:
+        return (self._reader_thread is not None and self._reader_thread.is_alive()
+                and self._decoder_thread.is_alive())
+
+    def _attach(self, ser_instance):
+        """Gắn kết nối mới vào cặp luồng đang chạy, hoặc tạo cặp luồng nếu chưa có (hay đã dừng vì lỗi)."""
+        if self._threads_alive():
+            self._reader_thread.attach_serial(ser_instance)
+            return
+
+        self._stop_threads()
+        self.data_decoder.set_ser_instance(ser_instance)
+        self._pipeline_flag = threading.Event()
+        self._pipeline_flag.set()
+        self._reader_thread, self._decoder_thread = create_pipeline_threads(
+            data_decoder=self.data_decoder,
+            storage_manager=self.storage_manager,
+            running_flag=self._pipeline_flag,
+            connection_manager=self.connection_manager,
+            device_id=self.device_id
+        )
+        self._reader_thread.start()
+        self._decoder_thread.start()
+
+    def _stop_threads(self):
+        """Dừng cặp luồng hiện tại; luồng giải mã xử lý hết dữ liệu còn trong hàng đợi rồi đóng file."""
+        if self._reader_thread is None:
+            return
+        self._pipeline_flag.clear()
+        self._reader_thread.join(timeout=3)
+        self._decoder_thread.join(timeout=3)
+        if self._reader_thread.is_alive() or self._decoder_thread.is_alive():
+            logger.warning(f"[{self.device_id}] Luồng đọc/giải mã chưa dừng sau 3 giây")
+        self.saved_packet_count += self._decoder_thread.total_saved_count
+        self._reader_thread = None
+        self._decoder_thread = None
+
+    def _run_session(self, ser_instance):
+        """Chạy một phiên kết nối cho tới khi mất cổng hoặc có yêu cầu dừng."""
+        self._attach(ser_instance)
+        self.connected = True
+        self.session_count += 1
+        try:
+            while self._should_run() and self._threads_alive():
+                if self._reader_thread.link_lost.wait(timeout=1.0):
+                    break
+        finally:
+            self.connected = False
+            if not (self._should_run() and self._threads_alive()):
+                # Dừng hoặc một luồng đã chết: dừng cặp luồng trước khi đóng cổng luồng đọc đang dùng
+                self._stop_threads()
+            self.connection_manager.close_connection()
+
+    def run(self):
+        logger.info(f"[{self.device_id}] Pipeline cho {self.port} đã bắt đầu.")
+        while self._should_run():
+            try:
+                ser_instance = self.connection_manager.establish_connection()
+                if not ser_instance or not ser_instance.is_open:
+                    logger.info(f"[{self.device_id}] Chưa có kết nối. Thử lại khi cổng xuất hiện hoặc sau {self.reconnect_delay} giây...")
+                    self._wait_for_port()
+                    continue
+
+                self._run_session(ser_instance)
+                if self._should_run():
+                    logger.warning(f"[{self.device_id}] Mất kết nối. Đang kết nối lại...")
+
+            except Exception as e:
+                logger.error(f"[{self.device_id}] Lỗi trong pipeline: {e}", exc_info=True)
+                self.connection_manager.close_connection()
+                self._wait(5)
+
+        self._stop_threads()
+        shutdown_storage(self.storage_manager)
+        if self.raw_capture:
+            self.raw_capture.close()
+        logger.info(f"[{self.device_id}] Pipeline đã dừng.")
+
+
+class MultiSensorSupervisor:
+    """
+    Khởi động và giám sát một SensorPipeline cho mỗi cổng cảm biến.
+    """
+
+    def __init__(self,
+                 storage_factory: Callable[[str], StorageManager],
+                 running_flag: threading.Event,
+                 ports: Optional[List[str]] = None,
+                 notifier=None,
+                 debug: bool = False,
+                 rescan_interval: float = 10.0,
+                 watchdog_interval: float = 2.0,
+                 output_profile: Optional[SensorOutputProfile] = None,
+                 raw_capture_factory: Optional[Callable[[str], Optional[RawCaptureWriter]]] = None):
+        """
+        Args:
+            storage_factory (Callable[[str], StorageManager]): Tạo StorageManager cho một device_id.
+            running_flag (threading.Event): Cờ toàn cục; bị clear khi ứng dụng cần thoát.
+            ports (Optional[List[str]]): Danh sách cổng cố định. None để tự quét /dev/ttyUSB*.
+            notifier: sdnotify.SystemdNotifier (tùy chọn) để gửi READY/WATCHDOG.
+            debug (bool): Bật log chi tiết của decoder.
+            rescan_interval (float): Chu kỳ quét cổng mới khi tự quét (giây).
+            watchdog_interval (float): Chu kỳ ping watchdog systemd (giây).
+            output_profile (Optional[SensorOutputProfile]): Cấu hình output ghi vào từng cảm biến khi kết nối.
+            raw_capture_factory (Optional[Callable]): Tạo RawCaptureWriter (hoặc None) cho một device_id.
+        """
+        self.storage_factory = storage_factory
+        self.raw_capture_factory = raw_capture_factory
+        self.running_flag = running_flag
+        self.ports = ports
+        self.notifier = notifier
+        self.debug = debug
+        self.rescan_interval = rescan_interval
+        self.watchdog_interval = watchdog_interval
+        self.output_profile = output_profile
+
+        self.pipelines: Dict[str, SensorPipeline] = {}
+        self._port_scanner = SensorConnectionManager(port=config.SENSOR_UART_PORT, baudrate=config.SENSOR_BAUD_RATE)
+
+    def discover_ports(self) -> List[str]:
+        """Danh sách cổng cần giám sát: cấu hình cố định, hoặc các cổng USB serial đang có."""
+        if self.ports:
+            return list(self.ports)
+        return self._port_scanner.find_available_ports()
+
+    def _start_new_pipelines(self):
+        # Pipeline được khóa theo link /dev/serial/by-id (tên tty nếu không có), nên một SENSOR_UART_PORT
+        # dạng by-id và nút ttyUSBx mà nó trỏ tới chỉ tạo một pipeline, và cảm biến cắm lại dưới tên
+        # ttyUSBx khác vẫn thuộc pipeline cũ (pipeline kết nối qua link by-id).
+        active_nodes = {os.path.realpath(pipeline.port) for pipeline in self.pipelines.values()}
+        for port in self.discover_ports():
+            stable_port = SensorConnectionManager.stable_port_id(port)
+            real_port = os.path.realpath(port)
+            if stable_port in self.pipelines or real_port in active_nodes:
+                continue
+            device_id = device_id_from_port(stable_port)
+            logger.info(f"Phát hiện cảm biến mới trên {port}"
+                        + (f" ({stable_port})" if stable_port != port else "")
+                        + f", mã thiết bị '{device_id}'.")
+            pipeline = SensorPipeline(
+                port=stable_port,
+                device_id=device_id,
+                storage_factory=self.storage_factory,
+                running_flag=self.running_flag,
+                debug=self.debug,
+                output_profile=self.output_profile,
+                raw_capture_factory=self.raw_capture_factory
+            )
+            self.pipelines[stable_port] = pipeline
+            active_nodes.add(real_port)
+            pipeline.start()
+
+    def _log_status(self, interval: float, previous: Dict[str, int]):
+        parts = []
+        total_rate = 0.0
+        for pipeline in self.pipelines.values():
+            saved = pipeline.total_saved()
+            rate = (saved - previous.get(pipeline.device_id, 0)) / interval
+            previous[pipeline.device_id] = saved
+            total_rate += rate
+            state = "OK" if pipeline.connected else "mất kết nối"
+            parts.append(f"{pipeline.device_id}: {rate:.1f}Hz ({state})")
+        logger.info(f"{len(self.pipelines)} cảm biến, tổng lưu góc {total_rate:.1f}Hz. " + ", ".join(parts))
+
+    def run(self):
+        """Chạy cho tới khi running_flag bị clear, rồi dừng tất cả pipeline."""
+        logger.info("Chế độ nhiều cảm biến: mỗi cổng một pipeline độc lập.")
+        last_scan = 0.0
+        last_status = time.time()
+        previous_saved: Dict[str, int] = {}
+        ready_sent = False
+
+        try:
+            while self.running_flag.is_set():
+                now = time.time()
+                if now - last_scan >= self.rescan_interval or (not self.pipelines and now - last_scan >= 3.0):
+                    self._start_new_pipelines()
+                    last_scan = now
+                    if not self.pipelines:
+                        logger.warning("Không tìm thấy cổng cảm biến nào, đang đợi...")
+
+                if self.notifier:
+                    if not ready_sent and self.pipelines:
+                        self.notifier.notify("READY=1")
+                        ready_sent = True
+                    self.notifier.notify("WATCHDOG=1")
+
+                if now - last_status >= 10.0:
+                    self._log_status(now - last_status, previous_saved)
+                    last_status = now
+
+                time.sleep(self.watchdog_interval)
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Dừng và chờ tất cả pipeline."""
+        for pipeline in self.pipelines.values():
+            pipeline.stop()
+        for pipeline in self.pipelines.values():
+            pipeline.join(timeout=8)
+            if pipeline.is_alive():
+                logger.warning(f"[{pipeline.device_id}] Pipeline chưa dừng sau 8 giây")
+        logger.info("Đã dừng tất cả pipeline cảm biến.")
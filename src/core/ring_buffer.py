@@ -0,0 +1,146 @@
+# src/core/ring_buffer.py
+"""
+Ring buffer byte cấp phát trước cho một luồng ghi (SerialReaderThread) và
+một luồng đọc (DecoderThread), không dùng khóa.
+
+Mỗi con trỏ chỉ được cập nhật bởi đúng một luồng: _write_pos bởi luồng ghi,
+_read_pos bởi luồng đọc. Cả hai là tổng số byte tích lũy (không quay vòng), vị trí
+thực trong buffer là phần dư theo capacity. Phép gán int là nguyên tử dưới GIL,
+và luồng ghi chỉ tăng _write_pos SAU khi dữ liệu đã nằm trong buffer.
+
+Buffer có thêm một vùng "tràn" (overhang) DATA_PACKET_LENGTH - 1 byte sau capacity,
+chứa bản sao các byte đầu buffer. Nhờ đó một gói tin nằm vắt qua điểm quay vòng
+vẫn có thể được đọc liền mạch, tại chỗ.
+"""
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+from ..sensors.hwt905_constants import DATA_PACKET_LENGTH
+
+logger = logging.getLogger(__name__)
+
+
+class ByteRingBuffer:
+    """Ring buffer SPSC cho byte thô từ cổng serial."""
+
+    def __init__(self, capacity: int, overhang: int = DATA_PACKET_LENGTH - 1):
+        """
+        Args:
+            capacity (int): Sức chứa tính bằng byte.
+            overhang (int): Số byte đầu buffer được sao chép ra sau điểm quay vòng.
+        """
+        if capacity <= overhang:
+            raise ValueError(f"capacity ({capacity}) phải lớn hơn overhang ({overhang})")
+        self.capacity = capacity
+        self.overhang = overhang
+        self.buffer = bytearray(capacity + overhang)
+        self._view = memoryview(self.buffer)
+
+        self._write_pos = 0  # Chỉ luồng ghi cập nhật
+        self._read_pos = 0   # Chỉ luồng đọc cập nhật
+
+        # Mốc (vị trí kết thúc tích lũy, monotonic_ns) của từng khối đọc, dùng để gán timestamp.
+        # deque.append/popleft là an toàn giữa một luồng ghi và một luồng đọc.
+        self._chunk_marks = deque()
+
+        # Chỉ số (luồng ghi cập nhật)
+        self.bytes_written = 0
+        self.overrun_events = 0
+        self.overrun_bytes = 0
+        self.peak_fill = 0
+
+    # ------------------------------------------------------------------
+    # Phía ghi (producer)
+    # ------------------------------------------------------------------
+    def writable_view(self, max_size: int = 0) -> memoryview:
+        """
+        Trả về vùng trống liền mạch tiếp theo để ghi trực tiếp (ví dụ bằng readinto).
+        Trả về memoryview rỗng nếu buffer đầy.
+        """
+        write_pos = self._write_pos
+        free = self.capacity - (write_pos - self._read_pos)
+        offset = write_pos % self.capacity
+        size = min(free, self.capacity - offset)
+        if max_size:
+            size = min(size, max_size)
+        return self._view[offset:offset + size]
+
+    def commit_write(self, size: int, read_ns: Optional[int] = None):
+        """
+        Công bố size byte vừa được ghi vào vùng trả về bởi writable_view().
+        Args:
+            size (int): Số byte đã ghi.
+            read_ns (Optional[int]): time.monotonic_ns() của lần đọc, dùng để gán timestamp cho gói tin.
+        """
+        if size <= 0:
+            return
+        if read_ns is not None:
+            # Mốc phải có trước khi dữ liệu được công bố cho luồng đọc
+            self._chunk_marks.append((self._write_pos + size, read_ns))
+        offset = self._write_pos % self.capacity
+        if offset < self.overhang:
+            # Sao chép phần đầu buffer ra vùng tràn trước khi công bố
+            mirror_end = min(offset + size, self.overhang)
+            self.buffer[self.capacity + offset:self.capacity + mirror_end] = self.buffer[offset:mirror_end]
+
+        self._write_pos += size
+        self.bytes_written += size
+        fill = self._write_pos - self._read_pos
+        if fill > self.peak_fill:
+            self.peak_fill = fill
+
+    def record_overrun(self, dropped_bytes: int):
+        """Ghi nhận dữ liệu bị bỏ do buffer đầy."""
+        self.overrun_events += 1
+        self.overrun_bytes += dropped_bytes
+
+    # ------------------------------------------------------------------
+    # Phía đọc (consumer)
+    # ------------------------------------------------------------------
+    def readable_region(self):
+        """
+        Trả về (start, end) của vùng dữ liệu liền mạch có thể đọc trong self.buffer.
+        Vùng có thể kéo dài vào phần tràn sau capacity (tối đa overhang byte).
+        """
+        available = self._write_pos - self._read_pos
+        start = self._read_pos % self.capacity
+        contiguous = self.capacity - start
+        if available > contiguous:
+            available = contiguous + min(available - contiguous, self.overhang)
+        return start, start + available
+
+    def commit_read(self, size: int):
+        """Giải phóng size byte đã được xử lý."""
+        self._read_pos += size
+
+    def chunk_read_ns(self, consumed: int) -> int:
+        """
+        Trả về thời điểm đọc của khối chứa byte cuối cùng trong consumed byte tính từ con trỏ đọc
+        hiện tại (gọi trước commit_read). Các mốc của khối đã xử lý xong được loại bỏ.
+        """
+        end_pos = self._read_pos + consumed
+        marks = self._chunk_marks
+        while marks and marks[0][0] < end_pos:
+            marks.popleft()
+        if marks:
+            return marks[0][1]
+        return time.monotonic_ns()
+
+    # ------------------------------------------------------------------
+    # Chỉ số
+    # ------------------------------------------------------------------
+    @property
+    def fill_level(self) -> int:
+        """Số byte đang chờ xử lý."""
+        return self._write_pos - self._read_pos
+
+    def fill_ratio(self) -> float:
+        """Tỉ lệ lấp đầy (0.0 - 1.0)."""
+        return self.fill_level / self.capacity
+
+    def reset(self):
+        """Bỏ toàn bộ dữ liệu đang chờ. Chỉ gọi khi cả hai luồng đã dừng."""
+        self._read_pos = self._write_pos
+        self._chunk_marks.clear()
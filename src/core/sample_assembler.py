@@ -0,0 +1,113 @@
+# src/core/sample_assembler.py
+"""
+Gộp các gói của một chu kỳ output (TIME, ACC, GYRO, ANGLE, MAG, ...) thành một dòng rộng.
+
+Cảm biến gửi các gói của một chu kỳ liền nhau theo mã loại tăng dần, nên ranh giới chu kỳ
+được nhận ra khi mã loại không còn tăng (TIME 0x50 là mã nhỏ nhất nên luôn mở chu kỳ mới),
+giống cách FrameTimestamper gán chung một timestamp cho cả chu kỳ. Một chu kỳ được phát ra
+ngay khi đủ mọi packet type mong đợi, hoặc khi chu kỳ sau bắt đầu (khi đó bị đánh dấu thiếu).
+"""
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..sensors.decoders.struct_decoder import PAYLOAD_LAYOUTS
+from ..sensors.decoders.subscriptions import PREFERRED_FIELD_SOURCES
+
+logger = logging.getLogger(__name__)
+
+CYCLE_COMPLETE_FIELD = "cycle_complete"
+
+
+class SampleAssembler:
+    """
+    Ghép các bản ghi gọn (records.*Sample) của một chu kỳ vào một dict dòng cấp phát sẵn và dùng lại.
+    Dòng gồm 'timestamp' (của gói đầu chu kỳ), mọi trường của các packet type mong đợi,
+    'cycle_complete' và các trường cố định (ví dụ device_id). Trường có ở nhiều packet type
+    (temperature) chỉ có một cột, lấy từ type trong PREFERRED_FIELD_SOURCES nếu chu kỳ có type đó.
+    sink nhận chính dict dòng đó và phải dùng ngay (ví dụ StorageManager.write_data), vì
+    dict được xóa để dùng cho chu kỳ kế tiếp.
+    """
+
+    def __init__(self, packet_types: Iterable[int], sink: Callable[[Dict[str, Any]], None],
+                 static_fields: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            packet_types: Các packet type mong đợi trong mỗi chu kỳ (thường là mask giải mã).
+            sink: Hàm nhận dòng đã ghép.
+            static_fields: Trường không đổi ghi kèm mọi dòng.
+        """
+        self.sink = sink
+        self.static_fields = dict(static_fields or {})
+        self.cycle_count = 0
+        self.incomplete_count = 0
+        self.missing_by_type = [0] * 256  # Số chu kỳ thiếu từng packet type (tích lũy)
+        self.reconfigure(packet_types)
+
+    def reconfigure(self, packet_types: Iterable[int]):
+        """Đổi tập packet type mong đợi; chu kỳ đang ghép dở được phát ra trước với cấu hình cũ."""
+        if getattr(self, "_pending", False):
+            self.flush()
+        self.packet_types = sorted(packet_type for packet_type in set(packet_types)
+                                   if packet_type in PAYLOAD_LAYOUTS)
+        self.columns: List[str] = ["timestamp"]
+        # packet_type -> (bit trong mặt nạ chu kỳ, [(chỉ số trong bản ghi, cột, luôn ghi đè)])
+        self._plans: Dict[int, Tuple[int, List[Tuple[int, str, bool]]]] = {}
+        for bit_index, packet_type in enumerate(self.packet_types):
+            plan = []
+            for index, name in enumerate(PAYLOAD_LAYOUTS[packet_type][1]):
+                if name not in self.columns:
+                    self.columns.append(name)
+                plan.append((index, name, PREFERRED_FIELD_SOURCES.get(name, packet_type) == packet_type))
+            self._plans[packet_type] = (1 << bit_index, plan)
+        self.columns.append(CYCLE_COMPLETE_FIELD)
+        self._expected_bits = (1 << len(self.packet_types)) - 1
+        self._blank = dict.fromkeys(self.columns)
+        self.row: Dict[str, Any] = dict(self._blank, **self.static_fields)
+        self._seen_bits = 0
+        self._last_type = -1
+        self._pending = False
+
+    def add(self, record, timestamp: float):
+        """Thêm bản ghi của một gói; packet type không mong đợi bị bỏ qua."""
+        packet_type = record.packet_type
+        entry = self._plans.get(packet_type)
+        if entry is None:
+            return
+        if self._pending and packet_type <= self._last_type:
+            self._emit()  # Mã loại không tăng: chu kỳ trước kết thúc khi chưa đủ gói
+
+        row = self.row
+        if not self._pending:
+            row["timestamp"] = timestamp
+            self._pending = True
+        bit, plan = entry
+        for index, column, overwrite in plan:
+            if overwrite or row[column] is None:
+                row[column] = record[index]
+        self._seen_bits |= bit
+        self._last_type = packet_type
+        if self._seen_bits == self._expected_bits:
+            self._emit()
+
+    def flush(self):
+        """Phát ra chu kỳ đang ghép dở (ví dụ khi dừng hoặc mất kết nối)."""
+        if self._pending:
+            self._emit()
+
+    def _emit(self):
+        row = self.row
+        complete = self._seen_bits == self._expected_bits
+        row[CYCLE_COMPLETE_FIELD] = complete
+        self.cycle_count += 1
+        if not complete:
+            self.incomplete_count += 1
+            for packet_type, (bit, _) in self._plans.items():
+                if not self._seen_bits & bit:
+                    self.missing_by_type[packet_type] += 1
+        try:
+            self.sink(row)
+        finally:
+            row.update(self._blank)
+            self._seen_bits = 0
+            self._last_type = -1
+            self._pending = False
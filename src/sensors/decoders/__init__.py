@@ -11,6 +11,13 @@ from .magnetic_field_decoder import MagneticFieldPacketDecoder
 from .quaternion_decoder import QuaternionPacketDecoder
 from .gps_decoder import GPSLonLatPacketDecoder, GPSSpeedPacketDecoder, GPSAccuracyPacketDecoder
 from .misc_decoder import PortStatusPacketDecoder, PressureHeightPacketDecoder, ReadRegisterPacketDecoder
+from .struct_decoder import StructPacketDecoder
+from .numpy_decoder import NumpyBatchDecoder
+from .subscriptions import DecodeSubscriptions, packet_types_for_fields, format_skip_counts
+from .records import (
+    RECORD_TYPES, TimeSample, AccSample, GyroSample, AngleSample, MagSample, PortStatusSample, PressureSample,
+    GPSLonLatSample, GPSSpeedSample, QuaternionSample, GPSAccuracySample, RegisterReadSample
+)
 
 __all__ = [
     'BasePacketDecoder',
@@ -26,5 +33,23 @@ __all__ = [
     'GPSAccuracyPacketDecoder',
     'PortStatusPacketDecoder',
     'PressureHeightPacketDecoder',
-    'ReadRegisterPacketDecoder'
+    'ReadRegisterPacketDecoder',
+    'StructPacketDecoder',
+    'NumpyBatchDecoder',
+    'DecodeSubscriptions',
+    'packet_types_for_fields',
+    'format_skip_counts',
+    'RECORD_TYPES',
+    'TimeSample',
+    'AccSample',
+    'GyroSample',
+    'AngleSample',
+    'MagSample',
+    'PortStatusSample',
+    'PressureSample',
+    'GPSLonLatSample',
+    'GPSSpeedSample',
+    'QuaternionSample',
+    'GPSAccuracySample',
+    'RegisterReadSample'
 ]
@@ -0,0 +1,119 @@
+"""
+Decoder theo lô bằng NumPy: giải mã một khối nhiều gói liền nhau thành các cột theo packet type
+"""
+import logging
+from typing import Dict, Sequence
+
+import numpy as np
+
+from ..hwt905_constants import DATA_PACKET_LENGTH
+from ..hwt905_protocol import validate_data_packets
+from .struct_decoder import PAYLOAD_LAYOUTS, FIELD_OFFSETS
+
+logger = logging.getLogger(__name__)
+
+# Ký tự định dạng struct -> kiểu NumPy little-endian tương ứng
+_STRUCT_TO_DTYPE = {'b': 'i1', 'B': 'u1', 'h': '<i2', 'H': '<u2', 'i': '<i4', 'I': '<u4'}
+
+
+def layout_dtype(fmt: str, names: Sequence[str]) -> np.dtype:
+    """
+    Dtype có cấu trúc cho một gói 11 byte: header, type, các trường payload theo fmt, checksum.
+    Args:
+        fmt: Định dạng struct của payload (ví dụ '<hhhh'), như trong PAYLOAD_LAYOUTS.
+        names: Tên trường payload.
+    """
+    codes = fmt.lstrip('<')
+    fields = [('header', 'u1'), ('type', 'u1')]
+    fields += [(name, _STRUCT_TO_DTYPE[code]) for name, code in zip(names, codes)]
+    payload_size = sum(np.dtype(dtype).itemsize for _, dtype in fields[2:])
+    if payload_size < DATA_PACKET_LENGTH - 3:
+        fields.append(('_pad', f'V{DATA_PACKET_LENGTH - 3 - payload_size}'))
+    fields.append(('checksum', 'u1'))
+    dtype = np.dtype(fields)
+    if dtype.itemsize != DATA_PACKET_LENGTH:
+        raise ValueError(f"Bố cục {fmt} không khớp gói {DATA_PACKET_LENGTH} byte")
+    return dtype
+
+
+class NumpyBatchDecoder:
+    """
+    Giải mã một khối gói đã xác thực (N x 11 byte liền nhau) thành các cột NumPy cho từng packet type.
+    Khối được xem (không sao chép) như mảng có cấu trúc theo bố cục của từng packet type,
+    các hàng được nhóm theo type bằng mặt nạ bool và hệ số SCALE_* được áp dụng trên cả cột.
+    Bố cục và hệ số lấy từ PAYLOAD_LAYOUTS, cùng nguồn với StructPacketDecoder.
+    Chi phí cố định mỗi khối vài µs, nên chỉ có lợi với khối lớn (vài trăm gói trở lên,
+    xem scripts/bench_decode.py); khối nhỏ giải mã từng gói bằng StructPacketDecoder rẻ hơn.
+    """
+
+    def __init__(self):
+        # packet_type -> (dtype có cấu trúc, [(tên trường, hệ số chia hoặc None, hằng số cộng)])
+        self._layouts = {}
+        for packet_type, (fmt, names, divisors) in PAYLOAD_LAYOUTS.items():
+            offsets = FIELD_OFFSETS.get(packet_type, {})
+            columns = [(name, divisor, offsets.get(name, 0)) for name, divisor in zip(names, divisors)]
+            self._layouts[packet_type] = (layout_dtype(fmt, names), columns)
+
+    @staticmethod
+    def as_block(frames) -> np.ndarray:
+        """
+        Chuẩn hóa đầu vào thành mảng uint8 (N, 11).
+        Args:
+            frames: bytes/bytearray/memoryview có độ dài là bội số của 11, danh sách gói 11 byte,
+                    hoặc mảng numpy uint8 (N, 11).
+        """
+        if isinstance(frames, np.ndarray):
+            return frames.reshape(-1, DATA_PACKET_LENGTH)
+        if isinstance(frames, (list, tuple)):
+            frames = b''.join(frames)
+        if len(frames) % DATA_PACKET_LENGTH:
+            raise ValueError(f"Độ dài buffer ({len(frames)}) không phải bội số của {DATA_PACKET_LENGTH}")
+        return np.frombuffer(frames, dtype=np.uint8).reshape(-1, DATA_PACKET_LENGTH)
+
+    def decode_block(self, frames, timestamps=None, validate: bool = False) -> Dict[int, Dict[str, np.ndarray]]:
+        """
+        Giải mã một khối gói thành các cột theo packet type.
+        Args:
+            frames: Khối gói (xem as_block). Các gói được giả định đã xác thực checksum.
+            timestamps: Timestamp song song với các gói (tùy chọn); được chia theo type vào cột 'timestamp'.
+            validate (bool): Kiểm tra lại header/checksum và bỏ các gói hỏng.
+        Returns:
+            Dict[int, Dict[str, np.ndarray]]: packet_type -> {tên trường: cột}. Chỉ gồm các type có mặt
+            trong khối; trường có hệ số là float64, trường giữ nguyên là số nguyên như decoder tham chiếu.
+        """
+        block = self.as_block(frames)
+        if timestamps is not None:
+            timestamps = np.asarray(timestamps, dtype=np.float64)
+            if len(timestamps) != len(block):
+                raise ValueError(f"Số timestamp ({len(timestamps)}) khác số gói ({len(block)})")
+        valid = validate_data_packets(block) if validate else None
+
+        block = np.ascontiguousarray(block)
+        types = block[:, 1]
+        result: Dict[int, Dict[str, np.ndarray]] = {}
+        for packet_type in np.unique(types).tolist():
+            layout = self._layouts.get(packet_type)
+            if layout is None:
+                logger.debug(f"Không có bố cục cho packet type 0x{packet_type:02X}, bỏ qua")
+                continue
+            mask = types == packet_type
+            if valid is not None:
+                mask &= valid
+                if not mask.any():
+                    continue
+            dtype, columns = layout
+            rows = block.view(dtype).reshape(-1)[mask]
+            decoded: Dict[str, np.ndarray] = {}
+            for name, divisor, offset in columns:
+                column = rows[name]
+                if divisor is not None:
+                    column = column / divisor
+                elif column.dtype.itemsize < 8:
+                    column = column.astype(np.int64)
+                if offset:
+                    column = column + offset
+                decoded[name] = column
+            if timestamps is not None:
+                decoded['timestamp'] = timestamps[mask]
+            result[packet_type] = decoded
+        return result
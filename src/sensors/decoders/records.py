@@ -0,0 +1,116 @@
+"""
+Bản ghi gọn cho từng packet type của HWT905 (chế độ production)
+
+Mỗi bản ghi là một NamedTuple chỉ chứa các trường vật lý, cùng tên với khóa trong dict
+của decoder tham chiếu (record._asdict() cho đúng phần payload của dict đó).
+Thuộc tính lớp packet_type cho biết loại gói mà không cần tra cứu thêm.
+"""
+from typing import Dict, NamedTuple, Type
+
+from ..hwt905_constants import (
+    PACKET_TYPE_TIME, PACKET_TYPE_ACC, PACKET_TYPE_GYRO, PACKET_TYPE_ANGLE, PACKET_TYPE_MAG,
+    PACKET_TYPE_PORT_STATUS, PACKET_TYPE_PRESSURE, PACKET_TYPE_GPS_LONLAT, PACKET_TYPE_GPS_SPEED,
+    PACKET_TYPE_QUATERNION, PACKET_TYPE_GPS_ACCURACY, PACKET_TYPE_READ_REGISTER
+)
+
+
+class TimeSample(NamedTuple):
+    year: int
+    month: int
+    day: int
+    hour: int
+    minute: int
+    second: int
+    millisecond: int
+    packet_type = PACKET_TYPE_TIME
+
+
+class AccSample(NamedTuple):
+    acc_x: float  # (g)
+    acc_y: float
+    acc_z: float
+    temperature: float  # (C)
+    packet_type = PACKET_TYPE_ACC
+
+
+class GyroSample(NamedTuple):
+    gyro_x: float  # (deg/s)
+    gyro_y: float
+    gyro_z: float
+    temperature: float  # (C)
+    packet_type = PACKET_TYPE_GYRO
+
+
+class AngleSample(NamedTuple):
+    angle_roll: float  # (deg)
+    angle_pitch: float
+    angle_yaw: float
+    temperature: float  # (C)
+    packet_type = PACKET_TYPE_ANGLE
+
+
+class MagSample(NamedTuple):
+    mag_x: int  # (LSB)
+    mag_y: int
+    mag_z: int
+    temperature: float  # (C)
+    packet_type = PACKET_TYPE_MAG
+
+
+class PortStatusSample(NamedTuple):
+    d0_status: int
+    d1_status: int
+    d2_status: int
+    d3_status: int
+    packet_type = PACKET_TYPE_PORT_STATUS
+
+
+class PressureSample(NamedTuple):
+    pressure: int  # (Pa)
+    height: float  # (m)
+    packet_type = PACKET_TYPE_PRESSURE
+
+
+class GPSLonLatSample(NamedTuple):
+    gps_longitude: float  # (deg)
+    gps_latitude: float
+    packet_type = PACKET_TYPE_GPS_LONLAT
+
+
+class GPSSpeedSample(NamedTuple):
+    gps_ground_speed: float  # (km/h)
+    gps_altitude: float  # (m)
+    gps_heading: float  # (deg)
+    packet_type = PACKET_TYPE_GPS_SPEED
+
+
+class QuaternionSample(NamedTuple):
+    q0: float
+    q1: float
+    q2: float
+    q3: float
+    packet_type = PACKET_TYPE_QUATERNION
+
+
+class GPSAccuracySample(NamedTuple):
+    gps_num_satellites: int
+    gps_pdop: float
+    gps_hdop: float
+    gps_vdop: float
+    packet_type = PACKET_TYPE_GPS_ACCURACY
+
+
+class RegisterReadSample(NamedTuple):
+    reg1_value: int
+    reg2_value: int
+    reg3_value: int
+    reg4_value: int
+    packet_type = PACKET_TYPE_READ_REGISTER
+
+
+RECORD_TYPES: Dict[int, Type[tuple]] = {
+    record.packet_type: record for record in (
+        TimeSample, AccSample, GyroSample, AngleSample, MagSample, PortStatusSample, PressureSample,
+        GPSLonLatSample, GPSSpeedSample, QuaternionSample, GPSAccuracySample, RegisterReadSample
+    )
+}
@@ -0,0 +1,166 @@
+"""
+Decoder nhanh dựa trên struct cho tất cả packet type của HWT905
+"""
+import logging
+import struct
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from ..hwt905_constants import (
+    PACKET_TYPE_TIME, PACKET_TYPE_ACC, PACKET_TYPE_GYRO, PACKET_TYPE_ANGLE, PACKET_TYPE_MAG,
+    PACKET_TYPE_PORT_STATUS, PACKET_TYPE_PRESSURE, PACKET_TYPE_GPS_LONLAT, PACKET_TYPE_GPS_SPEED,
+    PACKET_TYPE_QUATERNION, PACKET_TYPE_GPS_ACCURACY, PACKET_TYPE_READ_REGISTER,
+    SCALE_ACCELERATION, SCALE_ANGULAR_VELOCITY, SCALE_ANGLE, SCALE_TEMPERATURE, SCALE_QUATERNION,
+    SCALE_GPS_ALTITUDE, SCALE_GPS_SPEED, SCALE_GPS_ACCURACY
+)
+from .records import RECORD_TYPES
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_OFFSET = 2  # Payload bắt đầu sau header 0x55 và byte TYPE
+SCALE_GPS_COORDINATE = 10_000_000.0
+SCALE_GPS_HEADING = 100.0
+
+# packet_type -> (định dạng struct của payload, tên trường, hệ số chia cho từng trường).
+# Hệ số None nghĩa là giữ nguyên giá trị nguyên như decoder tham chiếu.
+PAYLOAD_LAYOUTS: Dict[int, Tuple[str, Tuple[str, ...], Tuple[Optional[float], ...]]] = {
+    PACKET_TYPE_TIME: ('<BBBBBBh', ("year", "month", "day", "hour", "minute", "second", "millisecond"),
+                       (None,) * 7),
+    PACKET_TYPE_ACC: ('<hhhh', ("acc_x", "acc_y", "acc_z", "temperature"),
+                      (SCALE_ACCELERATION,) * 3 + (SCALE_TEMPERATURE,)),
+    PACKET_TYPE_GYRO: ('<hhhh', ("gyro_x", "gyro_y", "gyro_z", "temperature"),
+                       (SCALE_ANGULAR_VELOCITY,) * 3 + (SCALE_TEMPERATURE,)),
+    PACKET_TYPE_ANGLE: ('<hhhh', ("angle_roll", "angle_pitch", "angle_yaw", "temperature"),
+                        (SCALE_ANGLE,) * 3 + (SCALE_TEMPERATURE,)),
+    PACKET_TYPE_MAG: ('<hhhh', ("mag_x", "mag_y", "mag_z", "temperature"),
+                      (None,) * 3 + (SCALE_TEMPERATURE,)),
+    PACKET_TYPE_PORT_STATUS: ('<hhhh', ("d0_status", "d1_status", "d2_status", "d3_status"), (None,) * 4),
+    PACKET_TYPE_PRESSURE: ('<II', ("pressure", "height"), (None, SCALE_GPS_ALTITUDE)),
+    PACKET_TYPE_GPS_LONLAT: ('<II', ("gps_longitude", "gps_latitude"), (SCALE_GPS_COORDINATE,) * 2),
+    PACKET_TYPE_GPS_SPEED: ('<Ihh', ("gps_ground_speed", "gps_altitude", "gps_heading"),
+                            (SCALE_GPS_SPEED, SCALE_GPS_ALTITUDE, SCALE_GPS_HEADING)),
+    PACKET_TYPE_QUATERNION: ('<hhhh', ("q0", "q1", "q2", "q3"), (SCALE_QUATERNION,) * 4),
+    PACKET_TYPE_GPS_ACCURACY: ('<hhhh', ("gps_num_satellites", "gps_pdop", "gps_hdop", "gps_vdop"),
+                               (None,) + (SCALE_GPS_ACCURACY,) * 3),
+    PACKET_TYPE_READ_REGISTER: ('<hhhh', ("reg1_value", "reg2_value", "reg3_value", "reg4_value"), (None,) * 4),
+}
+
+# Hằng số cộng thêm sau khi chia: byte năm trong gói TIME là 20YY
+FIELD_OFFSETS: Dict[int, Dict[str, int]] = {
+    PACKET_TYPE_TIME: {"year": 2000},
+}
+
+
+def compile_payload_decoder(fmt: str, names: Sequence[str], divisors: Sequence[Optional[float]],
+                            offsets: Optional[Dict[str, int]] = None,
+                            record_type: Optional[type] = None) -> Callable[[Any, int], Any]:
+    """
+    Biên dịch hàm decode(buffer, offset) cho một bố cục payload: một lần unpack_from
+    của struct.Struct(fmt), rồi một dict literal (hoặc lời gọi record_type) với hệ số chia/hằng số
+    cộng nhúng sẵn dạng hằng, nên mỗi gói không phải duyệt bảng hệ số hay tạo iterator.
+    Args:
+        fmt: Định dạng struct của payload 8 byte, ví dụ '<hhhh'.
+        names: Tên trường theo thứ tự trong payload.
+        divisors: Hệ số chia cho từng trường; None để giữ nguyên giá trị nguyên.
+        offsets: Hằng số cộng thêm cho một số trường (tùy chọn).
+        record_type: NamedTuple có _fields trùng names; nếu có, hàm trả về bản ghi thay cho dict.
+    """
+    compiled = struct.Struct(fmt)
+    field_count = len(compiled.unpack(bytes(compiled.size)))
+    if compiled.size > 8 or len(names) != field_count or len(divisors) != field_count:
+        raise ValueError(f"Bố cục payload không hợp lệ: {fmt} với {len(names)} trường")
+    if record_type is not None and tuple(record_type._fields) != tuple(names):
+        raise ValueError(f"Trường của {record_type.__name__} không khớp bố cục {tuple(names)}")
+    offsets = offsets or {}
+    variables = [f"v{i}" for i in range(field_count)]
+    expressions = []
+    for name, variable, divisor in zip(names, variables, divisors):
+        expression = variable if divisor is None else f"{variable} / {float(divisor)!r}"
+        if name in offsets:
+            expression = f"{expression} + {int(offsets[name])!r}"
+        expressions.append(expression)
+    if record_type is None:
+        result = "{" + ", ".join(f"{name!r}: {expression}" for name, expression in zip(names, expressions)) + "}"
+    else:
+        result = f"record({', '.join(expressions)})"
+    source = (f"def decode(buffer, offset):\n"
+              f"    {', '.join(variables)}, = unpack_from(buffer, offset)\n"
+              f"    return {result}\n")
+    namespace = {"unpack_from": compiled.unpack_from, "record": record_type}
+    exec(compile(source, f"<payload {fmt}>", "exec"), namespace)
+    return namespace["decode"]
+
+
+class StructPacketDecoder:
+    """
+    Giải mã payload bằng một hàm biên dịch sẵn cho mỗi packet type: một lần unpack_from
+    của struct.Struct trực tiếp trên frame (bytes/bytearray/memoryview, tại offset bất kỳ)
+    thay cho nhiều lần bytes_to_short, với hệ số chia lấy từ bảng PAYLOAD_LAYOUTS.
+    Kết quả giống hệt các decoder trong package này (vẫn được giữ làm bản tham chiếu).
+    decode_record() trả về bản ghi NamedTuple gọn (records.RECORD_TYPES) thay cho dict.
+    """
+
+    def __init__(self):
+        self._decoders: Dict[int, Callable[[Any, int], Dict[str, Any]]] = {}
+        self._record_decoders: Dict[int, Callable[[Any, int], tuple]] = {}
+        for packet_type, (fmt, names, divisors) in PAYLOAD_LAYOUTS.items():
+            self.register_layout(packet_type, fmt, names, divisors, FIELD_OFFSETS.get(packet_type),
+                                 RECORD_TYPES.get(packet_type))
+
+    def register_layout(self, packet_type: int, fmt: str, names: Sequence[str],
+                        divisors: Sequence[Optional[float]], offsets: Optional[Dict[str, int]] = None,
+                        record_type: Optional[type] = None):
+        """Đăng ký (hoặc thay) bố cục payload cho một packet type (xem compile_payload_decoder)."""
+        self._decoders[packet_type] = compile_payload_decoder(fmt, names, divisors, offsets)
+        if record_type is not None:
+            self._record_decoders[packet_type] = compile_payload_decoder(fmt, names, divisors, offsets, record_type)
+        else:
+            self._record_decoders.pop(packet_type, None)
+
+    def supports(self, packet_type: int) -> bool:
+        return packet_type in self._decoders
+
+    def decode_frame(self, frame, offset: int = 0) -> Dict[str, Any]:
+        """
+        Giải mã payload của frame 11 byte bắt đầu tại offset (frame có thể là một buffer lớn).
+        Returns:
+            Dict chứa dữ liệu đã decode hoặc thông tin lỗi (cùng dạng với PacketDecoderFactory.decode_packet).
+        """
+        decoder = self._decoders.get(frame[offset + 1])
+        if decoder is not None:
+            try:
+                return decoder(frame, offset + PAYLOAD_OFFSET)
+            except struct.error as e:
+                return self._error(frame[offset + 1], e)
+        return self._error(frame[offset + 1])
+
+    def decode_record(self, frame, offset: int = 0) -> Optional[tuple]:
+        """
+        Giải mã frame 11 byte thành bản ghi gọn (ví dụ AngleSample) chỉ gồm các trường vật lý.
+        Returns:
+            Bản ghi NamedTuple, hoặc None nếu packet type không có bản ghi hay frame quá ngắn.
+        """
+        decoder = self._record_decoders.get(frame[offset + 1])
+        if decoder is None:
+            return None
+        try:
+            return decoder(frame, offset + PAYLOAD_OFFSET)
+        except struct.error:
+            return None
+
+    def decode_packet(self, packet_type: int, payload: bytes) -> Dict[str, Any]:
+        """Giải mã payload 8 byte với packet type cho trước (cùng giao diện với PacketDecoderFactory)."""
+        decoder = self._decoders.get(packet_type)
+        if decoder is not None:
+            try:
+                return decoder(payload, 0)
+            except struct.error as e:
+                return self._error(packet_type, e)
+        return self._error(packet_type)
+
+    @staticmethod
+    def _error(packet_type: int, error: Optional[Exception] = None) -> Dict[str, Any]:
+        if error is None:
+            logger.warning(f"Không tìm thấy decoder cho packet type 0x{packet_type:02X}")
+            return {"error": "no_decoder_found", "packet_type": packet_type}
+        logger.error(f"Lỗi khi decode packet type 0x{packet_type:02X}: {error}")
+        return {"error": "decode_error", "message": str(error), "packet_type": packet_type}
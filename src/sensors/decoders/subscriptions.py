@@ -0,0 +1,148 @@
+"""
+Đăng ký giải mã theo nhu cầu: mỗi consumer (storage, publisher, analytics) khai báo packet type
+và trường cần dùng, pipeline chỉ giải mã hợp của các đăng ký và bỏ qua các gói còn lại.
+"""
+import logging
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, Optional, Sequence
+
+from ..hwt905_constants import PACKET_TYPE_ANGLE
+from .struct_decoder import PAYLOAD_LAYOUTS
+
+logger = logging.getLogger(__name__)
+
+# Trường có mặt trong nhiều packet type (temperature có trong ACC/GYRO/ANGLE/MAG) được lấy từ type này
+# nếu không có trường nào khác của consumer kéo theo một type chứa nó
+PREFERRED_FIELD_SOURCES: Dict[str, int] = {
+    "temperature": PACKET_TYPE_ANGLE,
+}
+
+
+def _field_sources() -> Dict[str, Sequence[int]]:
+    sources: Dict[str, list] = {}
+    for packet_type, (_, names, _) in PAYLOAD_LAYOUTS.items():
+        for name in names:
+            sources.setdefault(name, []).append(packet_type)
+    return sources
+
+
+FIELD_SOURCES = _field_sources()
+
+
+def packet_types_for_fields(fields: Iterable[str]) -> Dict[int, FrozenSet[str]]:
+    """
+    Xác định packet type cần giải mã để có các trường cho trước.
+    Trường không thuộc payload nào (timestamp, device_id, ...) bị bỏ qua.
+    Trường dùng chung cho nhiều type đi theo type đã được chọn bởi trường khác, nếu không
+    thì theo PREFERRED_FIELD_SOURCES (hoặc type đầu tiên chứa nó).
+    Returns:
+        Dict[int, FrozenSet[str]]: packet_type -> các trường lấy từ type đó.
+    """
+    selected: Dict[int, set] = {}
+    shared = []
+    for field in fields:
+        sources = FIELD_SOURCES.get(field)
+        if not sources:
+            continue
+        if len(sources) == 1:
+            selected.setdefault(sources[0], set()).add(field)
+        else:
+            shared.append((field, sources))
+    for field, sources in shared:
+        matched = [packet_type for packet_type in sources if packet_type in selected]
+        if not matched:
+            matched = [PREFERRED_FIELD_SOURCES.get(field, sources[0])]
+        for packet_type in matched:
+            selected.setdefault(packet_type, set()).add(field)
+    return {packet_type: frozenset(names) for packet_type, names in selected.items()}
+
+
+class DecodeSubscriptions:
+    """
+    Tập đăng ký giải mã của một pipeline. Mỗi consumer giữ một đăng ký (đăng ký lại sẽ thay thế);
+    mask là hợp các packet type đã đăng ký, dạng bảng 256 byte (mask[type] != 0 nghĩa là cần giải mã)
+    được cập nhật tại chỗ, nên luồng giải mã giữ tham chiếu một lần và thấy ngay thay đổi.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._consumers: Dict[str, Dict[int, FrozenSet[str]]] = {}
+        self._tracked_storage: Dict[str, object] = {}
+        self.mask = bytearray(256)
+        self.version = 0  # Tăng mỗi lần mask được tính lại
+
+    def subscribe(self, consumer: str, fields: Optional[Iterable[str]] = None,
+                  packet_types: Optional[Iterable[int]] = None):
+        """
+        Đăng ký (hoặc thay) nhu cầu của một consumer.
+        Args:
+            consumer: Tên consumer, ví dụ "storage".
+            fields: Tên trường cần dùng (như trong PAYLOAD_LAYOUTS); packet type được suy ra.
+            packet_types: Packet type cần toàn bộ trường.
+        """
+        wanted = packet_types_for_fields(fields or ())
+        for packet_type in packet_types or ():
+            if packet_type not in PAYLOAD_LAYOUTS:
+                raise ValueError(f"Không có bố cục cho packet type 0x{packet_type:02X}")
+            wanted[packet_type] = frozenset(PAYLOAD_LAYOUTS[packet_type][1])
+        with self._lock:
+            self._consumers[consumer] = wanted
+            self._rebuild_mask()
+        logger.info(f"Đăng ký giải mã '{consumer}': {self.describe(wanted)}")
+
+    def unsubscribe(self, consumer: str):
+        """Bỏ đăng ký của một consumer; packet type không còn ai cần sẽ không được giải mã nữa."""
+        with self._lock:
+            if self._consumers.pop(consumer, None) is None:
+                return
+            self._tracked_storage.pop(consumer, None)
+            self._rebuild_mask()
+
+    def track_storage(self, storage_manager, consumer: str = "storage"):
+        """
+        Đăng ký theo danh sách cột của StorageManager và tự cập nhật khi danh sách đó được cấu hình lại
+        (StorageManager.set_fields_to_write). Gọi lại với cùng storage không đăng ký listener lần nữa.
+        """
+        if self._tracked_storage.get(consumer) is not storage_manager:
+            storage_manager.add_fields_listener(self._storage_listener(consumer))
+            self._tracked_storage[consumer] = storage_manager
+        self.subscribe(consumer, fields=storage_manager.fields_to_write)
+
+    def _storage_listener(self, consumer: str) -> Callable[[Sequence[str]], None]:
+        def on_fields_changed(fields: Sequence[str]):
+            self.subscribe(consumer, fields=fields)
+        return on_fields_changed
+
+    def _rebuild_mask(self):
+        wanted = set()
+        for subscription in self._consumers.values():
+            wanted.update(subscription)
+        for packet_type in range(256):
+            self.mask[packet_type] = packet_type in wanted
+        self.version += 1
+
+    def wants(self, packet_type: int) -> bool:
+        return bool(self.mask[packet_type])
+
+    def packet_types(self) -> FrozenSet[int]:
+        """Hợp các packet type đang được đăng ký."""
+        return frozenset(packet_type for packet_type in range(256) if self.mask[packet_type])
+
+    def fields(self, packet_type: int) -> FrozenSet[str]:
+        """Hợp các trường mà các consumer cần từ một packet type."""
+        with self._lock:
+            return frozenset().union(*(subscription.get(packet_type, frozenset())
+                                       for subscription in self._consumers.values()))
+
+    @staticmethod
+    def describe(subscription: Dict[int, FrozenSet[str]]) -> str:
+        if not subscription:
+            return "không có packet type nào"
+        return ", ".join(f"0x{packet_type:02X}({', '.join(sorted(names))})"
+                         for packet_type, names in sorted(subscription.items()))
+
+
+def format_skip_counts(skipped_by_type: Sequence[int]) -> str:
+    """Mô tả số gói bị bỏ qua theo packet type (danh sách 256 bộ đếm) cho log định kỳ."""
+    parts = [f"0x{packet_type:02X}: {count}" for packet_type, count in enumerate(skipped_by_type) if count]
+    return ", ".join(parts) if parts else "0"
@@ -0,0 +1,207 @@
+# src/sensors/hwt905_configurator.py
+
+"""
+Cấu hình nội dung và tốc độ output của cảm biến HWT905 qua cổng serial.
+
+Mỗi lệnh ghi được gửi sau lệnh mở khóa (FF AA 69 88 B5), cấu hình được lưu vào flash
+bằng lệnh SAVE và được xác nhận bằng cách đọc lại thanh ghi qua gói phản hồi 0x5F.
+Thanh ghi RSW, RRATE và BAUD nằm liền nhau (0x02 - 0x04) nên chỉ cần một lệnh đọc.
+"""
+import logging
+import time
+from typing import List, Optional
+
+import serial
+
+from src import config
+from src.sensors import hwt905_constants
+from src.sensors.hwt905_constants import (
+    REG_RSW, REG_RRATE, REG_BAUD,
+    PACKET_TYPE_READ_REGISTER,
+    OUTPUT_RATE_CODES, BAUD_RATE_CODES
+)
+from src.sensors.hwt905_protocol import (
+    create_write_command, create_unlock_command, create_save_command, create_read_command
+)
+from src.sensors.hwt905_frame_parser import HWT905FrameParser
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_rsw_value(spec: str) -> int:
+    """
+    Chuyển cấu hình nội dung output thành giá trị RSW.
+    Chấp nhận tên hằng số trong hwt905_constants (ví dụ "RSW_ONLY_ANGLE_TIME") hoặc số (ví dụ "0x0009").
+    """
+    spec = spec.strip()
+    if spec.upper().startswith("RSW_") or spec.upper() == "DEFAULT_RSW_VALUE":
+        value = getattr(hwt905_constants, spec.upper(), None)
+        if value is None:
+            raise ValueError(f"Không có hằng số RSW tên '{spec}'")
+        return value
+    return int(spec, 0)
+
+
+class SensorOutputProfile:
+    """Cấu hình output mong muốn: nội dung (RSW), tần số (RRATE) và baudrate tùy chọn (BAUD)."""
+
+    def __init__(self, rsw: int, rate_hz: float, baudrate: Optional[int] = None):
+        """
+        Args:
+            rsw (int): Giá trị thanh ghi RSW (tổ hợp các bit RSW_*).
+            rate_hz (float): Tần số output, phải có trong OUTPUT_RATE_CODES.
+            baudrate (Optional[int]): Baudrate mới cho cảm biến, None để giữ nguyên.
+        """
+        if rate_hz not in OUTPUT_RATE_CODES:
+            raise ValueError(f"Tần số output {rate_hz} Hz không được hỗ trợ. Chọn một trong {sorted(OUTPUT_RATE_CODES)}")
+        if baudrate is not None and baudrate not in BAUD_RATE_CODES:
+            raise ValueError(f"Baudrate {baudrate} không được hỗ trợ. Chọn một trong {sorted(BAUD_RATE_CODES)}")
+        self.rsw = rsw
+        self.rate_hz = rate_hz
+        self.rrate_code = OUTPUT_RATE_CODES[rate_hz]
+        self.baudrate = baudrate
+        self.baud_code = BAUD_RATE_CODES[baudrate] if baudrate else None
+
+    @classmethod
+    def from_config(cls) -> Optional["SensorOutputProfile"]:
+        """
+        Tạo profile từ cấu hình, hoặc None nếu không bật cấu hình cảm biến khi kết nối.
+        Baudrate không nằm trong profile này: SensorConnectionManager tự dò và nâng baudrate
+        theo SENSOR_TARGET_BAUD_RATE, kể cả khi không bật cấu hình output.
+        """
+        if not config.SENSOR_CONFIGURE_ON_CONNECT:
+            return None
+        return cls(
+            rsw=resolve_rsw_value(config.SENSOR_OUTPUT_CONTENT),
+            rate_hz=config.SENSOR_OUTPUT_RATE_HZ
+        )
+
+    def __repr__(self) -> str:
+        baud = f", BAUD={self.baudrate}" if self.baudrate else ""
+        return f"RSW=0x{self.rsw:04X}, RRATE={self.rate_hz:g}Hz{baud}"
+
+
+class HWT905Configurator:
+    """
+    Gửi lệnh cấu hình tới cảm biến và đọc lại thanh ghi trên một kết nối serial đã mở.
+    Chỉ dùng khi chưa có luồng đọc nào chạy trên cùng cổng.
+    """
+
+    def __init__(self, ser_instance: serial.Serial, command_delay: float = 0.1, response_timeout: float = 1.0):
+        """
+        Args:
+            ser_instance: Instance serial.Serial đã kết nối.
+            command_delay: Thời gian chờ sau mỗi lệnh ghi để cảm biến xử lý (giây).
+            response_timeout: Thời gian chờ tối đa gói phản hồi 0x5F (giây).
+        """
+        self.ser = ser_instance
+        self.command_delay = command_delay
+        self.response_timeout = response_timeout
+        self._parser = HWT905FrameParser()
+
+    def _send(self, command: bytes):
+        self.ser.write(command)
+        self.ser.flush()
+        time.sleep(self.command_delay)
+
+    def unlock(self):
+        """Mở khóa thanh ghi cho lệnh ghi tiếp theo."""
+        self._send(create_unlock_command())
+
+    def write_register(self, register_address: int, value: int):
+        """Mở khóa rồi ghi giá trị 16-bit vào thanh ghi."""
+        self.unlock()
+        self._send(create_write_command(register_address, value))
+
+    def save_config(self):
+        """Lưu cấu hình hiện tại vào flash của cảm biến."""
+        self.unlock()
+        self._send(create_save_command())
+
+    def write_baudrate(self, baudrate: int):
+        """
+        Ghi và lưu baudrate mới vào cảm biến. Cảm biến chuyển ngay sau lệnh SAVE,
+        phía host phải mở lại cổng ở baudrate mới.
+        """
+        if baudrate not in BAUD_RATE_CODES:
+            raise ValueError(f"Baudrate {baudrate} không được hỗ trợ. Chọn một trong {sorted(BAUD_RATE_CODES)}")
+        self.write_register(REG_BAUD, BAUD_RATE_CODES[baudrate])
+        self.save_config()
+
+    def read_registers(self, register_address: int) -> Optional[List[int]]:
+        """
+        Đọc 4 thanh ghi liên tiếp bắt đầu từ register_address.
+        Gói phản hồi 0x5F được tìm trong luồng dữ liệu đang phát; các gói khác bị bỏ qua.
+        Returns:
+            Optional[List[int]]: 4 giá trị (không dấu, 16-bit), hoặc None nếu hết thời gian chờ.
+        """
+        self._parser.reset()
+        self.ser.reset_input_buffer()
+        self.ser.write(create_read_command(register_address))
+        self.ser.flush()
+
+        deadline = time.monotonic() + self.response_timeout
+        while time.monotonic() < deadline:
+            chunk = self.ser.read(max(self.ser.in_waiting, 1))
+            for frame in self._parser.feed(chunk):
+                if frame[1] == PACKET_TYPE_READ_REGISTER:
+                    return [frame[2 + i] | (frame[3 + i] << 8) for i in range(0, 8, 2)]
+        return None
+
+    def measure_byte_rate(self, duration: float = 1.0) -> float:
+        """Đếm số byte cảm biến gửi trong duration giây. Returns: bytes/s."""
+        self.ser.reset_input_buffer()
+        received = 0
+        start = time.monotonic()
+        deadline = start + duration
+        while time.monotonic() < deadline:
+            received += len(self.ser.read(max(self.ser.in_waiting, 1)))
+        return received / (time.monotonic() - start)
+
+    def apply_output_profile(self, profile: SensorOutputProfile, measure_seconds: float = 1.0) -> bool:
+        """
+        Đưa cảm biến về profile mong muốn. Thanh ghi được đọc trước; chỉ ghi khi khác giá trị mong muốn,
+        nên việc gọi lại ở mỗi lần kết nối lại không tốn thêm lệnh ghi flash.
+        Nếu profile có baudrate, baudrate của self.ser được chuyển theo sau khi cảm biến đổi.
+        Args:
+            profile: Cấu hình mong muốn.
+            measure_seconds: Thời gian đo bytes/s trước và sau khi cấu hình (0 để bỏ qua).
+        Returns:
+            bool: True nếu thanh ghi đọc lại khớp với profile.
+        """
+        current = self.read_registers(REG_RSW)
+        if current is None:
+            logger.warning("Không nhận được phản hồi đọc thanh ghi (0x5F) từ cảm biến, bỏ qua bước cấu hình output.")
+            return False
+
+        rsw, rrate, baud = current[0], current[1] & 0x0F, current[2] & 0x0F
+        baud_matches = profile.baud_code is None or baud == profile.baud_code
+        if rsw == profile.rsw and rrate == profile.rrate_code and baud_matches:
+            logger.info(f"Cảm biến đã đúng cấu hình output ({profile}).")
+            return True
+
+        before = self.measure_byte_rate(measure_seconds) if measure_seconds else None
+        logger.info(f"Cấu hình output cảm biến: RSW 0x{rsw:04X} -> 0x{profile.rsw:04X}, "
+                    f"RRATE 0x{rrate:02X} -> 0x{profile.rrate_code:02X}")
+        self.write_register(REG_RSW, profile.rsw)
+        self.write_register(REG_RRATE, profile.rrate_code)
+        self.save_config()
+
+        if not baud_matches:
+            logger.info(f"Chuyển baudrate cảm biến sang {profile.baudrate} bps")
+            self.write_baudrate(profile.baudrate)
+            self.ser.baudrate = profile.baudrate
+            time.sleep(self.command_delay)
+
+        verified = self.read_registers(REG_RSW)
+        if verified is None or verified[0] != profile.rsw or (verified[1] & 0x0F) != profile.rrate_code \
+                or (profile.baud_code is not None and (verified[2] & 0x0F) != profile.baud_code):
+            logger.error(f"Đọc lại thanh ghi không khớp cấu hình mong muốn ({profile}): {verified}")
+            return False
+
+        after = self.measure_byte_rate(measure_seconds) if measure_seconds else None
+        if before is not None and after is not None:
+            saving = (1 - after / before) * 100 if before else 0.0
+            logger.info(f"Lưu lượng serial: {before:.0f} bytes/s -> {after:.0f} bytes/s (giảm {saving:.0f}%).")
+        logger.info(f"Đã cấu hình và xác nhận output cảm biến ({profile}).")
+        return True
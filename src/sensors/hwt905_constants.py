@@ -178,6 +178,19 @@ BAUD_RATE_230400 = 0x0007
 BAUD_RATE_460800 = 0x0008 # Chỉ hỗ trợ trên WT931/JY931/HWT606/HWT906
 BAUD_RATE_921600 = 0x0009 # Chỉ hỗ trợ trên WT931/JY931/HWT606/HWT906
 
+# Tra mã BAUD theo baudrate (bps)
+BAUD_RATE_CODES = {
+    4800: BAUD_RATE_4800,
+    9600: BAUD_RATE_9600,
+    19200: BAUD_RATE_19200,
+    38400: BAUD_RATE_38400,
+    57600: BAUD_RATE_57600,
+    115200: BAUD_RATE_115200,
+    230400: BAUD_RATE_230400,
+    460800: BAUD_RATE_460800,
+    921600: BAUD_RATE_921600,
+}
+
 # ==============================================================================
 # 5. MÃ CÀI ĐẶT TỐC ĐỘ OUTPUT (Giá trị 16-bit để ghi vào thanh ghi RRATE, REG_RRATE 0x03)
 # Giá trị thực tế được ghi là phần [3:0] của dữ liệu 16-bit.
@@ -198,6 +211,21 @@ RATE_OUTPUT_200HZ  = 0x000B
 RATE_OUTPUT_SINGLE = 0x000C  # Output một lần (Single return)
 RATE_OUTPUT_NO_RETURN = 0x000D # Không output (No return)
 
+# Tra mã RRATE theo tần số output (Hz)
+OUTPUT_RATE_CODES = {
+    0.1: RATE_OUTPUT_0_1HZ,
+    0.5: RATE_OUTPUT_0_5HZ,
+    1: RATE_OUTPUT_1HZ,
+    2: RATE_OUTPUT_2HZ,
+    5: RATE_OUTPUT_5HZ,
+    10: RATE_OUTPUT_10HZ,
+    20: RATE_OUTPUT_20HZ,
+    50: RATE_OUTPUT_50HZ,
+    100: RATE_OUTPUT_100HZ,
+    125: RATE_OUTPUT_125HZ,
+    200: RATE_OUTPUT_200HZ,
+}
+
 # ==============================================================================
 # 6. ĐỊNH NGHĨA BIT CHO THANH GHI NỘI DUNG OUTPUT (REG_RSW, địa chỉ 0x02)
 # Giá trị RSW là một số 16-bit (DATAL là 8 bit thấp, DATAH là 8 bit cao).
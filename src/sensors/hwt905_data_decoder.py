@@ -8,15 +8,16 @@ và chuyển đổi raw data thành giá trị có ý nghĩa.
 import serial
 import time
 import logging
-from typing import Dict, Any, Optional
+from collections import deque
+from typing import Dict, Any, List, Optional
 
 from src.sensors.hwt905_constants import (
     DATA_HEADER_BYTE,
     DATA_PACKET_LENGTH,
     DEFAULT_SERIAL_TIMEOUT, DEFAULT_BAUDRATE
 )
-from src.sensors.hwt905_protocol import calculate_checksum, is_valid_data_packet
-from src.sensors.decoders import PacketDecoderFactory
+from src.sensors.hwt905_frame_parser import HWT905FrameParser
+from src.sensors.decoders import PacketDecoderFactory, StructPacketDecoder, NumpyBatchDecoder, RECORD_TYPES, DecodeSubscriptions
 
 logger = logging.getLogger(__name__)
 
@@ -26,16 +27,34 @@ class HWT905DataDecoder:
     Lớp này không quản lý kết nối serial, nó chỉ sử dụng một instance đã có.
     """
 
-    def __init__(self, debug: bool = False, ser_instance: Optional[serial.Serial] = None):
+    def __init__(self, debug: bool = False, ser_instance: Optional[serial.Serial] = None,
+                 read_chunk_size: int = 4096, raw_tee=None, struct_decode: bool = True):
         """
         Khởi tạo bộ giải mã dữ liệu HWT905.
         Args:
             debug: Kích hoạt logging ở mức DEBUG nếu True.
             ser_instance: Một instance serial.Serial đã được khởi tạo và kết nối.
+            read_chunk_size: Số byte tối đa đọc từ serial trong một lần gọi.
+            raw_tee: Đối tượng có write_chunk(data, mono_ns) (ví dụ RawCaptureWriter) nhận
+                nguyên văn mọi khối byte đọc được từ serial, hoặc None để tắt.
+            struct_decode: Giải mã payload bằng StructPacketDecoder (struct biên dịch sẵn).
+                False để dùng các decoder tham chiếu qua PacketDecoderFactory.
         """
         self.ser = ser_instance
         self.debug = debug  # Lưu debug flag
         self.decoder_factory = PacketDecoderFactory()
+        self.struct_decoder = StructPacketDecoder() if struct_decode else None
+        self.batch_decoder = NumpyBatchDecoder()
+        # Packet type mà các consumer của pipeline cần; luồng giải mã bỏ qua các type còn lại
+        self.subscriptions = DecodeSubscriptions()
+        self.read_chunk_size = max(read_chunk_size, DATA_PACKET_LENGTH)
+        self.frame_parser = HWT905FrameParser()
+        self._pending_frames = deque()
+        self._reported_checksum_errors = 0
+        self.last_read_ns = 0  # time.monotonic_ns() ngay sau lần đọc serial gần nhất
+        # Wall-clock đã ghi (time_ns) của khối vừa đọc khi nguồn là ReplaySerial phát segment raw capture
+        self.last_read_wall_ns: Optional[int] = None
+        self.raw_tee = raw_tee
 
         if debug:
             logger.setLevel(logging.DEBUG)
@@ -55,14 +74,37 @@ class HWT905DataDecoder:
         """
         self.ser = ser_instance
         self._packet_buffer = b'' # Xóa buffer khi có kết nối mới
+        self.frame_parser.reset()
+        self._pending_frames.clear()
         logger.info(f"Data Decoder đã được cập nhật với instance serial mới: {'kết nối' if ser_instance else 'ngắt kết nối'}")
 
-    def read_raw_packet(self) -> Optional[bytes]:
+    def _read_chunk(self) -> bytes:
+        """
+        Đọc một khối byte từ serial: lấy toàn bộ những gì đang có trong in_waiting
+        (tối đa read_chunk_size). Nếu buffer trống thì chờ byte đầu tiên tới timeout.
+        """
+        waiting = self.ser.in_waiting
+        if waiting:
+            return self.ser.read(min(waiting, self.read_chunk_size))
+
+        first = self.ser.read(1)
+        if not first:
+            return b''  # Timeout, không có dữ liệu
+
+        waiting = self.ser.in_waiting
+        if waiting:
+            return first + self.ser.read(min(waiting, self.read_chunk_size - 1))
+        return first
+
+    def _note_read(self):
+        self.last_read_ns = time.monotonic_ns()
+        self.last_read_wall_ns = getattr(self.ser, "last_read_wall_ns", None)
+
+    def read_raw_packets(self) -> List[bytes]:
         """
-        Đọc một gói dữ liệu thô từ cổng serial, đảm bảo tính toàn vẹn bằng cách
-        đồng bộ hóa stream và xác thực checksum.
-        Hàm này sẽ đọc liên tục cho đến khi tìm thấy một gói tin hợp lệ hoặc timeout.
-        Trả về None nếu không có dữ liệu hoặc gặp lỗi.
+        Đọc một khối dữ liệu từ cổng serial và tách ra tất cả các gói tin hợp lệ.
+        Phần gói tin chưa đủ ở cuối khối được giữ lại cho lần đọc sau.
+        Trả về danh sách rỗng nếu không có dữ liệu.
         Raise SerialException nếu mất kết nối.
         """
         try:
@@ -70,38 +112,25 @@ class HWT905DataDecoder:
                 logger.error("Cổng serial không mở hoặc đã bị đóng")
                 raise serial.SerialException("Cổng serial không khả dụng")
 
-            # Vòng lặp để đồng bộ hóa và tìm gói tin hợp lệ
-            while self.ser.is_open:
-                # 1. Tìm header 0x55
-                header_byte = self.ser.read(1)
-                if not header_byte:
-                    return None # Timeout, không có dữ liệu
-
-                if header_byte[0] == DATA_HEADER_BYTE:
-                    # 2. Đã tìm thấy header, đọc 10 byte còn lại
-                    remaining_data = self.ser.read(DATA_PACKET_LENGTH - 1)
-                    if len(remaining_data) < (DATA_PACKET_LENGTH - 1):
-                        logger.warning(f"Không đọc đủ gói tin sau header ({len(remaining_data)}/{DATA_PACKET_LENGTH - 1} bytes). Tìm lại...")
-                        continue # Quay lại tìm header tiếp
-
-                    full_packet = header_byte + remaining_data
-
-                    # 3. Xác thực gói tin
-                    if is_valid_data_packet(full_packet):
-                        if self.debug:
-                            packet_hex = ' '.join(f'{b:02X}' for b in full_packet)
-                            logger.debug(f"Gói tin hợp lệ: {packet_hex}")
-                        return full_packet # Gói tin hợp lệ, trả về
-                    else:
-                        # Checksum sai, có thể là header giả
-                        logger.warning(f"Gói tin bị hỏng (checksum sai). Bỏ qua và tìm tiếp.")
-                        # Không cần làm gì, vòng lặp sẽ tiếp tục tìm byte tiếp theo trong stream
-                
-                # Nếu byte không phải là header, vòng lặp sẽ tự động đọc byte tiếp theo
+            chunk = self._read_chunk()
+            if not chunk:
+                return []
+            self._note_read()
+            if self.raw_tee is not None:
+                self.raw_tee.write_chunk(chunk, self.last_read_ns)
+
+            frames = self.frame_parser.feed(chunk)
+            self._report_checksum_errors()
+
+            if self.debug:
+                for frame in frames:
+                    packet_hex = ' '.join(f'{b:02X}' for b in frame)
+                    logger.debug(f"Gói tin hợp lệ: {packet_hex}")
+            return frames
 
         except serial.SerialTimeoutException:
             # Timeout là bình thường khi không có dữ liệu, không phải lỗi
-            return None
+            return []
             
         except serial.SerialException as e:
             # Lỗi serial nghiêm trọng - mất kết nối
@@ -117,6 +146,62 @@ class HWT905DataDecoder:
             logger.error(f"Lỗi không mong muốn khi đọc: {e}", exc_info=True)
             raise serial.SerialException(f"Lỗi đọc dữ liệu: {e}")
 
+    def read_into(self, buffer: memoryview) -> int:
+        """
+        Đọc dữ liệu thô từ serial ghi thẳng vào buffer (ví dụ vùng trống của ring buffer).
+        Đọc tối đa số byte đang có trong in_waiting; nếu trống thì chờ byte đầu tiên tới timeout.
+        Returns:
+            int: Số byte đã ghi vào buffer (0 nếu timeout).
+        Raise SerialException nếu mất kết nối.
+        """
+        try:
+            if not self.ser or not self.ser.is_open:
+                logger.error("Cổng serial không mở hoặc đã bị đóng")
+                raise serial.SerialException("Cổng serial không khả dụng")
+
+            waiting = self.ser.in_waiting
+            size = min(len(buffer), waiting) if waiting else 1
+            count = self.ser.readinto(buffer[:size]) or 0
+            if count:
+                self._note_read()
+                if self.raw_tee is not None:
+                    self.raw_tee.write_chunk(buffer[:count], self.last_read_ns)
+            return count
+
+        except serial.SerialException as e:
+            raise e
+
+        except OSError as e:
+            raise serial.SerialException(f"Mất kết nối: {e}")
+
+        except Exception as e:
+            logger.error(f"Lỗi không mong muốn khi đọc: {e}", exc_info=True)
+            raise serial.SerialException(f"Lỗi đọc dữ liệu: {e}")
+
+    def read_raw_packet(self) -> Optional[bytes]:
+        """
+        Đọc một gói dữ liệu thô đã xác thực checksum.
+        Các gói còn lại của cùng khối đọc được giữ trong hàng chờ nội bộ.
+        Trả về None nếu không có dữ liệu.
+        Raise SerialException nếu mất kết nối.
+        """
+        if not self._pending_frames:
+            self._pending_frames.extend(self.read_raw_packets())
+        if self._pending_frames:
+            return self._pending_frames.popleft()
+        return None
+
+    def _report_checksum_errors(self):
+        """Log số gói sai checksum, tối đa một lần mỗi _serial_error_log_delay giây."""
+        errors = self.frame_parser.checksum_errors
+        if errors == self._reported_checksum_errors:
+            return
+        now = time.time()
+        if now - self._last_serial_error_time >= self._serial_error_log_delay:
+            logger.warning(f"Bỏ qua {errors - self._reported_checksum_errors} gói tin bị hỏng (checksum sai).")
+            self._reported_checksum_errors = errors
+            self._last_serial_error_time = now
+
     def decode_raw_packet(self, raw_packet: bytes) -> Dict[str, Any]:
         """
         Giải mã một gói dữ liệu thô đã được đọc. Giả định gói tin đã được xác thực checksum.
@@ -125,7 +210,7 @@ class HWT905DataDecoder:
         Returns:
             Dict[str, Any]: Dictionary chứa dữ liệu đã giải mã hoặc thông tin lỗi.
         """
-        # is_valid_data_packet đã được gọi trong read_raw_packet, nhưng có thể gọi lại để an toàn
+        # Checksum đã được HWT905FrameParser xác thực khi tách gói; ở đây chỉ kiểm tra độ dài và header
         if len(raw_packet) != DATA_PACKET_LENGTH or raw_packet[0] != DATA_HEADER_BYTE:
              return {
                 "error": "invalid_packet", 
@@ -154,9 +239,12 @@ class HWT905DataDecoder:
             "checksum": packet_bytes[-1]
         }
 
-        # Sử dụng decoder factory để decode payload
+        # Decode payload: struct biên dịch sẵn unpack thẳng trên frame, hoặc decoder tham chiếu qua factory
         try:
-            payload_data = self.decoder_factory.decode_packet(packet_type, payload)
+            if self.struct_decoder is not None:
+                payload_data = self.struct_decoder.decode_frame(packet_bytes)
+            else:
+                payload_data = self.decoder_factory.decode_packet(packet_type, payload)
             decoded_data.update(payload_data)
         except Exception as e:
             logger.error(f"Lỗi khi decode packet type 0x{packet_type:02X}: {e}")
@@ -165,6 +253,41 @@ class HWT905DataDecoder:
             
         return decoded_data
 
+    def decode_record(self, raw_packet: bytes, offset: int = 0) -> Optional[tuple]:
+        """
+        Giải mã một gói đã xác thực thành bản ghi gọn theo packet type (AngleSample, AccSample, ...)
+        chỉ gồm các trường vật lý. Dùng cho chế độ production; dạng dict đầy đủ (decode_raw_packet)
+        chỉ dùng khi debug.
+        Args:
+            raw_packet: Gói 11 byte, hoặc buffer lớn (ví dụ ring buffer) chứa gói tại offset.
+            offset (int): Vị trí bắt đầu của gói trong raw_packet.
+        Returns:
+            Bản ghi NamedTuple, hoặc None nếu gói không giải mã được.
+        """
+        if self.struct_decoder is not None:
+            return self.struct_decoder.decode_record(raw_packet, offset)
+        if offset or len(raw_packet) > DATA_PACKET_LENGTH:
+            raw_packet = bytes(raw_packet[offset:offset + DATA_PACKET_LENGTH])
+        record_type = RECORD_TYPES.get(raw_packet[1])
+        if record_type is None or len(raw_packet) != DATA_PACKET_LENGTH:
+            return None
+        payload_data = self.decoder_factory.decode_packet(raw_packet[1], raw_packet[2:DATA_PACKET_LENGTH - 1])
+        if "error" in payload_data:
+            return None
+        return record_type(**payload_data)
+
+    def decode_frame_block(self, frames, timestamps=None, validate: bool = False) -> Dict[int, Dict[str, Any]]:
+        """
+        Giải mã cả một khối gói đã xác thực thành các cột NumPy theo packet type (xem NumpyBatchDecoder).
+        Args:
+            frames: Khối N x 11 byte liền nhau, danh sách gói (ví dụ FrameBatch.frames) hoặc mảng uint8 (N, 11).
+            timestamps: Timestamp song song với các gói (tùy chọn), trả về trong cột 'timestamp'.
+            validate (bool): Kiểm tra lại header/checksum và bỏ các gói hỏng.
+        Returns:
+            Dict[int, Dict[str, np.ndarray]]: packet_type -> {tên trường: cột}.
+        """
+        return self.batch_decoder.decode_block(frames, timestamps, validate)
+
     def get_supported_packet_types(self) -> Dict[int, str]:
         """
         Trả về danh sách các packet types được hỗ trợ
@@ -0,0 +1,152 @@
+"""
+Bộ tách gói (framing engine) cho luồng byte của cảm biến HWT905.
+Nhận từng khối byte lớn từ cổng serial, tìm ranh giới gói tin bằng
+bytearray.find thay vì đọc từng byte, xác thực checksum và trả về
+nhiều gói 11 byte hoàn chỉnh trong một lần gọi.
+Phần gói tin chưa đủ ở cuối khối được giữ lại cho lần đọc tiếp theo.
+Khi luồng đã đồng bộ, các dãy gói liền nhau được xác thực hàng loạt bằng NumPy.
+"""
+import logging
+from typing import List, Tuple
+
+import numpy as np
+
+from src.sensors.hwt905_constants import DATA_HEADER_BYTE, DATA_PACKET_LENGTH
+from src.sensors.hwt905_protocol import validate_data_packets
+
+logger = logging.getLogger(__name__)
+
+# Số gói tối thiểu để dùng kiểm tra vector hóa (dưới ngưỡng này vòng lặp Python nhanh hơn)
+VECTORIZED_MIN_FRAMES = 16
+
+
+class HWT905FrameParser:
+    """
+    Tách các gói dữ liệu hợp lệ từ một luồng byte liên tục.
+    Buffer nội bộ được tái sử dụng giữa các lần gọi feed().
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.frames_parsed = 0
+        self.checksum_errors = 0
+        self.bytes_discarded = 0
+
+    def reset(self):
+        """Xóa dữ liệu đang chờ (dùng khi đổi kết nối serial)."""
+        self._buffer.clear()
+
+    @property
+    def pending_bytes(self) -> int:
+        """Số byte đang được giữ lại chờ khối tiếp theo."""
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Đưa một khối byte mới vào parser và lấy ra các gói tin hoàn chỉnh.
+        Args:
+            data (bytes): Khối byte vừa đọc từ serial (có thể rỗng).
+        Returns:
+            List[bytes]: Danh sách các gói 11 byte đã xác thực checksum, theo thứ tự nhận.
+        """
+        buf = self._buffer
+        if data:
+            buf += data
+
+        frames, pos = self._scan(buf, 0, len(buf))
+        if pos:
+            del buf[:pos]
+        return frames
+
+    def parse_region(self, buf: bytearray, start: int, end: int) -> Tuple[List[bytes], int]:
+        """
+        Tách gói trực tiếp trên một vùng của buffer bên ngoài (ví dụ ring buffer)
+        mà không sao chép dữ liệu vào buffer nội bộ.
+        Args:
+            buf (bytearray): Buffer chứa dữ liệu.
+            start (int): Vị trí bắt đầu vùng cần quét.
+            end (int): Vị trí kết thúc (không bao gồm).
+        Returns:
+            Tuple[List[bytes], int]: Các gói hợp lệ và số byte đã tiêu thụ tính từ start.
+            Phần gói chưa đủ ở cuối vùng không được tiêu thụ.
+        """
+        frames, pos = self._scan(buf, start, end)
+        return frames, pos - start
+
+    def parse_region_offsets(self, buf: bytearray, start: int, end: int) -> Tuple[List[int], int]:
+        """
+        Như parse_region nhưng trả về vị trí bắt đầu của từng gói hợp lệ trong buf thay vì bản sao,
+        để bên gọi giải mã tại chỗ (StructPacketDecoder.decode_record(buf, offset)) trước khi
+        giải phóng vùng đã tiêu thụ.
+        Returns:
+            Tuple[List[int], int]: Vị trí các gói hợp lệ và số byte đã tiêu thụ tính từ start.
+        """
+        offsets, pos = self._scan(buf, start, end, offsets=True)
+        return offsets, pos - start
+
+    def _scan(self, buf: bytearray, pos: int, length: int, offsets: bool = False) -> Tuple[List, int]:
+        """
+        Quét buf[pos:length], trả về các gói hợp lệ (bytes, hoặc vị trí trong buf nếu offsets=True)
+        và vị trí đầu tiên chưa được tiêu thụ.
+        """
+        frames: List = []
+        packet_len = DATA_PACKET_LENGTH
+        synced = False
+
+        while True:
+            if synced and length - pos >= VECTORIZED_MIN_FRAMES * packet_len:
+                pos = self._take_aligned_run(buf, pos, length, frames, offsets)
+
+            start = buf.find(DATA_HEADER_BYTE, pos, length)
+            if start < 0:
+                # Không còn header nào, bỏ toàn bộ phần còn lại
+                self.bytes_discarded += length - pos
+                pos = length
+                break
+
+            if start + packet_len > length:
+                # Gói tin chưa đủ, giữ lại cho lần sau
+                self.bytes_discarded += start - pos
+                pos = start
+                break
+
+            self.bytes_discarded += start - pos
+            end = start + packet_len
+            if (sum(buf[start:end - 1]) & 0xFF) == buf[end - 1]:
+                frames.append(start if offsets else bytes(buf[start:end]))
+                pos = end
+                synced = True
+            else:
+                # Checksum sai, có thể là header giả - dịch 1 byte và tìm tiếp
+                self.checksum_errors += 1
+                self.bytes_discarded += 1
+                pos = start + 1
+                synced = False
+
+        self.frames_parsed += len(frames)
+        return frames, pos
+
+    @staticmethod
+    def _take_aligned_run(buf: bytearray, pos: int, length: int, frames: List, offsets: bool = False) -> int:
+        """
+        Xác thực hàng loạt các gói nằm liền nhau bắt đầu tại pos và thêm phần hợp lệ
+        liên tục đầu tiên vào frames (gói hoặc vị trí gói nếu offsets=True).
+        Trả về vị trí ngay sau gói hợp lệ cuối cùng.
+        """
+        packet_len = DATA_PACKET_LENGTH
+        count = (length - pos) // packet_len
+        block = np.frombuffer(buf, dtype=np.uint8, count=count * packet_len, offset=pos)
+        invalid = np.flatnonzero(~validate_data_packets(block))
+        # Bỏ tham chiếu tới buffer trước khi bytearray bị cắt ở cuối feed()
+        del block
+        good = int(invalid[0]) if invalid.size else count
+        if not good:
+            return pos
+
+        end = pos + good * packet_len
+        if offsets:
+            frames.extend(range(pos, end, packet_len))
+            return end
+        run = bytes(buf[pos:end])
+        frames.extend([run[i:i + packet_len] for i in range(0, len(run), packet_len)])
+        return end
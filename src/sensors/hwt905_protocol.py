@@ -3,11 +3,14 @@ Chứa các hàm để mã hóa (tạo) các gói lệnh gửi đến cảm bi
 và xử lý checksum cho cả gói lệnh và gói dữ liệu.
 """
 import logging
+import numpy as np
 
 from src.sensors.hwt905_constants import (
     COMMAND_HEADER_BYTE1, COMMAND_HEADER_BYTE2,
     DATA_HEADER_BYTE,
-    COMMAND_PACKET_LENGTH, DATA_PACKET_LENGTH
+    COMMAND_PACKET_LENGTH, DATA_PACKET_LENGTH,
+    REG_KEY, REG_SAVE, REG_READADDR,
+    UNLOCK_KEY_VALUE_DATAL, UNLOCK_KEY_VALUE_DATAH, SAVE_CONFIG_VALUE
 )
 
 logger = logging.getLogger(__name__)
@@ -55,6 +58,33 @@ def create_write_command(register_address: int, data_value: int) -> bytes:
     logger.debug(f"Đã tạo lệnh ghi: {command.hex().upper()} cho REG {hex(register_address)} với giá trị {hex(data_value)}")
     return command
 
+def create_unlock_command() -> bytes:
+    """
+    Tạo lệnh mở khóa thanh ghi (FF AA 69 88 B5). Phải gửi trước mỗi lệnh ghi cấu hình.
+    Returns:
+        bytes: Gói lệnh mở khóa.
+    """
+    return create_write_command(REG_KEY, (UNLOCK_KEY_VALUE_DATAH << 8) | UNLOCK_KEY_VALUE_DATAL)
+
+def create_save_command() -> bytes:
+    """
+    Tạo lệnh lưu cấu hình hiện tại vào flash của cảm biến (FF AA 00 00 00).
+    Returns:
+        bytes: Gói lệnh lưu cấu hình.
+    """
+    return create_write_command(REG_SAVE, SAVE_CONFIG_VALUE)
+
+def create_read_command(register_address: int) -> bytes:
+    """
+    Tạo lệnh đọc thanh ghi (FF AA 27 ADDR 00). Cảm biến trả lời bằng gói 0x55 0x5F
+    chứa giá trị của 4 thanh ghi liên tiếp bắt đầu từ register_address.
+    Args:
+        register_address (int): Địa chỉ thanh ghi đầu tiên cần đọc.
+    Returns:
+        bytes: Gói lệnh đọc.
+    """
+    return create_write_command(REG_READADDR, register_address & 0xFF)
+
 def is_valid_data_packet(packet_bytes: bytes) -> bool:
     """
     Kiểm tra xem một chuỗi byte có phải là gói dữ liệu hợp lệ không.
@@ -78,4 +108,42 @@ def is_valid_data_packet(packet_bytes: bytes) -> bool:
         logger.debug(f"Lỗi checksum: Tính toán {hex(calculated_checksum)}, nhận được {hex(packet_bytes[-1])}. Gói: {packet_bytes.hex()}")
         return False
         
-    return True
\ No newline at end of file
+    return True
+
+def validate_data_packets(frame_block) -> np.ndarray:
+    """
+    Kiểm tra hàng loạt nhiều gói dữ liệu nằm liền nhau trong một buffer.
+    Buffer được xem như mảng uint8 (N, 11); checksum được tính bằng tổng theo trục 1
+    (tràn số uint8 tương đương AND 0xFF) và so với cột cuối.
+    Args:
+        frame_block: bytes/bytearray/memoryview có độ dài là bội số của 11,
+                     hoặc một mảng numpy uint8 dạng (N, 11).
+    Returns:
+        np.ndarray: Mảng bool độ dài N, True tại các gói có header và checksum hợp lệ.
+    """
+    if isinstance(frame_block, np.ndarray):
+        block = frame_block
+    else:
+        if len(frame_block) % DATA_PACKET_LENGTH:
+            raise ValueError(f"Độ dài buffer ({len(frame_block)}) không phải bội số của {DATA_PACKET_LENGTH}")
+        block = np.frombuffer(frame_block, dtype=np.uint8)
+    block = block.reshape(-1, DATA_PACKET_LENGTH)
+
+    checksums = block[:, :-1].sum(axis=1, dtype=np.uint8)
+    return (block[:, 0] == DATA_HEADER_BYTE) & (checksums == block[:, -1])
+
+def build_data_packet(packet_type: int, payload: bytes) -> bytes:
+    """
+    Tạo một gói dữ liệu 11 byte hoàn chỉnh (55 TYPE PAYLOAD CHECKSUM).
+    Dùng cho simulator, benchmark và kiểm thử giải mã.
+    Args:
+        packet_type (int): Mã loại gói tin (0x50 - 0x5F).
+        payload (bytes): 8 byte payload.
+    Returns:
+        bytes: Gói dữ liệu đã có checksum.
+    """
+    if len(payload) != DATA_PACKET_LENGTH - 3:
+        raise ValueError(f"Payload phải dài {DATA_PACKET_LENGTH - 3} bytes, nhận được {len(payload)}")
+
+    body = bytes([DATA_HEADER_BYTE, packet_type & 0xFF]) + bytes(payload)
+    return body + bytes([calculate_checksum(body)])
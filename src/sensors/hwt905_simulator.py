@@ -0,0 +1,400 @@
+# src/sensors/hwt905_simulator.py
+
+"""
+Giả lập cảm biến HWT905 trên một pseudo-terminal (pty) để đo tải, độ trễ và kết nối lại
+mà không cần cảm biến thật.
+
+Simulator mở một cặp pty: đầu slave được dùng như một cổng serial thật (có thể trỏ tới
+qua SENSOR_UART_PORT, hoặc qua một symlink ổn định giống /dev/serial/by-id), đầu master
+được một luồng ghi phát các gói 0x50 - 0x5A theo mặt nạ RSW và tần số RRATE. Chuyển động
+được tổng hợp bởi MotionModel: nghiêng chậm, rung và yaw quay tròn (quấn qua ±180°).
+
+Nhịp phát theo baudrate: mỗi chu kỳ chiếm len(chu kỳ) * 10 / baudrate giây trên đường
+truyền (8N1) và chỉ được ghi vào pty khi byte cuối "đã truyền xong". Nếu tần số yêu cầu
+vượt quá băng thông, các chu kỳ được phát liền nhau ở tốc độ tối đa của đường truyền và
+các mẫu bị lỡ được bỏ qua (đếm trong late_cycles).
+
+Gói TIME (0x50) mang thời điểm lấy mẫu (wall-clock, độ phân giải ms); sample_times ghi
+lại thời điểm chính xác (ns) theo từng ms để benchmark đo sai số timestamp phía host.
+Simulator cũng trả lời lệnh ghi RSW/RRATE/BAUD (sau lệnh mở khóa) và lệnh đọc thanh ghi
+(gói 0x5F), nên HWT905Configurator và việc dò cổng chạy được trên nó.
+"""
+import logging
+import math
+import os
+import pty
+import random
+import select
+import struct
+import threading
+import time
+import tty
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.sensors.hwt905_constants import (
+    COMMAND_HEADER_BYTE1, COMMAND_HEADER_BYTE2, COMMAND_PACKET_LENGTH,
+    REG_SAVE, REG_RSW, REG_RRATE, REG_BAUD, REG_KEY, REG_READADDR,
+    UNLOCK_KEY_VALUE_DATAL, UNLOCK_KEY_VALUE_DATAH,
+    PACKET_TYPE_TIME, PACKET_TYPE_ACC, PACKET_TYPE_GYRO, PACKET_TYPE_ANGLE, PACKET_TYPE_MAG,
+    PACKET_TYPE_PORT_STATUS, PACKET_TYPE_PRESSURE, PACKET_TYPE_GPS_LONLAT, PACKET_TYPE_GPS_SPEED,
+    PACKET_TYPE_QUATERNION, PACKET_TYPE_GPS_ACCURACY, PACKET_TYPE_READ_REGISTER,
+    SCALE_ACCELERATION, SCALE_ANGULAR_VELOCITY, SCALE_ANGLE, SCALE_TEMPERATURE, SCALE_QUATERNION,
+    SCALE_GPS_ALTITUDE, SCALE_GPS_SPEED, SCALE_GPS_ACCURACY,
+    DATA_PACKET_LENGTH, DEFAULT_RSW_VALUE,
+    OUTPUT_RATE_CODES, BAUD_RATE_CODES
+)
+from src.sensors.hwt905_protocol import build_data_packet
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự gói trong một chu kỳ output: bit RSW -> mã loại gói
+RSW_PACKET_TYPES = [
+    (0, PACKET_TYPE_TIME),
+    (1, PACKET_TYPE_ACC),
+    (2, PACKET_TYPE_GYRO),
+    (3, PACKET_TYPE_ANGLE),
+    (4, PACKET_TYPE_MAG),
+    (5, PACKET_TYPE_PORT_STATUS),
+    (6, PACKET_TYPE_PRESSURE),
+    (7, PACKET_TYPE_GPS_LONLAT),
+    (8, PACKET_TYPE_GPS_SPEED),
+    (9, PACKET_TYPE_QUATERNION),
+    (10, PACKET_TYPE_GPS_ACCURACY),
+]
+
+UART_BITS_PER_BYTE = 10  # 8N1: start + 8 data + stop
+
+
+def packet_types_for_rsw(rsw: int) -> List[int]:
+    """Danh sách mã loại gói được phát trong mỗi chu kỳ với giá trị RSW cho trước."""
+    return [packet_type for bit, packet_type in RSW_PACKET_TYPES if rsw & (1 << bit)]
+
+
+def _int16(value: float) -> int:
+    return max(-32768, min(32767, int(round(value))))
+
+
+class MotionModel:
+    """
+    Chuyển động tổng hợp: nghiêng chậm quanh roll/pitch, rung ở tần số vibration_hz
+    và yaw quay đều (quấn trong [-180, 180)). Góc, vận tốc góc và gia tốc nhất quán với nhau.
+    """
+
+    def __init__(self,
+                 tilt_amplitude_deg: float = 15.0,
+                 tilt_period_s: float = 20.0,
+                 vibration_hz: float = 12.0,
+                 vibration_amplitude_deg: float = 0.3,
+                 vibration_accel_g: float = 0.05,
+                 yaw_rate_dps: float = 30.0,
+                 noise_deg: float = 0.02,
+                 seed: int = 905):
+        """
+        Args:
+            tilt_amplitude_deg (float): Biên độ nghiêng chậm của roll/pitch (độ).
+            tilt_period_s (float): Chu kỳ nghiêng chậm (giây).
+            vibration_hz (float): Tần số rung (Hz).
+            vibration_amplitude_deg (float): Biên độ rung góc (độ).
+            vibration_accel_g (float): Biên độ rung gia tốc theo trục Z (g).
+            yaw_rate_dps (float): Tốc độ quay yaw (độ/giây); yaw quấn qua ±180°.
+            noise_deg (float): Độ lệch chuẩn nhiễu Gauss trên góc (độ).
+            seed (int): Hạt giống cho nhiễu, để dữ liệu lặp lại được.
+        """
+        self.tilt_amplitude = tilt_amplitude_deg
+        self.tilt_omega = 2 * math.pi / tilt_period_s if tilt_period_s > 0 else 0.0
+        self.vibration_omega = 2 * math.pi * vibration_hz
+        self.vibration_amplitude = vibration_amplitude_deg
+        self.vibration_accel = vibration_accel_g
+        self.yaw_rate = yaw_rate_dps
+        self.noise = noise_deg
+        self._rng = random.Random(seed)
+
+    def state(self, t: float) -> Dict[str, float]:
+        """Trạng thái cảm biến tại thời điểm t (giây kể từ khi bắt đầu)."""
+        tilt_phase = self.tilt_omega * t
+        vib_phase = self.vibration_omega * t
+        vib = self.vibration_amplitude * math.sin(vib_phase)
+        noise = self._rng.gauss
+
+        roll = self.tilt_amplitude * math.sin(tilt_phase) + vib + noise(0.0, self.noise)
+        pitch = 0.6 * self.tilt_amplitude * math.sin(tilt_phase + math.pi / 3) + 0.5 * vib + noise(0.0, self.noise)
+        yaw = (self.yaw_rate * t + 180.0) % 360.0 - 180.0
+
+        vib_rate = self.vibration_amplitude * self.vibration_omega * math.cos(vib_phase)
+        gyro_x = self.tilt_amplitude * self.tilt_omega * math.cos(tilt_phase) + vib_rate
+        gyro_y = 0.6 * self.tilt_amplitude * self.tilt_omega * math.cos(tilt_phase + math.pi / 3) + 0.5 * vib_rate
+        gyro_z = self.yaw_rate
+
+        r, p, y = math.radians(roll), math.radians(pitch), math.radians(yaw)
+        acc_x = -math.sin(p)
+        acc_y = math.sin(r) * math.cos(p)
+        acc_z = math.cos(r) * math.cos(p) + self.vibration_accel * math.sin(vib_phase)
+
+        # Quaternion từ góc Euler (ZYX)
+        cr, sr = math.cos(r / 2), math.sin(r / 2)
+        cp, sp = math.cos(p / 2), math.sin(p / 2)
+        cy, sy = math.cos(y / 2), math.sin(y / 2)
+
+        return {
+            "roll": roll, "pitch": pitch, "yaw": yaw,
+            "gyro_x": gyro_x, "gyro_y": gyro_y, "gyro_z": gyro_z,
+            "acc_x": acc_x, "acc_y": acc_y, "acc_z": acc_z,
+            "mag_x": 300.0 * math.cos(y), "mag_y": -300.0 * math.sin(y), "mag_z": -450.0,
+            "q0": cr * cp * cy + sr * sp * sy,
+            "q1": sr * cp * cy - cr * sp * sy,
+            "q2": cr * sp * cy + sr * cp * sy,
+            "q3": cr * cp * sy - sr * sp * cy,
+            "temperature": 25.0 + 0.5 * math.sin(t / 600.0),
+        }
+
+
+class HWT905FrameSynthesizer:
+    """Mã hóa trạng thái của MotionModel thành các gói HWT905 của một chu kỳ output."""
+
+    def __init__(self, motion: MotionModel, rsw: int = DEFAULT_RSW_VALUE):
+        self.motion = motion
+        self.rsw = rsw
+
+    def _payload(self, packet_type: int, s: Dict[str, float], sample_wall: float) -> bytes:
+        temp = _int16(s["temperature"] * SCALE_TEMPERATURE)
+        if packet_type == PACKET_TYPE_TIME:
+            moment = datetime.fromtimestamp(sample_wall)
+            return struct.pack('<BBBBBBH', moment.year % 100, moment.month, moment.day,
+                               moment.hour, moment.minute, moment.second, moment.microsecond // 1000)
+        if packet_type == PACKET_TYPE_ACC:
+            return struct.pack('<hhhh', _int16(s["acc_x"] * SCALE_ACCELERATION), _int16(s["acc_y"] * SCALE_ACCELERATION),
+                               _int16(s["acc_z"] * SCALE_ACCELERATION), temp)
+        if packet_type == PACKET_TYPE_GYRO:
+            return struct.pack('<hhhh', _int16(s["gyro_x"] * SCALE_ANGULAR_VELOCITY),
+                               _int16(s["gyro_y"] * SCALE_ANGULAR_VELOCITY),
+                               _int16(s["gyro_z"] * SCALE_ANGULAR_VELOCITY), temp)
+        if packet_type == PACKET_TYPE_ANGLE:
+            return struct.pack('<hhhh', _int16(s["roll"] * SCALE_ANGLE), _int16(s["pitch"] * SCALE_ANGLE),
+                               _int16(s["yaw"] * SCALE_ANGLE), temp)
+        if packet_type == PACKET_TYPE_MAG:
+            return struct.pack('<hhhh', _int16(s["mag_x"]), _int16(s["mag_y"]), _int16(s["mag_z"]), temp)
+        if packet_type == PACKET_TYPE_PORT_STATUS:
+            return bytes(8)
+        if packet_type == PACKET_TYPE_PRESSURE:
+            return struct.pack('<ii', 101325, int(12.0 * SCALE_GPS_ALTITUDE))
+        if packet_type == PACKET_TYPE_GPS_LONLAT:
+            return struct.pack('<II', 1058542000, 210285000)
+        if packet_type == PACKET_TYPE_GPS_SPEED:
+            return struct.pack('<Ihh', int(0.0 * SCALE_GPS_SPEED), int(12.0 * SCALE_GPS_ALTITUDE), _int16(s["yaw"] * 100.0))
+        if packet_type == PACKET_TYPE_QUATERNION:
+            return struct.pack('<hhhh', *(_int16(s[k] * SCALE_QUATERNION) for k in ("q0", "q1", "q2", "q3")))
+        if packet_type == PACKET_TYPE_GPS_ACCURACY:
+            return struct.pack('<hhhh', 9, int(1.2 * SCALE_GPS_ACCURACY), int(0.9 * SCALE_GPS_ACCURACY),
+                               int(1.5 * SCALE_GPS_ACCURACY))
+        return bytes(8)
+
+    def cycle(self, t: float, sample_wall: float) -> bytes:
+        """
+        Tạo các gói của một chu kỳ output.
+        Args:
+            t (float): Thời điểm lấy mẫu tính từ lúc bắt đầu (giây), cho MotionModel.
+            sample_wall (float): Thời điểm lấy mẫu dạng Unix timestamp, ghi vào gói TIME.
+        """
+        state = self.motion.state(t)
+        return b''.join(build_data_packet(packet_type, self._payload(packet_type, state, sample_wall))
+                        for packet_type in packet_types_for_rsw(self.rsw))
+
+
+class PtyHWT905Simulator:
+    """
+    Một cảm biến HWT905 giả lập trên pty. Dùng start()/unplug() để mô phỏng cắm/rút cáp.
+    """
+
+    def __init__(self,
+                 rate_hz: float = 200.0,
+                 rsw: int = DEFAULT_RSW_VALUE,
+                 baudrate: int = 115200,
+                 motion: Optional[MotionModel] = None,
+                 link_path: Optional[str] = None,
+                 sample_log_size: int = 100000):
+        """
+        Args:
+            rate_hz (float): Tần số output (chu kỳ/s), tương đương RRATE.
+            rsw (int): Mặt nạ nội dung output (RSW).
+            baudrate (int): Baudrate giả lập dùng để giới hạn nhịp phát; 0 để bỏ giới hạn.
+            motion (Optional[MotionModel]): Mô hình chuyển động, mặc định MotionModel().
+            link_path (Optional[str]): Symlink ổn định trỏ tới đầu slave (tạo khi start, xóa khi unplug).
+            sample_log_size (int): Số thời điểm lấy mẫu gần nhất được giữ trong sample_times.
+        """
+        if rate_hz <= 0:
+            raise ValueError("rate_hz phải lớn hơn 0")
+        self.master_fd, self.slave_fd = pty.openpty()
+        # Raw mode ngay từ đầu để byte như 0x03/0x0D trong gói tin không bị line discipline xử lý
+        tty.setraw(self.slave_fd)
+        self.tty_name = os.ttyname(self.slave_fd)
+        self.link_path = link_path
+        self.port = link_path or self.tty_name
+
+        self.rate_hz = rate_hz
+        self.baudrate = baudrate
+        self.synthesizer = HWT905FrameSynthesizer(motion or MotionModel(), rsw)
+        self.registers: Dict[int, int] = {
+            REG_RSW: rsw,
+            REG_RRATE: OUTPUT_RATE_CODES.get(rate_hz, 0),
+            REG_BAUD: BAUD_RATE_CODES.get(baudrate, 0),
+        }
+
+        self.cycle_count = 0
+        self.byte_count = 0
+        self.late_cycles = 0  # Chu kỳ bị dồn vì vượt băng thông baudrate
+        # Thời điểm lấy mẫu chính xác (Unix ns) theo khóa ms ghi trong gói TIME
+        self.sample_times: "OrderedDict[int, int]" = OrderedDict()
+        self._sample_log_size = sample_log_size
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="HWT905Sim-writer")
+        self._command_reader = threading.Thread(target=self._command_loop, daemon=True, name="HWT905Sim-commands")
+
+    @property
+    def rsw(self) -> int:
+        return self.synthesizer.rsw
+
+    def cycle_bytes(self) -> int:
+        return len(packet_types_for_rsw(self.rsw)) * DATA_PACKET_LENGTH
+
+    def max_rate_hz(self) -> float:
+        """Tần số output tối đa mà baudrate hiện tại truyền được với RSW hiện tại."""
+        if not self.baudrate or not self.cycle_bytes():
+            return float('inf')
+        return self.baudrate / UART_BITS_PER_BYTE / self.cycle_bytes()
+
+    def start(self):
+        if self.rate_hz > self.max_rate_hz():
+            logger.warning(f"Tần số {self.rate_hz:g} Hz vượt băng thông {self.baudrate} bps "
+                           f"({self.cycle_bytes()} bytes/chu kỳ, tối đa {self.max_rate_hz():.0f} Hz).")
+        self._writer.start()
+        self._command_reader.start()
+        if self.link_path:
+            tmp_path = f"{self.link_path}.tmp"
+            os.symlink(self.tty_name, tmp_path)
+            os.replace(tmp_path, self.link_path)  # Xuất hiện nguyên tử, giống udev
+        logger.info(f"Simulator HWT905 trên {self.port}: {self.rate_hz:g} Hz, RSW=0x{self.rsw:04X}, {self.baudrate} bps")
+
+    def _record_sample(self, wall_ns: int):
+        self.sample_times[wall_ns // 1_000_000] = wall_ns
+        if len(self.sample_times) > self._sample_log_size:
+            self.sample_times.popitem(last=False)
+
+    def _write_loop(self):
+        mono_start = time.monotonic_ns()
+        wall_start = time.time_ns()
+        next_sample = mono_start
+        line_free_at = mono_start  # Thời điểm đường truyền rảnh (ns)
+        try:
+            while not self._stop.is_set():
+                with self._lock:
+                    period_ns = int(1e9 / self.rate_hz)
+                    byte_ns = UART_BITS_PER_BYTE * 1e9 / self.baudrate if self.baudrate else 0.0
+
+                    cycle_ns = int(self.cycle_bytes() * byte_ns)
+
+                    now = time.monotonic_ns()
+                    out = bytearray()
+                    # Phát mọi chu kỳ đã tới hạn và đã truyền xong trên đường truyền giả lập
+                    while next_sample <= now:
+                        if line_free_at > next_sample:
+                            # Đường truyền còn bận: cảm biến gửi mẫu mới nhất khi rảnh, bỏ các mẫu bị lỡ
+                            self.late_cycles += 1
+                            next_sample = line_free_at
+                        if next_sample + cycle_ns > now:
+                            break
+                        sample_wall_ns = wall_start + (next_sample - mono_start)
+                        out += self.synthesizer.cycle((next_sample - mono_start) / 1e9, sample_wall_ns / 1e9)
+                        self._record_sample(sample_wall_ns)
+                        self.cycle_count += 1
+                        line_free_at = next_sample + cycle_ns
+                        next_sample += period_ns
+                    wake_at = max(next_sample, line_free_at) + cycle_ns
+
+                if out:
+                    os.write(self.master_fd, out)
+                    self.byte_count += len(out)
+                delay = (wake_at - time.monotonic_ns()) / 1e9
+                if delay > 0:
+                    self._stop.wait(delay)
+        except OSError:
+            pass  # pty đã bị đóng
+
+    def _command_loop(self):
+        """Đọc lệnh host gửi tới (FF AA ADDR DATAL DATAH) và cập nhật thanh ghi như cảm biến thật."""
+        buffer = b''
+        unlocked = False
+        while not self._stop.is_set():
+            try:
+                readable, _, _ = select.select([self.master_fd], [], [], 0.2)
+                if not readable:
+                    continue
+                buffer += os.read(self.master_fd, 256)
+            except (OSError, ValueError):
+                return
+            while True:
+                start = buffer.find(bytes([COMMAND_HEADER_BYTE1, COMMAND_HEADER_BYTE2]))
+                if start < 0:
+                    buffer = buffer[-1:]
+                    break
+                if len(buffer) - start < COMMAND_PACKET_LENGTH:
+                    buffer = buffer[start:]
+                    break
+                address, data_low, data_high = buffer[start + 2:start + COMMAND_PACKET_LENGTH]
+                buffer = buffer[start + COMMAND_PACKET_LENGTH:]
+                unlocked = self._handle_command(address, data_low | (data_high << 8), unlocked)
+
+    def _handle_command(self, address: int, value: int, unlocked: bool) -> bool:
+        """Xử lý một lệnh; trả về trạng thái mở khóa cho lệnh kế tiếp."""
+        if address == REG_KEY:
+            return value == ((UNLOCK_KEY_VALUE_DATAH << 8) | UNLOCK_KEY_VALUE_DATAL)
+        if address == REG_READADDR:
+            values = [self.registers.get(value + i, 0) for i in range(4)]
+            response = build_data_packet(PACKET_TYPE_READ_REGISTER, struct.pack('<HHHH', *values))
+            try:
+                os.write(self.master_fd, response)
+            except OSError:
+                pass
+            return unlocked
+        if not unlocked:
+            logger.debug(f"Simulator bỏ qua lệnh ghi 0x{address:02X} khi chưa mở khóa")
+            return False
+        if address == REG_SAVE:
+            return False
+
+        with self._lock:
+            self.registers[address] = value
+            if address == REG_RSW:
+                self.synthesizer.rsw = value
+            elif address == REG_RRATE:
+                rate = next((hz for hz, code in OUTPUT_RATE_CODES.items() if code == (value & 0x0F)), None)
+                if rate:
+                    self.rate_hz = rate
+            elif address == REG_BAUD:
+                baud = next((bps for bps, code in BAUD_RATE_CODES.items() if code == (value & 0x0F)), None)
+                if baud:
+                    self.baudrate = baud
+        logger.info(f"Simulator: thanh ghi 0x{address:02X} = 0x{value:04X}")
+        return False
+
+    def unplug(self):
+        """Mô phỏng rút cáp: xóa symlink, dừng phát và đóng cả hai đầu pty."""
+        self._stop.set()
+        if self.link_path and os.path.lexists(self.link_path):
+            os.remove(self.link_path)
+        self._writer.join(timeout=1)
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.unplug()
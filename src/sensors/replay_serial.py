@@ -0,0 +1,254 @@
+# src/sensors/replay_serial.py
+
+"""
+Nguồn serial đọc từ file ghi byte thô (raw capture) của cảm biến HWT905.
+
+ReplaySerial cài đặt phần giao diện serial.Serial mà HWT905DataDecoder dùng
+(read, readinto, in_waiting, is_open, timeout, reset_input_buffer), nên có thể gắn vào
+toàn bộ pipeline đọc -> giải mã -> StorageManager thay cho cổng thật. Nguồn có thể là:
+  - file byte thô liền mạch (ví dụ `cat /dev/ttyUSB0 > capture.bin`);
+  - segment do RawCaptureWriter ghi (.hwtraw), một danh sách segment hoặc cả thư mục segment.
+Có hai chế độ:
+  - nhanh nhất có thể: byte được trả ngay, chỉ giới hạn bởi kernel_buffer như driver;
+  - theo thời gian thực: segment được phát đúng nhịp monotonic đã ghi của từng khối; file byte
+    thô được phát với tốc độ output_rate_hz * kích thước chu kỳ (ước lượng từ đầu file).
+    Cả hai nhân với speed.
+File được đọc tuần tự qua bộ đệm, không nạp toàn bộ vào bộ nhớ.
+Với segment, last_read_mono_ns/last_read_wall_ns cho biết thời điểm đọc đã ghi của khối chứa byte cuối
+cùng vừa đọc, để pipeline gán timestamp theo thời điểm thu nhận gốc thay vì thời điểm phát lại.
+"""
+import logging
+import os
+import time
+from collections import deque
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+from src import config
+from src.sensors.hwt905_constants import DATA_PACKET_LENGTH
+from src.sensors.hwt905_frame_parser import HWT905FrameParser
+from src.storage.raw_capture import is_raw_segment, iter_segment_chunks, list_segments
+
+logger = logging.getLogger(__name__)
+
+CYCLE_SAMPLE_BYTES = 64 * 1024  # Số byte đầu file dùng để ước lượng kích thước chu kỳ
+EOF_IDLE_SECONDS = 0.005        # Thời gian chờ mỗi lần đọc khi đã hết file (không lặp)
+RELEASE_STEP_SECONDS = 0.001    # Độ mịn phát file byte thô theo thời gian thực
+
+
+def estimate_cycle_bytes(sample: bytes) -> int:
+    """
+    Ước lượng số byte của một chu kỳ output từ một đoạn luồng: đếm số gói giữa hai lần
+    xuất hiện liên tiếp của loại gói đầu tiên. Trả về DATA_PACKET_LENGTH nếu không xác định được.
+    """
+    frames = HWT905FrameParser().feed(sample)
+    if not frames:
+        return DATA_PACKET_LENGTH
+    first_type = frames[0][1]
+    starts = [i for i, frame in enumerate(frames) if frame[1] == first_type]
+    if len(starts) < 2:
+        return len(frames) * DATA_PACKET_LENGTH
+    frames_per_cycle = (starts[-1] - starts[0]) / (len(starts) - 1)
+    # Tính cả byte rác/gói hỏng trong đoạn mẫu để tốc độ phát khớp với thực tế
+    bytes_per_frame = len(sample) / len(frames)
+    return max(DATA_PACKET_LENGTH, int(round(frames_per_cycle * bytes_per_frame)))
+
+
+class ReplaySerial:
+    """
+    Phát lại một file raw capture (hoặc các segment raw capture) như một cổng serial.
+    """
+
+    def __init__(self,
+                 path: Union[str, Sequence[str]],
+                 realtime: bool = False,
+                 output_rate_hz: float = config.SENSOR_OUTPUT_RATE_HZ,
+                 speed: float = 1.0,
+                 loop: bool = False,
+                 timeout: float = 0.5,
+                 kernel_buffer: int = 4096):
+        """
+        Args:
+            path (Union[str, Sequence[str]]): File byte thô, segment, danh sách segment hoặc thư mục segment.
+            realtime (bool): True để phát theo nhịp thời gian thực, False để phát nhanh nhất có thể.
+            output_rate_hz (float): Tần số output lúc ghi file byte thô (chỉ dùng khi realtime;
+                segment dùng thời điểm đã ghi).
+            speed (float): Hệ số tốc độ khi realtime (2.0 = nhanh gấp đôi).
+            loop (bool): Quay lại đầu nguồn khi hết dữ liệu.
+            timeout (float): Thời gian chờ tối đa của read() khi chưa có byte nào (giây).
+            kernel_buffer (int): Giới hạn in_waiting, mô phỏng bộ đệm driver.
+        """
+        self.paths: List[str] = []
+        for item in ([path] if isinstance(path, str) else path):
+            self.paths.extend(list_segments(item))
+        if not self.paths:
+            raise FileNotFoundError(f"Không có dữ liệu raw capture trong {path}")
+        self.port = self.paths[0] if len(self.paths) == 1 else f"{self.paths[0]} (+{len(self.paths) - 1} segment)"
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self.timeout = timeout
+        self.baudrate = 0
+        self.kernel_buffer = kernel_buffer
+        self._size = sum(os.path.getsize(p) for p in self.paths)
+        self.bytes_read = 0
+        self.loops = 0
+        self.is_open = True
+
+        self.byte_rate = 0.0
+        plain_files = [p for p in self.paths if not is_raw_segment(p)]
+        if realtime and plain_files:
+            with open(plain_files[0], 'rb') as f:
+                cycle_bytes = estimate_cycle_bytes(f.read(CYCLE_SAMPLE_BYTES))
+            self.byte_rate = cycle_bytes * output_rate_hz * speed
+            logger.info(f"Phát lại {self.port} theo thời gian thực: {cycle_bytes} bytes/chu kỳ, "
+                        f"{output_rate_hz:g} Hz x{speed:g} = {self.byte_rate:.0f} bytes/s")
+
+        self._buffer = bytearray()  # Byte đã 'phát' nhưng chưa được đọc
+        # Mốc (vị trí kết thúc trong luồng, monotonic_ns, wall_ns) của các khối segment còn trong bộ đệm
+        self._chunk_marks = deque()
+        self._pumped = 0    # Tổng số byte đã đưa vào bộ đệm
+        self._consumed = 0  # Tổng số byte đã lấy ra (đọc hoặc bị bỏ bởi reset_input_buffer)
+        self.last_read_mono_ns: Optional[int] = None  # Thời điểm đã ghi của khối vừa đọc (None: file byte thô)
+        self.last_read_wall_ns: Optional[int] = None
+        self._restart()
+
+    @property
+    def size(self) -> int:
+        """Tổng kích thước các file nguồn (byte, gồm cả header segment)."""
+        return self._size
+
+    @property
+    def exhausted(self) -> bool:
+        """True khi đã đọc hết nguồn và không lặp lại."""
+        return not self.loop and self._next is None and not self._buffer
+
+    def _iter_chunks(self) -> Iterator[Tuple[float, bytes, Optional[int], Optional[int]]]:
+        """
+        Duyệt toàn bộ nguồn theo thứ tự.
+        Yields:
+            Tuple[float, bytes, Optional[int], Optional[int]]: (thời điểm phát tính từ lúc bắt đầu (giây),
+            khối byte, monotonic_ns và wall_ns đã ghi của khối hoặc None với file byte thô).
+        """
+        offset = 0.0  # Thời điểm phát của khối cuối cùng trong các file trước
+        for path in self.paths:
+            if is_raw_segment(path):
+                first_mono = None
+                release = offset
+                for mono_ns, wall_ns, data in iter_segment_chunks(path):
+                    if first_mono is None:
+                        first_mono = mono_ns
+                    if self.realtime:
+                        release = offset + (mono_ns - first_mono) / 1e9 / self.speed
+                    yield release, data, mono_ns, wall_ns
+                offset = release
+                continue
+
+            step = max(1, int(self.byte_rate * RELEASE_STEP_SECONDS)) if self.realtime else self.kernel_buffer
+            position = 0
+            with open(path, 'rb', buffering=1024 * 1024) as f:
+                while True:
+                    data = f.read(step)
+                    if not data:
+                        break
+                    position += len(data)
+                    yield (offset + position / self.byte_rate if self.realtime else 0.0), data, None, None
+            if self.realtime:
+                offset += position / self.byte_rate
+
+    def _restart(self):
+        self._chunks = self._iter_chunks()
+        self._next = next(self._chunks, None)
+        self._start = time.monotonic()
+
+    def _pump(self, limit: Optional[int] = None):
+        """Chuyển các khối đã tới thời điểm phát vào bộ đệm, tối đa tới `limit` byte."""
+        limit = self.kernel_buffer if limit is None else limit
+        if self._next is None and self.loop and not self._buffer:
+            self._restart()
+            self.loops += 1
+        now = time.monotonic() - self._start
+        while self._next is not None and len(self._buffer) < limit and self._next[0] <= now:
+            _, data, mono_ns, wall_ns = self._next
+            self._buffer += data
+            self._pumped += len(data)
+            if wall_ns is not None:
+                self._chunk_marks.append((self._pumped, mono_ns, wall_ns))
+            self._next = next(self._chunks, None)
+
+    def _consume(self, count: int):
+        """Ghi nhận count byte vừa lấy khỏi bộ đệm và cập nhật thời điểm đã ghi của khối chứa byte cuối."""
+        self._consumed += count
+        marks = self._chunk_marks
+        while marks and marks[0][0] < self._consumed:
+            marks.popleft()
+        if marks:
+            _, self.last_read_mono_ns, self.last_read_wall_ns = marks[0]
+
+    @property
+    def in_waiting(self) -> int:
+        self._pump()
+        return min(len(self._buffer), self.kernel_buffer)
+
+    def _wait_for_data(self) -> int:
+        """Chờ tới khi có byte để đọc hoặc hết timeout. Returns: số byte có thể đọc."""
+        available = self.in_waiting
+        if available or not self.is_open:
+            return available
+        if self.exhausted:
+            time.sleep(min(self.timeout, EOF_IDLE_SECONDS))
+            return 0
+        deadline = time.monotonic() + self.timeout
+        while True:
+            # Ngủ tới khi khối tiếp theo được phát, không quá deadline
+            next_release_at = self._start + self._next[0] if self._next is not None else deadline
+            delay = min(next_release_at, deadline) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            available = self.in_waiting
+            if available or time.monotonic() >= deadline:
+                return available
+
+    def _take(self, size: int) -> bytes:
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.bytes_read += len(data)
+        self._consume(len(data))
+        return data
+
+    def read(self, size: int = 1) -> bytes:
+        available = self._wait_for_data()
+        if not available:
+            return b''
+        return self._take(min(size, available))
+
+    def readinto(self, buffer) -> int:
+        available = self._wait_for_data()
+        if not available:
+            return 0
+        view = memoryview(buffer)
+        count = min(len(view), available)
+        view[:count] = self._buffer[:count]
+        del self._buffer[:count]
+        self.bytes_read += count
+        self._consume(count)
+        return count
+
+    def reset_input_buffer(self):
+        """Bỏ phần dữ liệu đã phát nhưng chưa đọc (như xóa bộ đệm driver)."""
+        if self.realtime:
+            self._pump(limit=float('inf'))
+            self._consumed += len(self._buffer)
+            self._buffer.clear()
+
+    def write(self, data: bytes) -> int:
+        """Lệnh gửi tới cảm biến bị bỏ qua khi phát lại."""
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.is_open:
+            self._chunks.close()
+            self._next = None
+            self.is_open = False
@@ -0,0 +1,327 @@
+# src/storage/background_writer.py
+"""
+Luồng ghi nền cho StorageManager với bộ đệm kép.
+
+Luồng giải mã (hoặc runtime asyncio) chỉ thêm dòng/gói vào bộ đệm trước; luồng ghi đổi bộ đệm
+trước lấy bộ đệm sau rồi ghi cả khối xuống StorageManager bên dưới. Khi thẻ SD khựng (dọn rác
+100+ ms), chỉ luồng ghi bị chặn; bộ đệm trước tiếp tục nhận dữ liệu, nên hàng đợi gói thô và
+luồng đọc serial không bị dồn ứ. Khi bộ đệm trước đầy trong lúc luồng ghi còn bận:
+    "block": bên ghi chờ tới lần đổi bộ đệm kế tiếp (không mất dữ liệu, nhưng dồn ngược lên pipeline)
+    "spill": tiếp tục giữ trong RAM tới spill_max_rows dòng; vượt ngưỡng thì bỏ dòng mới và đếm lại.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .storage_manager import StorageManager, format_durability_stats
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "spill")
+
+
+def format_writer_stats(stats: Dict[str, float]) -> str:
+    """Mô tả số liệu của luồng ghi (BackgroundStorageWriter.writer_stats) cho log định kỳ."""
+    text = (f"{stats['write_count']} lần ghi ({stats['rows_written']} dòng), TB {stats['write_mean_ms']:.1f}ms / "
+            f"max {stats['write_max_ms']:.1f}ms, khựng (≥{stats['stall_threshold_ms']:.0f}ms): {stats['stall_count']} lần "
+            f"({stats['stall_total_ms']:.0f}ms), tồn đọng max {stats['backlog_max']} dòng")
+    if stats['blocked_count']:
+        text += f", bên ghi bị chặn {stats['blocked_count']} lần (max {stats['blocked_max_ms']:.1f}ms)"
+    if stats['spilled_rows'] or stats['dropped_rows']:
+        text += f", tràn RAM {stats['spilled_rows']} dòng, bỏ {stats['dropped_rows']} dòng"
+    return text
+
+
+def shutdown_storage(storage_manager):
+    """
+    Đóng storage khi ứng dụng/pipeline dừng: với BackgroundStorageWriter, ghi hết dữ liệu đang chờ,
+    đóng file và dừng luồng ghi; với StorageManager thường chỉ đóng file đang mở.
+    """
+    if isinstance(storage_manager, BackgroundStorageWriter):
+        storage_manager.stop()
+    else:
+        storage_manager.close_current_file()
+
+
+class BackgroundStorageWriter:
+    """
+    Bọc một StorageManager: write_batch/write_frames/write_data/write_frame chỉ thêm vào bộ đệm trước
+    và trả về ngay; luồng ghi nền gọi StorageManager bên dưới và áp dụng chính sách flush/fsync của nó.
+    flush, sync, close_current_file, set_fields_to_write và durability_stats được thực hiện trên luồng ghi
+    sau khi ghi hết dữ liệu đã nhận, và chờ tới khi xong. Thuộc tính khác (fields_to_write,
+    add_fields_listener, ...) được chuyển thẳng tới StorageManager bên dưới.
+    """
+    # Số liệu flush/fsync được log định kỳ trên chính luồng ghi (xem _log_rates)
+    logs_durability = True
+
+    def __init__(self,
+                 storage_manager: StorageManager,
+                 buffer_rows: int = 2000,
+                 overflow_policy: str = "block",
+                 spill_max_rows: int = 60000,
+                 stall_ms: float = 100.0,
+                 idle_interval: float = 0.1,
+                 name: str = "StorageWriter"):
+        """
+        Args:
+            storage_manager: StorageManager thực hiện việc ghi (CSV, nhị phân hoặc gói thô).
+            buffer_rows: Dung lượng bộ đệm trước (dòng hoặc gói) trước khi áp dụng overflow_policy.
+            overflow_policy: "block" hoặc "spill" (xem mô tả module).
+            spill_max_rows: Giới hạn số dòng giữ trong RAM với "spill"; vượt quá thì bỏ dòng mới.
+            stall_ms: Một lần ghi lâu hơn ngưỡng này được tính là khựng.
+            idle_interval: Chu kỳ áp dụng chính sách flush/fsync khi không có dữ liệu mới (giây).
+            name: Tên luồng ghi.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Chính sách tràn bộ đệm không hợp lệ: '{overflow_policy}'. "
+                             f"Hợp lệ: {', '.join(OVERFLOW_POLICIES)}")
+        self.storage_manager = storage_manager
+        self.stores_frames = getattr(storage_manager, "stores_frames", False)
+        self.buffer_rows = max(1, buffer_rows)
+        self.overflow_policy = overflow_policy
+        self.spill_max_rows = max(self.buffer_rows, spill_max_rows)
+        self.stall_threshold = stall_ms / 1000.0
+        self.idle_interval = idle_interval
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._front: List[Any] = []  # Bộ đệm trước: bên ghi thêm vào
+        self._front_captured_at = 0.0  # Thời điểm thu nhận (monotonic) của dòng cũ nhất trong bộ đệm trước
+        self._back_size = 0          # Số phần tử luồng ghi đang ghi (bộ đệm sau)
+        self._requests: List[Tuple[Callable[[], None], threading.Event]] = []
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._last_drop_log = 0.0
+        self.last_log_time = time.time()
+        self._reset_writer_stats()
+
+    def __getattr__(self, name: str):
+        # Chỉ được gọi với thuộc tính không có trên wrapper
+        if name == "storage_manager":
+            raise AttributeError(name)
+        return getattr(self.storage_manager, name)
+
+    # ------------------------------------------------------------------
+    # Phía bên ghi (luồng giải mã / runtime asyncio)
+    # ------------------------------------------------------------------
+    def write_batch(self, rows: Sequence[Dict[str, Any]], captured_at: Optional[float] = None):
+        """Nhận một lô dòng; dict dòng không được sửa sau khi đã chuyển cho writer."""
+        self._check_item_kind(frames=False)
+        self._enqueue(rows, captured_at)
+
+    def write_data(self, data: Dict[str, Any]):
+        self._check_item_kind(frames=False)
+        self._enqueue((data,))
+
+    def write_frames(self, records: Sequence[Tuple[bytes, float]], captured_at: Optional[float] = None):
+        """Nhận một lô (gói 11 byte, timestamp) cho RawFrameStorageManager."""
+        self._check_item_kind(frames=True)
+        self._enqueue(records, captured_at)
+
+    def write_frame(self, frame: bytes, timestamp: float):
+        self._check_item_kind(frames=True)
+        self._enqueue(((frame, timestamp),))
+
+    def _check_item_kind(self, frames: bool):
+        """Báo lỗi ngay tại bên ghi (không phải trên luồng ghi) khi kiểu dữ liệu không khớp storage bên dưới."""
+        if frames != self.stores_frames:
+            expected = "write_frame()/write_frames()" if self.stores_frames else "write_data()/write_batch()"
+            raise TypeError(f"{type(self.storage_manager).__name__} nhận dữ liệu qua {expected}")
+
+    def check_durability(self, now: Optional[float] = None):
+        """Không làm gì: luồng ghi tự áp dụng chính sách flush/fsync, kể cả khi không có dữ liệu mới."""
+
+    def _enqueue(self, items: Sequence[Any], captured_at: Optional[float] = None):
+        if not items:
+            return
+        if captured_at is None:
+            captured_at = time.monotonic()
+        with self._cond:
+            self._ensure_started()
+            pending = len(self._front)
+            if pending >= self.buffer_rows:
+                if self.overflow_policy == "block":
+                    start = time.monotonic()
+                    while len(self._front) >= self.buffer_rows and self._thread.is_alive():
+                        self._cond.wait(self.idle_interval)
+                    blocked = time.monotonic() - start
+                    self.blocked_count += 1
+                    self.blocked_time_total += blocked
+                    self.blocked_time_max = max(self.blocked_time_max, blocked)
+                elif pending + len(items) > self.spill_max_rows:
+                    self.dropped_rows += len(items)
+                    now = time.monotonic()
+                    if now - self._last_drop_log >= 10.0:
+                        self._last_drop_log = now
+                        logger.warning(f"[{self.name}] Bộ đệm ghi vượt {self.spill_max_rows} dòng, "
+                                       f"bỏ dữ liệu mới (đã bỏ {self.dropped_rows} dòng)")
+                    return
+                else:
+                    self.spilled_rows += len(items)
+            was_empty = not self._front
+            if was_empty or captured_at < self._front_captured_at:
+                self._front_captured_at = captured_at
+            self._front.extend(items)
+            backlog = len(self._front) + self._back_size
+            if backlog > self.backlog_max:
+                self.backlog_max = backlog
+            if was_empty:
+                self._cond.notify_all()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Thao tác chạy trên luồng ghi
+    # ------------------------------------------------------------------
+    def _run_on_writer(self, func: Callable[[], Any]) -> Any:
+        """Chạy func trên luồng ghi sau khi mọi dữ liệu đã nhận được ghi xong, chờ và trả về kết quả."""
+        if self._thread is None or not self._thread.is_alive():
+            return func()
+        done = threading.Event()
+        result = []
+        with self._cond:
+            self._requests.append((lambda: result.append(func()), done))
+            self._cond.notify_all()
+        while not done.wait(1.0):
+            if not self._thread.is_alive():
+                return func()
+        return result[0] if result else None
+
+    def set_fields_to_write(self, fields_to_write: List[str]):
+        """Đổi cột lưu trữ sau khi các dòng đã nhận (theo cột cũ) được ghi xong."""
+        self._run_on_writer(lambda: self.storage_manager.set_fields_to_write(fields_to_write))
+
+    def durability_stats(self, reset: bool = True) -> Dict[str, float]:
+        """Số liệu flush/fsync của StorageManager bên dưới, lấy trên luồng ghi."""
+        return self._run_on_writer(lambda: self.storage_manager.durability_stats(reset))
+
+    def flush(self):
+        self._run_on_writer(self.storage_manager.flush)
+
+    def sync(self):
+        self._run_on_writer(self.storage_manager.sync)
+
+    def close_current_file(self):
+        """Ghi hết dữ liệu đang chờ rồi đóng file (trên luồng ghi)."""
+        self._run_on_writer(self.storage_manager.close_current_file)
+
+    def stop(self, timeout: float = 10.0):
+        """Ghi hết dữ liệu đang chờ, đóng file và dừng luồng ghi."""
+        thread = self._thread
+        if thread is None:
+            self.storage_manager.close_current_file()
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"[{self.name}] Luồng ghi chưa dừng sau {timeout} giây")
+
+    def _run(self):
+        logger.info(f"[{self.name}] Luồng ghi nền đã bắt đầu.")
+        while True:
+            with self._cond:
+                if not self._front and not self._requests and not self._stopping:
+                    self._cond.wait(self.idle_interval)
+                # Đổi bộ đệm: bên ghi tiếp tục với bộ đệm trống trong khi luồng này ghi khối vừa lấy
+                back, self._front = self._front, []
+                captured_at = self._front_captured_at
+                requests, self._requests = self._requests, []
+                stopping = self._stopping
+                self._back_size = len(back)
+                self._cond.notify_all()
+
+            if back:
+                self._write(back, captured_at)
+            else:
+                self._call(self.storage_manager.check_durability)
+            for func, done in requests:
+                self._call(func)
+                done.set()
+            self._back_size = 0
+            self._log_rates()
+
+            if stopping and not back and not requests:
+                break
+        self._call(self.storage_manager.close_current_file)
+        logger.info(f"[{self.name}] Luồng ghi nền đã dừng.")
+
+    def _write(self, items: List[Any], captured_at: float):
+        start = time.monotonic()
+        if self.stores_frames:
+            self._call(self.storage_manager.write_frames, items, captured_at)
+        else:
+            self._call(self.storage_manager.write_batch, items, captured_at)
+        duration = time.monotonic() - start
+        with self._cond:
+            self.write_count += 1
+            self.rows_written += len(items)
+            self.write_time_total += duration
+            if duration > self.write_time_max:
+                self.write_time_max = duration
+            if duration >= self.stall_threshold:
+                self.stall_count += 1
+                self.stall_time_total += duration
+
+    def _call(self, func: Callable, *args):
+        # Lỗi đĩa không được làm dừng luồng ghi (dữ liệu sau vẫn được thử ghi vào file mới)
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"[{self.name}] Lỗi trong luồng ghi: {e}", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Số liệu
+    # ------------------------------------------------------------------
+    def _reset_writer_stats(self):
+        self.write_count = 0
+        self.rows_written = 0
+        self.write_time_total = 0.0
+        self.write_time_max = 0.0
+        self.stall_count = 0
+        self.stall_time_total = 0.0
+        self.backlog_max = 0
+        self.blocked_count = 0
+        self.blocked_time_total = 0.0
+        self.blocked_time_max = 0.0
+        self.spilled_rows = 0
+        self.dropped_rows = 0
+
+    def writer_stats(self, reset: bool = True) -> Dict[str, float]:
+        """Số liệu luồng ghi kể từ lần lấy trước (thời gian tính bằng ms)."""
+        with self._cond:
+            return self._take_writer_stats(reset)
+
+    def _take_writer_stats(self, reset: bool) -> Dict[str, float]:
+        stats = {
+            "write_count": self.write_count,
+            "rows_written": self.rows_written,
+            "write_mean_ms": self.write_time_total / self.write_count * 1000 if self.write_count else 0.0,
+            "write_max_ms": self.write_time_max * 1000,
+            "stall_threshold_ms": self.stall_threshold * 1000,
+            "stall_count": self.stall_count,
+            "stall_total_ms": self.stall_time_total * 1000,
+            "backlog_max": self.backlog_max,
+            "blocked_count": self.blocked_count,
+            "blocked_max_ms": self.blocked_time_max * 1000,
+            "spilled_rows": self.spilled_rows,
+            "dropped_rows": self.dropped_rows,
+        }
+        if reset:
+            self._reset_writer_stats()
+        return stats
+
+    def _log_rates(self):
+        current_time = time.time()
+        if current_time - self.last_log_time < 10.0:
+            return
+        self.last_log_time = current_time
+        # Chạy trên luồng ghi: durability_stats của StorageManager bên dưới không bị đọc chéo luồng
+        durability = format_durability_stats(self.storage_manager.durability_stats())
+        logger.info(f"[{self.name}] Luồng ghi: {format_writer_stats(self.writer_stats())}. Ghi đĩa: {durability}")
@@ -0,0 +1,384 @@
+# src/storage/columnar_storage.py
+"""
+Lưu trữ nhị phân bản ghi cố định (STORAGE_FORMAT=columnar) thay cho dòng CSV dạng text.
+
+Mỗi trường payload được lưu bằng đúng kiểu nguyên của nó trong gói (int16 cho góc/gia tốc, ...)
+kèm hệ số chia trong header, nên giá trị đọc lại trùng từng bit với giá trị giải mã; cột khác
+(timestamp, kênh dẫn xuất) là float64, cycle_complete là bool. Bản ghi được đóng gói bằng
+struct và ghi theo lô; bên đọc mở file bằng numpy.memmap, không phải parse.
+
+Định dạng file .hwtcol:
+    header : magic b'HWTCOL01', uint32 độ dài JSON, JSON {"fields", "columns", "static_fields", "created"}
+             (đệm khoảng trắng để bản ghi bắt đầu ở vị trí chia hết cho 8)
+    bản ghi: cố định theo "columns" (mỗi cột: name, dtype numpy little-endian, scale, offset),
+             thêm cột "_null" (bitmask) nếu có cột nguyên/bool, bit i = cột nguyên thứ i không có giá trị.
+Giá trị vật lý = nguyên / scale + offset (scale null: giữ nguyên). Cột float dùng NaN cho giá trị thiếu.
+Bản ghi cuối bị cắt dở (mất điện) được bỏ qua khi đọc và cắt bỏ khi tiếp tục ghi file.
+"""
+import csv
+import json
+import logging
+import os
+import struct
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.sample_assembler import CYCLE_COMPLETE_FIELD
+from ..sensors.decoders.struct_decoder import FIELD_OFFSETS, PAYLOAD_LAYOUTS
+from ..sensors.decoders.subscriptions import FIELD_SOURCES, PREFERRED_FIELD_SOURCES
+from .storage_manager import StorageManager
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_FILE_MAGIC = b'HWTCOL01'
+COLUMNAR_FILE_EXTENSION = '.hwtcol'
+HEADER_PREFIX = struct.Struct('<8sI')
+HEADER_ALIGNMENT = 8
+NULL_MASK_COLUMN = "_null"
+
+# Mã struct của payload -> dtype numpy little-endian
+_STRUCT_DTYPES = {'b': '<i1', 'B': '<u1', 'h': '<i2', 'H': '<u2', 'i': '<i4', 'I': '<u4'}
+# Kích thước bitmask theo số cột có thể thiếu
+_MASK_DTYPES = ((8, '<u1'), (16, '<u2'), (32, '<u4'), (64, '<u8'))
+# dtype của cột -> mã struct (kích thước chuẩn với '<')
+_DTYPE_STRUCT = {'<f8': 'd', '|b1': '?', '<i1': 'b', '<u1': 'B', '<i2': 'h', '<u2': 'H',
+                 '<i4': 'i', '<u4': 'I', '<u8': 'Q'}
+
+
+def _payload_column(name: str) -> Optional[Dict[str, Any]]:
+    """Kiểu nguyên, hệ số chia và hằng số cộng của một trường payload (None nếu không phải trường payload)."""
+    sources = FIELD_SOURCES.get(name)
+    if not sources:
+        return None
+    packet_type = PREFERRED_FIELD_SOURCES.get(name, sources[0])
+    fmt, names, divisors = PAYLOAD_LAYOUTS[packet_type]
+    index = names.index(name)
+    return {"name": name, "dtype": _STRUCT_DTYPES[fmt[1 + index]], "scale": divisors[index],
+            "offset": FIELD_OFFSETS.get(packet_type, {}).get(name)}
+
+
+def column_schema(fields: List[str], static_fields: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Bố cục bản ghi cho danh sách cột lưu trữ (cột cố định static_fields chỉ nằm trong header).
+    Returns:
+        List[Dict]: mỗi cột {"name", "dtype", "scale", "offset"}, kèm "_null" ở cuối nếu cần.
+    """
+    static_fields = static_fields or {}
+    columns = []
+    nullable = 0
+    for name in fields:
+        if name in static_fields:
+            continue
+        column = None
+        if name == CYCLE_COMPLETE_FIELD:
+            column = {"name": name, "dtype": '|b1', "scale": None, "offset": None}
+        elif name != "timestamp":
+            column = _payload_column(name)
+        if column is None or nullable == _MASK_DTYPES[-1][0]:
+            column = {"name": name, "dtype": '<f8', "scale": None, "offset": None}
+        else:
+            nullable += 1
+        columns.append(column)
+    if nullable:
+        mask_dtype = next(dtype for bits, dtype in _MASK_DTYPES if nullable <= bits)
+        columns.append({"name": NULL_MASK_COLUMN, "dtype": mask_dtype, "scale": None, "offset": None})
+    return columns
+
+
+def record_dtype(columns: List[Dict[str, Any]]) -> np.dtype:
+    return np.dtype([(column["name"], column["dtype"]) for column in columns])
+
+
+def make_row_encoder(columns: List[Dict[str, Any]]) -> Callable[[Dict[str, Any]], bytes]:
+    """
+    Tạo hàm encode(row) -> bytes của một bản ghi theo bố cục column_schema: đọc từng cột từ dict dòng,
+    quy cột nguyên về số nguyên (round((giá trị - offset) * scale)) rồi một lần struct.pack.
+    Khóa thiếu hoặc None thành NaN (cột float) hoặc bit trong "_null" (cột nguyên/bool).
+    """
+    pack = struct.Struct('<' + ''.join(_DTYPE_STRUCT[column["dtype"]] for column in columns)).pack
+    # (tên, kiểu "float"/"bool"/"int", scale, offset, bit null) cho mỗi cột dữ liệu, theo thứ tự bản ghi
+    plan: List[Tuple[str, str, Optional[float], Optional[int], int]] = []
+    has_mask = False
+    bit = 0
+    for column in columns:
+        if column["name"] == NULL_MASK_COLUMN:
+            has_mask = True
+            continue
+        if column["dtype"] == '<f8':
+            plan.append((column["name"], "float", None, None, 0))
+            continue
+        kind = "bool" if column["dtype"] == '|b1' else "int"
+        scale = float(column["scale"]) if column["scale"] is not None else None
+        offset = int(column["offset"]) if column["offset"] is not None else None
+        plan.append((column["name"], kind, scale, offset, 1 << bit))
+        bit += 1
+    nan = float("nan")
+
+    def encode(row: Dict[str, Any]) -> bytes:
+        values = []
+        null = 0
+        for name, kind, scale, offset, null_bit in plan:
+            value = row.get(name)
+            if kind == "float":
+                values.append(nan if value is None else value)
+            elif value is None:
+                null |= null_bit
+                values.append(0)
+            elif kind == "bool":
+                values.append(bool(value))
+            else:
+                if offset is not None:
+                    value = value - offset
+                if scale is not None:
+                    value = value * scale
+                values.append(round(value))
+        if has_mask:
+            values.append(null)
+        return pack(*values)
+
+    return encode
+
+
+class ColumnarStorageManager(StorageManager):
+    """
+    StorageManager ghi bản ghi nhị phân cố định thay cho dòng CSV.
+    Bản ghi được gom trong bộ nhớ và ghi xuống file theo lô batch_records bản ghi (và khi flush,
+    xoay vòng hoặc đóng file); xoay vòng file và chiến lược kết nối lại giống StorageManager.
+    """
+    FILE_EXTENSION = COLUMNAR_FILE_EXTENSION
+
+    def __init__(self,
+                 base_dir: str,
+                 file_rotation_hours: int,
+                 fields_to_write: List[str],
+                 reconnection_strategy: str = "new_file",
+                 static_fields: Optional[Dict[str, Any]] = None,
+                 batch_records: int = 256):
+        """
+        Args:
+            static_fields (Optional[Dict[str, Any]]): Cột không đổi (ví dụ device_id), chỉ lưu trong header.
+            batch_records (int): Số bản ghi gom lại trước mỗi lần ghi xuống file.
+            Các tham số khác như StorageManager.
+        """
+        self.static_fields = dict(static_fields or {})
+        self.batch_records = max(1, batch_records)
+        self._pending: List[bytes] = []
+        self._encode: Optional[Callable[[Dict[str, Any]], bytes]] = None
+        super().__init__(base_dir=base_dir, file_rotation_hours=file_rotation_hours,
+                         fields_to_write=fields_to_write, reconnection_strategy=reconnection_strategy)
+
+    def _header(self) -> Dict[str, Any]:
+        return {"fields": list(self.fields_to_write),
+                "columns": column_schema(self.fields_to_write, self.static_fields),
+                "static_fields": self.static_fields}
+
+    def _open_new_file(self):
+        """Mở một file bản ghi mới và ghi header."""
+        self.close_current_file()
+
+        self.current_file_path = self._get_new_filepath()
+        self.current_file_start_time = datetime.now()
+        try:
+            header = self._header()
+            payload = json.dumps(dict(header, created=self.current_file_start_time.isoformat())).encode()
+            padding = -(HEADER_PREFIX.size + len(payload)) % HEADER_ALIGNMENT
+            payload += b' ' * padding
+            self.current_file_handle = open(self.current_file_path, 'wb')
+            self.current_file_handle.write(HEADER_PREFIX.pack(COLUMNAR_FILE_MAGIC, len(payload)) + payload)
+            self._encode = make_row_encoder(header["columns"])
+            logger.info(f"Mở file lưu trữ nhị phân mới: {self.current_file_path}")
+        except IOError as e:
+            logger.error(f"Không thể mở file mới '{self.current_file_path}': {e}")
+            self.current_file_path = None
+            self.current_file_handle = None
+            self.current_file_start_time = None
+
+    def _continue_existing_file(self, file_path: str) -> bool:
+        """Tiếp tục ghi vào file bản ghi đã có nếu header trùng cấu hình hiện tại."""
+        try:
+            header, data_offset = read_columnar_header(file_path)
+            expected = self._header()
+            if {key: header.get(key) for key in expected} != expected:
+                logger.info(f"Cấu hình cột của '{file_path}' đã khác, không tiếp tục file này")
+                return False
+            record_size = record_dtype(expected["columns"]).itemsize
+            handle = open(file_path, 'r+b')
+            size = handle.seek(0, os.SEEK_END)
+            partial = (size - data_offset) % record_size
+            if partial:
+                # Bản ghi cuối bị cắt dở: bỏ để các bản ghi mới thẳng hàng
+                handle.truncate(size - partial)
+                handle.seek(0, os.SEEK_END)
+                logger.warning(f"Bỏ {partial} byte bản ghi dở ở cuối '{file_path}'")
+            self.current_file_handle = handle
+            self.current_file_path = file_path
+            self.current_file_start_time = self._file_start_time(file_path)
+            self._encode = make_row_encoder(expected["columns"])
+            logger.info(f"Tiếp tục ghi vào file nhị phân hiện có: {self.current_file_path}")
+            return True
+        except (OSError, ValueError) as e:
+            logger.error(f"Không thể mở file để tiếp tục '{file_path}': {e}")
+            return False
+
+    def write_data(self, data: Dict[str, Any]):
+        """
+        Đóng gói một dòng thành bản ghi và gom vào lô; ghi cả lô khi đủ batch_records bản ghi.
+        Kiểm tra và xoay vòng file nếu cần. Các khóa không có trong fields_to_write bị bỏ qua.
+        """
+        if not self._ensure_file():
+            return
+        try:
+            self._pending.append(self._encode(data))
+        except (TypeError, ValueError, OverflowError, struct.error) as e:
+            logger.error(f"Không đóng gói được dòng cho '{self.current_file_path}': {e}")
+            return
+        if len(self._pending) >= self.batch_records:
+            self._write_pending()
+        self._rows_written(1)
+
+    def write_batch(self, rows: Sequence[Dict[str, Any]], captured_at: Optional[float] = None):
+        """Đóng gói nhiều dòng và ghi theo lô (kiểm tra xoay vòng file và chính sách flush/fsync một lần)."""
+        if not rows or not self._ensure_file():
+            return
+        encode = self._encode
+        count = 0
+        for row in rows:
+            try:
+                self._pending.append(encode(row))
+                count += 1
+            except (TypeError, ValueError, OverflowError, struct.error) as e:
+                logger.error(f"Không đóng gói được dòng cho '{self.current_file_path}': {e}")
+        if len(self._pending) >= self.batch_records:
+            self._write_pending()
+        if count:
+            self._rows_written(count, captured_at)
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+        records, self._pending = b''.join(self._pending), []
+        try:
+            self.current_file_handle.write(records)
+        except IOError as e:
+            logger.error(f"Lỗi khi ghi vào file '{self.current_file_path}': {e}")
+            self.close_current_file()
+
+    def flush(self):
+        """Ghi lô bản ghi đang gom rồi đẩy bộ đệm Python xuống file hiện tại."""
+        if self.current_file_handle:
+            self._write_pending()
+        super().flush()
+
+    def close_current_file(self):
+        """Ghi nốt lô đang gom (theo bố cục của file đang mở) rồi đóng file."""
+        if self.current_file_handle:
+            self._write_pending()
+        self._pending = []
+        super().close_current_file()
+
+
+def is_columnar_file(path: str) -> bool:
+    return path.endswith(COLUMNAR_FILE_EXTENSION)
+
+
+def read_columnar_header(path: str) -> Tuple[Dict[str, Any], int]:
+    """Đọc header của file bản ghi nhị phân. Returns: (header, vị trí bắt đầu bản ghi)."""
+    with open(path, 'rb') as f:
+        prefix = f.read(HEADER_PREFIX.size)
+        if len(prefix) < HEADER_PREFIX.size:
+            raise ValueError(f"'{path}' không phải file bản ghi nhị phân")
+        magic, length = HEADER_PREFIX.unpack(prefix)
+        if magic != COLUMNAR_FILE_MAGIC:
+            raise ValueError(f"'{path}' không phải file bản ghi nhị phân (magic {magic!r})")
+        return json.loads(f.read(length)), HEADER_PREFIX.size + length
+
+
+def open_columnar_file(path: str) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    Mở file bản ghi nhị phân bằng numpy.memmap (chỉ đọc, không parse, không sao chép vào bộ nhớ).
+    Returns:
+        (header, mảng có cấu trúc theo header["columns"], giá trị nguyên chưa nhân hệ số).
+    """
+    header, data_offset = read_columnar_header(path)
+    dtype = record_dtype(header["columns"])
+    count = (os.path.getsize(path) - data_offset) // dtype.itemsize
+    if count <= 0:
+        return header, np.empty(0, dtype=dtype)
+    return header, np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(count,))
+
+
+def columnar_arrays(header: Dict[str, Any], records: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Đổi bản ghi sang giá trị vật lý dạng mảng float64 theo từng cột (NaN ở giá trị thiếu),
+    cho phân tích số trực tiếp trên mảng.
+    """
+    arrays = {}
+    bit = 0
+    has_mask = NULL_MASK_COLUMN in records.dtype.names
+    for column in header["columns"]:
+        name = column["name"]
+        if name == NULL_MASK_COLUMN:
+            continue
+        values = records[name].astype(np.float64)
+        if column["dtype"] != '<f8':
+            if column["scale"] is not None:
+                values /= column["scale"]
+            if column["offset"] is not None:
+                values += column["offset"]
+            if has_mask:
+                values[(records[NULL_MASK_COLUMN] >> bit) & 1 == 1] = np.nan
+            bit += 1
+        arrays[name] = values
+    return arrays
+
+
+def decode_columnar_file(path: str) -> Tuple[List[str], Dict[str, list]]:
+    """
+    Đọc một file bản ghi nhị phân thành các cột giá trị Python như dòng StorageManager ghi vào CSV
+    (số nguyên giữ kiểu int, giá trị thiếu là None). Returns: (danh sách cột như header CSV, cột giá trị).
+    """
+    header, records = open_columnar_file(path)
+    fields = header["fields"]
+    static_fields = header.get("static_fields") or {}
+    nulls = records[NULL_MASK_COLUMN] if NULL_MASK_COLUMN in (records.dtype.names or ()) else None
+    columns: Dict[str, list] = {}
+    bit = 0
+    for column in header["columns"]:
+        name = column["name"]
+        if name == NULL_MASK_COLUMN:
+            continue
+        raw = records[name]
+        if column["dtype"] == '<f8':
+            values = raw.tolist()
+            columns[name] = [None if value != value else value for value in values] \
+                if np.isnan(raw).any() else values
+            continue
+        if column["scale"] is not None:
+            values = (raw / column["scale"]).tolist()
+        else:
+            values = raw.tolist()
+        if column["offset"] is not None:
+            values = [value + column["offset"] for value in values]
+        if nulls is not None:
+            for index in np.flatnonzero((nulls >> bit) & 1).tolist():
+                values[index] = None
+        columns[name] = values
+        bit += 1
+    count = len(records)
+    for field in fields:
+        if field not in columns:
+            columns[field] = [static_fields.get(field)] * count
+    return fields, columns
+
+
+def export_columnar_file_csv(path: str, csv_path: Optional[str] = None) -> str:
+    """Xuất file bản ghi nhị phân sang CSV cùng định dạng StorageManager (mặc định cạnh file gốc, đuôi .csv)."""
+    csv_path = csv_path or os.path.splitext(path)[0] + ".csv"
+    fields, columns = decode_columnar_file(path)
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        writer.writerows(zip(*(columns[field] for field in fields)))
+    return csv_path
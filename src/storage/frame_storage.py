@@ -0,0 +1,322 @@
+# src/storage/frame_storage.py
+"""
+Lưu trữ gói thô với giải mã trễ (STORAGE_DECODE_MODE=lazy).
+
+Pipeline chỉ tách, xác thực và gắn timestamp cho gói; RawFrameStorageManager ghi nguyên gói
+11 byte kèm timestamp. Việc giải mã sang đơn vị vật lý diễn ra theo lô bằng NumpyBatchDecoder
+khi file được đọc, xuất hoặc gửi đi, và cho ra đúng các dòng mà StorageManager ghi vào CSV
+với cùng cấu hình cột và cách tạo dòng (angle hoặc cycle).
+
+Định dạng file .hwtfrm:
+    header : magic b'HWTFRM01', uint32 độ dài JSON,
+             JSON {"fields", "row_mode", "static_fields", "derived_baseline", "created"}
+    bản ghi: 19 byte cố định, float64 timestamp (Unix, giây) + gói 11 byte.
+Bản ghi cuối bị cắt dở (mất điện) được bỏ qua khi đọc và cắt bỏ khi tiếp tục ghi file.
+"""
+import csv
+import json
+import logging
+import os
+import struct
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.derived_channels import QUATERNION_FIELDS, DerivedChannelEngine
+from ..core.sample_assembler import CYCLE_COMPLETE_FIELD
+from ..sensors.decoders import NumpyBatchDecoder, packet_types_for_fields
+from ..sensors.decoders.struct_decoder import PAYLOAD_LAYOUTS
+from ..sensors.decoders.subscriptions import PREFERRED_FIELD_SOURCES
+from ..sensors.hwt905_constants import DATA_PACKET_LENGTH, PACKET_TYPE_ANGLE
+from .columnar_storage import decode_columnar_file, is_columnar_file
+from .storage_manager import StorageManager
+
+logger = logging.getLogger(__name__)
+
+FRAME_FILE_MAGIC = b'HWTFRM01'
+FRAME_FILE_EXTENSION = '.hwtfrm'
+HEADER_PREFIX = struct.Struct('<8sI')
+RECORD = struct.Struct(f'<d{DATA_PACKET_LENGTH}s')
+RECORD_DTYPE = np.dtype([('timestamp', '<f8'), ('frame', 'u1', (DATA_PACKET_LENGTH,))])
+
+
+class RawFrameStorageManager(StorageManager):
+    """
+    StorageManager ghi gói thô (write_frame) thay cho dòng CSV đã giải mã.
+    Xoay vòng file và chiến lược kết nối lại giống StorageManager; header của mỗi file giữ cấu hình
+    cột để bộ đọc dựng lại đúng các dòng.
+    """
+    FILE_EXTENSION = FRAME_FILE_EXTENSION
+    stores_frames = True  # Luồng giải mã ghi gói bằng write_frame, không giải mã
+
+    def __init__(self,
+                 base_dir: str,
+                 file_rotation_hours: int,
+                 fields_to_write: List[str],
+                 reconnection_strategy: str = "new_file",
+                 row_mode: str = "angle",
+                 static_fields: Optional[Dict[str, Any]] = None,
+                 derived_baseline: Optional[Sequence[float]] = None):
+        """
+        Args:
+            row_mode (str): Cách dựng dòng khi đọc: "angle" (một dòng mỗi gói góc) hoặc "cycle"
+                (một dòng rộng mỗi chu kỳ output), như STORAGE_ROW_MODE.
+            static_fields (Optional[Dict[str, Any]]): Cột không đổi ghi kèm mọi dòng (ví dụ device_id).
+            derived_baseline (Optional[Sequence[float]]): Mốc (roll, pitch, yaw) của kênh angle_delta
+                khi fields có cột dẫn xuất, như DERIVED_BASELINE.
+            Các tham số khác như StorageManager.
+        """
+        self.row_mode = row_mode
+        self.static_fields = dict(static_fields or {})
+        self.derived_baseline = list(derived_baseline) if derived_baseline else None
+        super().__init__(base_dir=base_dir, file_rotation_hours=file_rotation_hours,
+                         fields_to_write=fields_to_write, reconnection_strategy=reconnection_strategy)
+
+    def _header(self) -> Dict[str, Any]:
+        return {"fields": list(self.fields_to_write), "row_mode": self.row_mode,
+                "static_fields": self.static_fields, "derived_baseline": self.derived_baseline}
+
+    def _open_new_file(self):
+        """Mở một file gói thô mới và ghi header."""
+        self.close_current_file()
+
+        self.current_file_path = self._get_new_filepath()
+        self.current_file_start_time = datetime.now()
+        try:
+            header = json.dumps(dict(self._header(), created=self.current_file_start_time.isoformat())).encode()
+            self.current_file_handle = open(self.current_file_path, 'wb')
+            self.current_file_handle.write(HEADER_PREFIX.pack(FRAME_FILE_MAGIC, len(header)) + header)
+            logger.info(f"Mở file gói thô mới: {self.current_file_path}")
+        except IOError as e:
+            logger.error(f"Không thể mở file mới '{self.current_file_path}': {e}")
+            self.current_file_path = None
+            self.current_file_handle = None
+            self.current_file_start_time = None
+
+    def _continue_existing_file(self, file_path: str) -> bool:
+        """Tiếp tục ghi vào file gói thô đã có nếu header trùng cấu hình hiện tại."""
+        try:
+            header, data_offset = read_frame_header(file_path)
+            expected = self._header()
+            if {key: header.get(key) for key in expected} != expected:
+                logger.info(f"Cấu hình cột của '{file_path}' đã khác, không tiếp tục file này")
+                return False
+            handle = open(file_path, 'r+b')
+            size = handle.seek(0, os.SEEK_END)
+            partial = (size - data_offset) % RECORD.size
+            if partial:
+                # Bản ghi cuối bị cắt dở: bỏ để các bản ghi mới thẳng hàng
+                handle.truncate(size - partial)
+                handle.seek(0, os.SEEK_END)
+                logger.warning(f"Bỏ {partial} byte bản ghi dở ở cuối '{file_path}'")
+            self.current_file_handle = handle
+            self.current_file_path = file_path
+            self.current_file_start_time = self._file_start_time(file_path)
+            logger.info(f"Tiếp tục ghi vào file gói thô hiện có: {self.current_file_path}")
+            return True
+        except (OSError, ValueError) as e:
+            logger.error(f"Không thể mở file để tiếp tục '{file_path}': {e}")
+            return False
+
+    def write_frame(self, frame: bytes, timestamp: float):
+        """Ghi một gói 11 byte đã xác thực kèm timestamp; kiểm tra và xoay vòng file nếu cần."""
+        if self._ensure_file():
+            try:
+                self.current_file_handle.write(RECORD.pack(timestamp, frame))
+            except IOError as e:
+                logger.error(f"Lỗi khi ghi vào file '{self.current_file_path}': {e}")
+                self.close_current_file()
+                return
+            self._rows_written(1)
+
+    def write_frames(self, records: Sequence[Tuple[bytes, float]], captured_at: Optional[float] = None):
+        """Ghi một lô (gói 11 byte, timestamp) bằng một lần write; captured_at như StorageManager.write_batch."""
+        if not records or not self._ensure_file():
+            return
+        pack = RECORD.pack
+        try:
+            self.current_file_handle.write(b''.join([pack(timestamp, frame) for frame, timestamp in records]))
+        except IOError as e:
+            logger.error(f"Lỗi khi ghi vào file '{self.current_file_path}': {e}")
+            self.close_current_file()
+            return
+        self._rows_written(len(records), captured_at)
+
+    def write_data(self, data: Dict[str, Any]):
+        """Không nhận dòng đã giải mã: bên ghi phải kiểm tra stores_frames và dùng write_frame()."""
+        raise TypeError(f"{type(self).__name__} lưu gói thô (stores_frames=True): dùng write_frame()/write_frames(), "
+                        f"không phải write_data()")
+
+    def write_batch(self, rows: Sequence[Dict[str, Any]], captured_at: Optional[float] = None):
+        """Không nhận dòng đã giải mã: bên ghi phải kiểm tra stores_frames và dùng write_frames()."""
+        raise TypeError(f"{type(self).__name__} lưu gói thô (stores_frames=True): dùng write_frame()/write_frames(), "
+                        f"không phải write_batch()")
+
+
+def is_frame_file(path: str) -> bool:
+    return path.endswith(FRAME_FILE_EXTENSION)
+
+
+def read_frame_header(path: str) -> Tuple[Dict[str, Any], int]:
+    """Đọc header của file gói thô. Returns: (header, vị trí bắt đầu bản ghi)."""
+    with open(path, 'rb') as f:
+        prefix = f.read(HEADER_PREFIX.size)
+        if len(prefix) < HEADER_PREFIX.size:
+            raise ValueError(f"'{path}' không phải file gói thô")
+        magic, length = HEADER_PREFIX.unpack(prefix)
+        if magic != FRAME_FILE_MAGIC:
+            raise ValueError(f"'{path}' không phải file gói thô (magic {magic!r})")
+        return json.loads(f.read(length)), HEADER_PREFIX.size + length
+
+
+def read_frame_file(path: str) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    Đọc toàn bộ bản ghi của file gói thô.
+    Returns:
+        (header, mảng có cấu trúc RECORD_DTYPE với cột 'timestamp' và 'frame' (N, 11)).
+    """
+    header, data_offset = read_frame_header(path)
+    with open(path, 'rb') as f:
+        f.seek(data_offset)
+        data = f.read()
+    count = len(data) // RECORD_DTYPE.itemsize
+    return header, np.frombuffer(data, dtype=RECORD_DTYPE, count=count)
+
+
+def records_to_columns(records: np.ndarray, fields: List[str], row_mode: str = "angle",
+                       static_fields: Optional[Dict[str, Any]] = None,
+                       decoder: Optional[NumpyBatchDecoder] = None,
+                       derived_baseline: Optional[Sequence[float]] = None) -> Dict[str, list]:
+    """
+    Giải mã theo lô các bản ghi gói thô thành các cột của fields, giống dòng CSV của pipeline giải mã ngay.
+    Với row_mode "angle", mỗi gói góc là một dòng; với "cycle", các gói của một chu kỳ output
+    (mã loại tăng dần) gộp thành một dòng như SampleAssembler, kèm cycle_complete.
+    Cột của kênh dẫn xuất trong fields được tính một lần cho cả file (DerivedChannelEngine).
+    Returns:
+        Dict[str, list]: tên cột -> danh sách giá trị Python (None nếu dòng không có giá trị đó).
+    """
+    decoder = decoder or NumpyBatchDecoder()
+    static_fields = static_fields or {}
+    derived = DerivedChannelEngine.for_fields(fields, derived_baseline)
+    # Đầu vào của kênh dẫn xuất được giải mã (và ghép chu kỳ) như khi pipeline đăng ký chúng
+    wanted = list(fields) + (derived.required_fields if derived else [])
+    expected = sorted(packet_types_for_fields(wanted)) if row_mode == "cycle" else [PACKET_TYPE_ANGLE]
+    frames = records['frame']
+    keep = np.isin(frames[:, 1], expected)
+    frames = np.ascontiguousarray(frames[keep])
+    timestamps = records['timestamp'][keep]
+    decoded = decoder.decode_block(frames, timestamps)
+
+    if row_mode != "cycle":
+        angle = decoded.get(PACKET_TYPE_ANGLE, {})
+        row_count = len(angle.get('timestamp', ()))
+        if derived:
+            angle = dict(angle, **_derived_columns(derived, angle, row_count))
+        columns = {}
+        for field in fields:
+            if field in angle:
+                columns[field] = angle[field].tolist()
+            elif field in static_fields:
+                columns[field] = [static_fields[field]] * row_count
+            else:
+                columns[field] = [None] * row_count
+        return columns
+
+    # Ranh giới chu kỳ: mã loại không tăng so với gói trước (như SampleAssembler/FrameTimestamper)
+    types = frames[:, 1]
+    starts = np.ones(len(types), dtype=bool)
+    starts[1:] = types[1:] <= types[:-1]
+    cycle_ids = np.cumsum(starts) - 1
+    row_count = int(cycle_ids[-1]) + 1 if len(cycle_ids) else 0
+
+    values: Dict[str, np.ndarray] = {'timestamp': timestamps[starts]}
+    complete = np.ones(row_count, dtype=bool)
+    for packet_type in expected:
+        rows = cycle_ids[types == packet_type]
+        present = np.zeros(row_count, dtype=bool)
+        present[rows] = True
+        complete &= present
+        columns = decoded.get(packet_type)
+        # Trường dùng chung (temperature): type ưu tiên luôn ghi đè, type khác chỉ điền chỗ còn trống
+        for name in PAYLOAD_LAYOUTS[packet_type][1]:
+            if name not in wanted and name not in QUATERNION_FIELDS:
+                continue
+            preferred = PREFERRED_FIELD_SOURCES.get(name, packet_type) == packet_type
+            column = values.get(name)
+            if column is None:
+                column = values[name] = np.full(row_count, None, dtype=object)
+            if columns is None:
+                continue
+            if preferred:
+                column[rows] = columns[name].tolist()
+            else:
+                empty = np.equal(column[rows], None)
+                column[rows[empty]] = np.asarray(columns[name].tolist(), dtype=object)[empty]
+    values[CYCLE_COMPLETE_FIELD] = complete
+    if derived:
+        values.update(_derived_columns(derived, values, row_count))
+
+    result = {}
+    for field in fields:
+        if field in values:
+            result[field] = values[field].tolist()
+        elif field in static_fields:
+            result[field] = [static_fields[field]] * row_count
+        else:
+            result[field] = [None] * row_count
+    return result
+
+
+def _derived_columns(derived: DerivedChannelEngine, values: Dict[str, np.ndarray], size: int) -> Dict[str, np.ndarray]:
+    """Tính cột dẫn xuất từ các cột đã giải mã; NaN (thiếu đầu vào) thành None như dòng của pipeline."""
+    inputs = {name: np.asarray(column, dtype=np.float64) for name, column in values.items()
+              if name in derived.required_fields or name in QUATERNION_FIELDS}
+    result = {}
+    for name, column in derived.compute(inputs, size).items():
+        column = column.astype(object)
+        column[np.isnan(column.astype(np.float64))] = None
+        result[name] = column
+    return result
+
+
+def decode_frame_file(path: str, decoder: Optional[NumpyBatchDecoder] = None) -> Tuple[List[str], Dict[str, list]]:
+    """Giải mã một file gói thô. Returns: (danh sách cột như header CSV, cột giá trị)."""
+    header, records = read_frame_file(path)
+    fields = header["fields"]
+    return fields, records_to_columns(records, fields, header.get("row_mode", "angle"),
+                                      header.get("static_fields"), decoder, header.get("derived_baseline"))
+
+
+def iter_frame_file_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Các dòng đã giải mã của file gói thô dạng dict (cùng khóa với dòng StorageManager ghi vào CSV)."""
+    fields, columns = decode_frame_file(path)
+    for values in zip(*(columns[field] for field in fields)):
+        yield dict(zip(fields, values))
+
+
+def read_data_rows(path: str) -> List[Dict[str, str]]:
+    """
+    Đọc một file dữ liệu (CSV, gói thô hoặc bản ghi nhị phân) thành các dòng dict giá trị chuỗi, đúng như
+    csv.DictReader đọc file CSV tương ứng, để bên đọc (sender, export) không phải phân biệt chế độ lưu trữ.
+    """
+    if is_columnar_file(path):
+        fields, columns = decode_columnar_file(path)
+        return [{field: '' if value is None else str(value) for field, value in zip(fields, values)}
+                for values in zip(*(columns[field] for field in fields))]
+    if not is_frame_file(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+    return [{key: '' if value is None else str(value) for key, value in row.items()}
+            for row in iter_frame_file_rows(path)]
+
+
+def export_frame_file_csv(path: str, csv_path: Optional[str] = None) -> str:
+    """Xuất file gói thô sang CSV cùng định dạng StorageManager (mặc định cạnh file gốc, đuôi .csv)."""
+    csv_path = csv_path or os.path.splitext(path)[0] + ".csv"
+    fields, columns = decode_frame_file(path)
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        writer.writerows(zip(*(columns[field] for field in fields)))
+    return csv_path
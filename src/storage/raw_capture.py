@@ -0,0 +1,198 @@
+# src/storage/raw_capture.py
+
+"""
+Ghi nguyên văn luồng byte serial (raw tee) vào các segment nhị phân chỉ ghi nối tiếp.
+
+Mỗi khối byte luồng đọc nhận được được ghi kèm một header chứa thời điểm đọc
+(monotonic và wall-clock, ns), nên dữ liệu có thể được phát lại qua decoder
+(ReplaySerial) với đúng nhịp thời gian ban đầu để tính lại bất kỳ kênh nào.
+
+Định dạng segment (little-endian):
+    FILE_HEADER : magic b'HWTRAW01', version (H), kích thước header (H),
+                  monotonic_ns (q), wall_ns (q) lúc mở segment
+    Lặp lại     : CHUNK_HEADER = magic b'RC', flags (H), độ dài (I), monotonic_ns (q), wall_ns (q)
+                  theo sau là `độ dài` byte dữ liệu thô
+Segment đang ghi có đuôi .hwtraw.part và được đổi tên thành .hwtraw khi đóng. Ghi đi qua
+bộ đệm lớn nên chi phí mỗi khối chỉ là một lần pack header và hai lần chép vào bộ đệm.
+"""
+import glob
+import logging
+import os
+import struct
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b'HWTRAW01'
+SEGMENT_VERSION = 1
+SEGMENT_EXTENSION = ".hwtraw"
+PARTIAL_SUFFIX = ".part"
+FILE_HEADER = struct.Struct('<8sHHqq')
+CHUNK_MAGIC = b'RC'
+CHUNK_HEADER = struct.Struct('<2sHIqq')
+
+
+def is_raw_segment(path: str) -> bool:
+    """True nếu file bắt đầu bằng magic của segment raw capture."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(SEGMENT_MAGIC)) == SEGMENT_MAGIC
+    except OSError:
+        return False
+
+
+def list_segments(path: str) -> List[str]:
+    """Danh sách segment theo thứ tự thời gian: một file, hoặc mọi segment trong một thư mục."""
+    if not os.path.isdir(path):
+        return [path]
+    segments = glob.glob(os.path.join(path, f"*{SEGMENT_EXTENSION}")) + \
+        glob.glob(os.path.join(path, f"*{SEGMENT_EXTENSION}{PARTIAL_SUFFIX}"))
+    return sorted(segments)
+
+
+def iter_segment_chunks(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Đọc tuần tự các khối của một segment.
+    Yields:
+        Tuple[int, int, bytes]: (monotonic_ns, wall_ns, dữ liệu) của từng khối.
+    Segment bị cắt cụt (mất điện khi đang ghi) được đọc tới khối đầy đủ cuối cùng.
+    """
+    with open(path, 'rb', buffering=1024 * 1024) as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            return
+        magic, version, header_size, _, _ = FILE_HEADER.unpack(header)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"'{path}' không phải segment raw capture")
+        f.seek(header_size)
+        while True:
+            chunk_header = f.read(CHUNK_HEADER.size)
+            if len(chunk_header) < CHUNK_HEADER.size:
+                return
+            magic, _, length, mono_ns, wall_ns = CHUNK_HEADER.unpack(chunk_header)
+            if magic != CHUNK_MAGIC:
+                logger.warning(f"Segment '{path}' hỏng tại byte {f.tell() - CHUNK_HEADER.size}, dừng đọc.")
+                return
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield mono_ns, wall_ns, data
+
+
+class RawCaptureWriter:
+    """
+    Ghi các khối byte thô vào segment xoay vòng theo thời gian và kích thước.
+    Chỉ được gọi từ một luồng (luồng đọc serial).
+    """
+
+    def __init__(self,
+                 base_dir: str,
+                 rotation_hours: float = 1.0,
+                 max_segment_mb: float = 64.0,
+                 buffer_kb: int = 1024,
+                 flush_interval: float = 5.0,
+                 prefix: str = "raw"):
+        """
+        Args:
+            base_dir (str): Thư mục chứa các segment.
+            rotation_hours (float): Mở segment mới sau số giờ này.
+            max_segment_mb (float): Mở segment mới khi segment hiện tại vượt kích thước này (MB).
+            buffer_kb (int): Kích thước bộ đệm ghi (KB).
+            flush_interval (float): Đẩy bộ đệm xuống file ít nhất mỗi flush_interval giây,
+                giới hạn lượng dữ liệu mất khi mất điện.
+            prefix (str): Tiền tố tên file segment.
+        """
+        self.base_dir = base_dir
+        self.rotation_delta = timedelta(hours=rotation_hours)
+        self.max_segment_bytes = int(max_segment_mb * 1024 * 1024)
+        self.buffer_size = buffer_kb * 1024
+        self.flush_interval_ns = int(flush_interval * 1e9)
+        self.prefix = prefix
+
+        self.current_path: Optional[str] = None
+        self._handle = None
+        self._segment_start: Optional[datetime] = None
+        self._segment_bytes = 0
+        self._last_flush_ns = 0
+        self._mono_anchor_ns = 0
+        self._wall_anchor_ns = 0
+        self.enabled = True
+        self.chunks_written = 0
+        self.bytes_written = 0
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        logger.info(f"Raw capture bật: ghi vào '{self.base_dir}', xoay segment mỗi {rotation_hours:g} giờ "
+                    f"hoặc {max_segment_mb:g} MB")
+
+    def _open_segment(self):
+        self.close()
+        now = datetime.now()
+        stem = os.path.join(self.base_dir, f"{self.prefix}_{now.strftime('%Y%m%d-%H%M%S')}")
+        path = stem + SEGMENT_EXTENSION
+        counter = 0
+        while os.path.exists(path) or os.path.exists(path + PARTIAL_SUFFIX):
+            # Xoay theo kích thước có thể tạo hai segment trong cùng một giây
+            counter += 1
+            path = f"{stem}_{counter}{SEGMENT_EXTENSION}"
+        self._handle = open(path + PARTIAL_SUFFIX, 'wb', buffering=self.buffer_size)
+        self.current_path = path
+        self._segment_start = now
+        self._mono_anchor_ns = time.monotonic_ns()
+        self._wall_anchor_ns = time.time_ns()
+        self._last_flush_ns = self._mono_anchor_ns
+        self._handle.write(FILE_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, FILE_HEADER.size,
+                                            self._mono_anchor_ns, self._wall_anchor_ns))
+        self._segment_bytes = FILE_HEADER.size
+        logger.info(f"Mở segment raw capture: {path}")
+
+    def write_chunk(self, data, mono_ns: int):
+        """
+        Ghi một khối byte vừa đọc từ serial.
+        Args:
+            data: bytes/memoryview của khối.
+            mono_ns (int): time.monotonic_ns() ngay sau lần đọc (HWT905DataDecoder.last_read_ns).
+        """
+        if not self.enabled or not data:
+            return
+        try:
+            if self._handle is None or self._segment_bytes >= self.max_segment_bytes or \
+                    datetime.now() >= self._segment_start + self.rotation_delta:
+                self._open_segment()
+            # Wall-clock suy ra từ mốc của segment, không gọi time.time_ns() cho mỗi khối
+            wall_ns = self._wall_anchor_ns + (mono_ns - self._mono_anchor_ns)
+            length = len(data)
+            self._handle.write(CHUNK_HEADER.pack(CHUNK_MAGIC, 0, length, mono_ns, wall_ns))
+            self._handle.write(data)
+            self._segment_bytes += CHUNK_HEADER.size + length
+            self.chunks_written += 1
+            self.bytes_written += length
+            if mono_ns - self._last_flush_ns >= self.flush_interval_ns:
+                self._handle.flush()
+                self._last_flush_ns = mono_ns
+        except OSError as e:
+            # Lỗi đĩa không được làm dừng việc thu dữ liệu chính
+            logger.error(f"Lỗi ghi raw capture '{self.current_path}': {e}. Tắt raw capture.")
+            self.enabled = False
+            self.close()
+
+    def flush(self):
+        if self._handle:
+            try:
+                self._handle.flush()
+            except OSError as e:
+                logger.error(f"Lỗi khi flush raw capture '{self.current_path}': {e}")
+
+    def close(self):
+        """Đóng segment hiện tại và đổi tên từ .part sang tên cuối cùng."""
+        if self._handle is None:
+            return
+        try:
+            self._handle.close()
+            os.replace(self.current_path + PARTIAL_SUFFIX, self.current_path)
+            logger.info(f"Đóng segment raw capture: {self.current_path}")
+        except OSError as e:
+            logger.error(f"Lỗi khi đóng raw capture '{self.current_path}': {e}")
+        self._handle = None
+        self.current_path = None
@@ -3,16 +3,34 @@
 import logging
 import csv
 import os
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Callable, List, Optional, Sequence
 
 logger = logging.getLogger(__name__)
 
+# "never": không fsync; "rotation": fsync khi xoay vòng/đóng file; "interval": thêm fsync định kỳ
+FSYNC_POLICIES = ("never", "rotation", "interval")
+
+
+def format_durability_stats(stats: Dict[str, float]) -> str:
+    """Mô tả số liệu ghi đĩa (StorageManager.durability_stats) cho log định kỳ."""
+    text = (f"flush {stats['flush_count']} lần, thu nhận→flush TB {stats['flush_latency_mean_ms']:.1f}ms / "
+            f"max {stats['flush_latency_max_ms']:.1f}ms")
+    if stats['fsync_count']:
+        text += (f"; fsync {stats['fsync_count']} lần, TB {stats['fsync_mean_ms']:.1f}ms / "
+                 f"max {stats['fsync_max_ms']:.1f}ms, thu nhận→bền vững max {stats['sync_latency_max_ms']:.1f}ms")
+    return text
+
 class StorageManager:
     """
     Quản lý việc lưu trữ dữ liệu cảm biến vào file CSV.
     Tự động xoay vòng file lưu trữ dựa trên thời gian (ví dụ: mỗi giờ một file mới).
+    Chính sách bền vững (configure_durability) quyết định khi nào dữ liệu được flush xuống OS
+    và fsync xuống thẻ nhớ, đánh đổi giữa số lần ghi (hao mòn thẻ SD) và dữ liệu mất khi mất điện.
     """
+    FILE_PREFIX = "data_"
+    FILE_EXTENSION = ".csv"
 
     def __init__(self,
                  base_dir: str,
@@ -26,26 +44,46 @@ class StorageManager:
             base_dir (str): Thư mục gốc để lưu các file dữ liệu.
             file_rotation_hours (int): Số giờ trước khi tạo một file mới.
             fields_to_write (List[str]): Danh sách các tên cột cho file CSV.
-            reconnection_strategy (str): "new_file" hoặc "continue_file" - cách xử lý khi kết nối lại.
+            reconnection_strategy (str): "new_file" hoặc "continue_file" - cách xử lý khi chưa có file mở
+                (khởi động lại ứng dụng hoặc sau khi file bị đóng).
         """
         self.base_dir = base_dir
         self.file_rotation_delta = timedelta(hours=file_rotation_hours)
         self.fields_to_write = fields_to_write
         self.reconnection_strategy = reconnection_strategy
+        self._fields_listeners: List[Callable[[List[str]], None]] = []
+        self._fields_changed = False
 
         self.current_file_path: Optional[str] = None
         self.current_file_writer: Optional[csv.DictWriter] = None
         self.current_file_handle: Optional[Any] = None
         self.current_file_start_time: Optional[datetime] = None
 
+        # Chính sách flush/fsync (mặc định: để bộ đệm Python tự ghi, không fsync)
+        self.flush_interval = 0.0
+        self.fsync_policy = "never"
+        self.fsync_interval = 0.0
+        # time.monotonic() lúc thu nhận dòng cũ nhất chưa flush / chưa fsync (lúc đọc serial nếu bên ghi
+        # truyền captured_at, nếu không thì lúc dòng vào bộ đệm)
+        self._unflushed_since: Optional[float] = None
+        self._unsynced_since: Optional[float] = None
+        self.rows_written = 0
+        self._reset_durability_stats()
+
         os.makedirs(self.base_dir, exist_ok=True)
         logger.info(f"StorageManager khởi tạo. Lưu dữ liệu trong '{self.base_dir}', xoay file mỗi {file_rotation_hours} giờ. Chế độ kết nối lại: {reconnection_strategy}")
 
     def _get_new_filepath(self) -> str:
         """Tạo đường dẫn file mới dựa trên thời gian hiện tại."""
         now = datetime.now()
-        filename = f"data_{now.strftime('%Y%m%d-%H%M%S')}.csv"
-        return os.path.join(self.base_dir, filename)
+        stem = f"{self.FILE_PREFIX}{now.strftime('%Y%m%d-%H%M%S')}"
+        path = os.path.join(self.base_dir, f"{stem}{self.FILE_EXTENSION}")
+        suffix = 1
+        while os.path.exists(path):
+            # Mở file mới trong cùng giây (ví dụ vừa đổi cột): không ghi đè file trước
+            path = os.path.join(self.base_dir, f"{stem}_{suffix}{self.FILE_EXTENSION}")
+            suffix += 1
+        return path
 
     def _open_new_file(self):
         """Mở một file CSV mới để ghi và ghi header."""
@@ -55,7 +93,8 @@ class StorageManager:
         self.current_file_start_time = datetime.now()
         try:
             self.current_file_handle = open(self.current_file_path, 'w', newline='', encoding='utf-8')
-            self.current_file_writer = csv.DictWriter(self.current_file_handle, fieldnames=self.fields_to_write)
+            self.current_file_writer = csv.DictWriter(self.current_file_handle, fieldnames=self.fields_to_write,
+                                                      extrasaction='ignore')
             self.current_file_writer.writeheader()
             logger.info(f"Mở file lưu trữ mới: {self.current_file_path}")
         except IOError as e:
@@ -72,7 +111,7 @@ class StorageManager:
             
         data_files = []
         for filename in os.listdir(self.base_dir):
-            if filename.startswith('data_') and filename.endswith('.csv'):
+            if filename.startswith(self.FILE_PREFIX) and filename.endswith(self.FILE_EXTENSION):
                 file_path = os.path.join(self.base_dir, filename)
                 if os.path.isfile(file_path):
                     # Lấy thời gian sửa đổi cuối cùng
@@ -85,26 +124,28 @@ class StorageManager:
             return data_files[0][1]
         return None
 
+    def _file_start_time(self, file_path: str) -> datetime:
+        """Lấy thời gian tạo file từ tên file (format: data_YYYYMMDD-HHMMSS[_N].csv), mặc định là hiện tại."""
+        filename = os.path.basename(file_path)
+        if filename.startswith(self.FILE_PREFIX) and filename.endswith(self.FILE_EXTENSION):
+            start = len(self.FILE_PREFIX)
+            timestamp_str = filename[start:start + 15]  # Lấy phần YYYYMMDD-HHMMSS
+            try:
+                return datetime.strptime(timestamp_str, '%Y%m%d-%H%M%S')
+            except ValueError:
+                pass  # Nếu không parse được, dùng thời gian hiện tại
+        return datetime.now()
+
     def _continue_existing_file(self, file_path: str) -> bool:
         """Tiếp tục ghi vào file đã có."""
         try:
             self.current_file_path = file_path
-            # Lấy thời gian tạo file từ tên file
-            filename = os.path.basename(file_path)
-            if filename.startswith('data_') and filename.endswith('.csv'):
-                # Extract timestamp từ filename (format: data_YYYYMMDD-HHMMSS.csv)
-                timestamp_str = filename[5:20]  # Lấy phần YYYYMMDD-HHMMSS
-                try:
-                    self.current_file_start_time = datetime.strptime(timestamp_str, '%Y%m%d-%H%M%S')
-                except ValueError:
-                    # Nếu không parse được, dùng thời gian hiện tại
-                    self.current_file_start_time = datetime.now()
-            else:
-                self.current_file_start_time = datetime.now()
-                
+            self.current_file_start_time = self._file_start_time(file_path)
+
             # Mở file ở chế độ append
             self.current_file_handle = open(self.current_file_path, 'a', newline='', encoding='utf-8')
-            self.current_file_writer = csv.DictWriter(self.current_file_handle, fieldnames=self.fields_to_write)
+            self.current_file_writer = csv.DictWriter(self.current_file_handle, fieldnames=self.fields_to_write,
+                                                      extrasaction='ignore')
             
             logger.info(f"Tiếp tục ghi vào file hiện có: {self.current_file_path}")
             return True
@@ -112,13 +153,112 @@ class StorageManager:
             logger.error(f"Không thể mở file để tiếp tục '{file_path}': {e}")
             return False
 
+    def add_fields_listener(self, callback: Callable[[List[str]], None]):
+        """Đăng ký hàm được gọi với danh sách cột mới mỗi khi set_fields_to_write thay đổi cấu hình."""
+        self._fields_listeners.append(callback)
+
+    def set_fields_to_write(self, fields_to_write: List[str]):
+        """
+        Cấu hình lại danh sách cột. File hiện tại được đóng và file mới (với header mới)
+        được mở ở lần ghi kế tiếp, trên luồng đang ghi. Các listener (ví dụ mask giải mã) được báo ngay.
+        """
+        if list(fields_to_write) == list(self.fields_to_write):
+            return
+        self.fields_to_write = list(fields_to_write)
+        self._fields_changed = True
+        logger.info(f"Cấu hình lại các cột lưu trữ: {self.fields_to_write}")
+        for callback in self._fields_listeners:
+            callback(self.fields_to_write)
+
+    def configure_durability(self, flush_interval_ms: float = 0, fsync_policy: str = "never",
+                             fsync_interval_s: float = 0):
+        """
+        Đặt chính sách bền vững dữ liệu.
+        Args:
+            flush_interval_ms (float): Dòng chờ trong bộ đệm Python tối đa bao lâu trước khi flush xuống OS
+                (0: không flush chủ động, bộ đệm tự ghi khi đầy).
+            fsync_policy (str): "never", "rotation" (fsync khi xoay vòng/đóng file) hoặc "interval"
+                (thêm fsync khi dòng cũ nhất chưa fsync đã chờ fsync_interval_s giây).
+            fsync_interval_s (float): Chu kỳ fsync cho chính sách "interval".
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Chính sách fsync không hợp lệ: '{fsync_policy}'. Hợp lệ: {', '.join(FSYNC_POLICIES)}")
+        if fsync_policy == "interval" and fsync_interval_s <= 0:
+            raise ValueError("Chính sách fsync 'interval' cần fsync_interval_s > 0")
+        self.flush_interval = max(0.0, flush_interval_ms / 1000.0)
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval_s
+        logger.info(f"Chính sách ghi: flush {'mỗi ' + str(flush_interval_ms) + 'ms' if self.flush_interval else 'theo bộ đệm'}"
+                    f", fsync {fsync_policy}" + (f" mỗi {fsync_interval_s}s" if fsync_policy == "interval" else ""))
+
     def write_data(self, data: Dict[str, Any]):
         """
         Ghi một dòng dữ liệu vào file CSV hiện tại.
         Kiểm tra và xoay vòng file nếu cần thiết.
+        Các khóa không có trong fields_to_write bị bỏ qua.
+        """
+        # Ghi dữ liệu nếu file đã mở thành công
+        if self._ensure_file() and self.current_file_writer:
+            try:
+                self.current_file_writer.writerow(data)
+            except IOError as e:
+                logger.error(f"Lỗi khi ghi vào file '{self.current_file_path}': {e}")
+                # Cố gắng mở lại file ở lần ghi tiếp theo
+                self.close_current_file()
+                return
+            self._rows_written(1)
+
+    def write_batch(self, rows: Sequence[Dict[str, Any]], captured_at: Optional[float] = None):
         """
+        Ghi nhiều dòng một lần (kiểm tra xoay vòng file và chính sách flush/fsync một lần cho cả lô).
+        Các khóa không có trong fields_to_write bị bỏ qua.
+        captured_at: time.monotonic() lúc đọc serial của dòng cũ nhất trong lô; độ trễ flush/fsync
+        và ngưỡng của chính sách bền vững được tính từ thời điểm này (mặc định: lúc ghi).
+        """
+        if not rows:
+            return
+        if self._ensure_file() and self.current_file_writer:
+            try:
+                self.current_file_writer.writerows(rows)
+            except IOError as e:
+                logger.error(f"Lỗi khi ghi vào file '{self.current_file_path}': {e}")
+                self.close_current_file()
+                return
+            self._rows_written(len(rows), captured_at)
+
+    def _rows_written(self, count: int, captured_at: Optional[float] = None):
+        """Ghi nhận các dòng vừa vào bộ đệm file rồi áp dụng chính sách flush/fsync."""
+        now = time.monotonic()
+        self.rows_written += count
+        if self._unflushed_since is None:
+            self._unflushed_since = now if captured_at is None else min(captured_at, now)
+        self.check_durability(now)
+
+    def check_durability(self, now: Optional[float] = None):
+        """
+        Flush/fsync nếu dữ liệu đã chờ quá ngưỡng của chính sách. Được gọi sau mỗi lần ghi, và định kỳ
+        bởi luồng ghi khi không có dữ liệu mới để dòng cuối không nằm mãi trong bộ đệm.
+        """
+        if self.current_file_handle is None:
+            return
+        now = time.monotonic() if now is None else now
+        if self.flush_interval and self._unflushed_since is not None and \
+                now - self._unflushed_since >= self.flush_interval:
+            self.flush()
+        if self.fsync_policy == "interval":
+            pending = self._unsynced_since if self._unsynced_since is not None else self._unflushed_since
+            if pending is not None and now - pending >= self.fsync_interval:
+                self.sync()
+
+    def _ensure_file(self) -> bool:
+        """Mở, tiếp tục hoặc xoay vòng file trước khi ghi. Trả về True nếu có file đang mở để ghi."""
+        if self._fields_changed:
+            # Danh sách cột vừa đổi: header cũ không còn đúng, luôn bắt đầu file mới
+            self._fields_changed = False
+            self._open_new_file()
+
         # Nếu chưa có file nào được mở, quyết định mở file mới hay tiếp tục file cũ
-        if self.current_file_writer is None:
+        if self.current_file_handle is None:
             if self.reconnection_strategy == "continue_file":
                 # Thử tìm và tiếp tục file mới nhất
                 latest_file = self._find_latest_file()
@@ -140,18 +280,76 @@ class StorageManager:
               datetime.now() >= self.current_file_start_time + self.file_rotation_delta):
             self._open_new_file()
 
-        # Ghi dữ liệu nếu file đã mở thành công
-        if self.current_file_writer and self.current_file_handle:
+        return self.current_file_handle is not None
+
+    def flush(self):
+        """Đẩy dữ liệu đang nằm trong bộ đệm Python xuống file hiện tại."""
+        if self.current_file_handle:
             try:
-                self.current_file_writer.writerow(data)
+                self.current_file_handle.flush()
             except IOError as e:
-                logger.error(f"Lỗi khi ghi vào file '{self.current_file_path}': {e}")
-                # Cố gắng mở lại file ở lần ghi tiếp theo
-                self.close_current_file()
+                logger.error(f"Lỗi khi flush file '{self.current_file_path}': {e}")
+                return
+            if self._unflushed_since is not None:
+                latency = time.monotonic() - self._unflushed_since
+                self.flush_count += 1
+                self.flush_latency_total += latency
+                self.flush_latency_max = max(self.flush_latency_max, latency)
+                if self._unsynced_since is None:
+                    self._unsynced_since = self._unflushed_since
+                self._unflushed_since = None
+
+    def sync(self):
+        """Flush rồi fsync file hiện tại để dữ liệu đã ghi còn nguyên khi mất điện."""
+        if not self.current_file_handle:
+            return
+        self.flush()
+        if self._unsynced_since is None:
+            return
+        start = time.monotonic()
+        try:
+            os.fsync(self.current_file_handle.fileno())
+        except OSError as e:
+            logger.error(f"Lỗi khi fsync file '{self.current_file_path}': {e}")
+            return
+        end = time.monotonic()
+        self.fsync_count += 1
+        self.fsync_time_total += end - start
+        self.fsync_time_max = max(self.fsync_time_max, end - start)
+        self.sync_latency_max = max(self.sync_latency_max, end - self._unsynced_since)
+        self._unsynced_since = None
+
+    def _reset_durability_stats(self):
+        self.flush_count = 0
+        self.flush_latency_total = 0.0  # Từ lúc thu nhận dòng cũ nhất tới flush (giây)
+        self.flush_latency_max = 0.0
+        self.fsync_count = 0
+        self.fsync_time_total = 0.0     # Thời gian gọi os.fsync (giây)
+        self.fsync_time_max = 0.0
+        self.sync_latency_max = 0.0     # Từ lúc thu nhận dòng cũ nhất tới khi fsync xong (giây)
+
+    def durability_stats(self, reset: bool = True) -> Dict[str, float]:
+        """Số liệu flush/fsync kể từ lần lấy trước (ms), dùng cho log định kỳ của luồng ghi."""
+        stats = {
+            "flush_count": self.flush_count,
+            "flush_latency_mean_ms": self.flush_latency_total / self.flush_count * 1000 if self.flush_count else 0.0,
+            "flush_latency_max_ms": self.flush_latency_max * 1000,
+            "fsync_count": self.fsync_count,
+            "fsync_mean_ms": self.fsync_time_total / self.fsync_count * 1000 if self.fsync_count else 0.0,
+            "fsync_max_ms": self.fsync_time_max * 1000,
+            "sync_latency_max_ms": self.sync_latency_max * 1000,
+        }
+        if reset:
+            self._reset_durability_stats()
+        return stats
 
     def close_current_file(self):
-        """Đóng file đang mở hiện tại."""
+        """Đóng file đang mở hiện tại (fsync trước khi đóng trừ khi chính sách là "never")."""
         if self.current_file_handle:
+            if self.fsync_policy == "never":
+                self.flush()
+            else:
+                self.sync()
             try:
                 self.current_file_handle.close()
                 logger.info(f"Đóng file: {self.current_file_path}")
@@ -162,3 +360,5 @@ class StorageManager:
         self.current_file_writer = None
         self.current_file_handle = None
         self.current_file_start_time = None
+        self._unflushed_since = None
+        self._unsynced_since = None